@@ -0,0 +1,58 @@
+import re
+from datetime import datetime, timedelta
+from app.core.compression import ENCODING_SUFFIXES
+from app.core.config import settings
+
+ENTITY_TAG = re.compile(r'\s*(W/)?"([^"]*)"\s*(?:,|$)')
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def micros(value: datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+def user_etag(updated_at: datetime) -> str:
+    return f'"{micros(updated_at)}"'
+
+def users_page_etag(changed_at: datetime, after: int, limit: int) -> str:
+    # Both renderings of the page are valid JSON but not the same bytes.
+    rendering = "db" if settings.DB_RENDERED_JSON else "app"
+    return f'"{micros(changed_at)}-{after}-{limit}-{rendering}"'
+
+def parse_etags(header: str) -> list[tuple[bool, str]]:
+    """The (weak, opaque tag) pairs of an If-Match or If-None-Match header."""
+    return [(bool(weak), tag) for weak, tag in ENTITY_TAG.findall(header)]
+
+def identity_tag(tag: str) -> str:
+    # The compression middleware tags encoded representations "<etag>-gzip"/"<etag>-br".
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag.removesuffix(suffix)
+    return tag
+
+def none_match(header: str | None, etag: str) -> str | None:
+    """
+    The entity tag of If-None-Match that matches `etag` under weak comparison,
+    as the client sent it, or None when the full response has to be sent.
+    """
+    if header is None:
+        return None
+    if header.strip() == "*":
+        return etag
+    for weak, tag in parse_etags(header):
+        if f'"{identity_tag(tag)}"' == etag:
+            return f'W/"{tag}"' if weak else f'"{tag}"'
+    return None
+
+def if_match_timestamps(header: str | None) -> list[datetime] | None:
+    """
+    The updated_at values named by If-Match under strong comparison, or None
+    without the header or with "*", which only asks for the user to exist.
+    """
+    if header is None or header.strip() == "*":
+        return None
+    timestamps = []
+    for weak, tag in parse_etags(header):
+        tag = identity_tag(tag)
+        if not weak and tag.isdigit():
+            timestamps.append(EPOCH + timedelta(microseconds=int(tag)))
+    return timestamps
@@ -1,11 +1,30 @@
+from fastapi import Depends
+from app.core.config import settings
+from app.db.admission import Priority, request_priority
+from app.db.backend import DatabaseBackend
 from app.db.db_funcs import Database
+from app.db.memory import MemoryDatabase
+from app.db.sharding import ShardedDatabase
+
+BACKENDS = {"postgres": Database, "sharded": ShardedDatabase, "memory": MemoryDatabase}
+
+def create_database(backend: str) -> DatabaseBackend:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND: {backend}")
+    return BACKENDS[backend]()
 
 # Create a global database instance
-db = Database()
+db = create_database(settings.DB_BACKEND)
 
-async def get_db() -> Database:  # pragma: no cover
+async def get_db() -> DatabaseBackend:  # pragma: no cover
     """
     Dependency function to provide a database connection instance
     to route handlers.
     """
-    return db
\ No newline at end of file
+    return db
+
+def priority(level: Priority):
+    """Route dependency running the request's database calls at `level` under admission control."""
+    async def set_priority():
+        request_priority.set(level)
+    return Depends(set_priority)
@@ -0,0 +1,29 @@
+from app.api.pagination import paginate
+
+HISTORY_FIELDS = ("name", "email", "deleted")
+
+def field_changes(previous, current) -> dict:
+    """{field: [old, new]} for the profile fields that differ between two audit rows."""
+    return {
+        field: [previous[field] if previous is not None else None, current[field]]
+        for field in HISTORY_FIELDS
+        if previous is None or previous[field] != current[field]
+    }
+
+def history_page(rows, limit: int):
+    """
+    Turn audit rows of one user, newest first and fetched with `limit + 1`,
+    into a page of versions with the fields each changed, and the cursor of
+    the next page. The extra row is the base of the page's oldest version.
+    """
+    page, next_cursor = paginate(rows, limit, lambda entry: entry["version"])
+    entries = [
+        {
+            "version": entry["version"],
+            "operation": entry["operation"],
+            "timestamp": entry["timestamp"],
+            "changes": field_changes(rows[index + 1] if index + 1 < len(rows) else None, entry),
+        }
+        for index, entry in enumerate(page)
+    ]
+    return entries, next_cursor
@@ -0,0 +1,117 @@
+import csv
+from collections import deque
+from pydantic import ValidationError
+from app.models.user import UserData
+
+NDJSON = "application/x-ndjson"
+CSV = "text/csv"
+IMPORT_CONTENT_TYPES = (NDJSON, CSV)
+
+# Reported for a line that is not UTF-8, in place of the record it belongs to.
+UNDECODABLE_LINE = "Line is not valid UTF-8"
+
+async def read_lines(stream):
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if buffer:
+        yield buffer.rstrip(b"\r")
+
+class Lines:
+    """Iterator over lines appended to `queue`, so one csv.reader can read a streamed body."""
+
+    def __init__(self):
+        self.queue = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.queue:
+            raise StopIteration
+        return self.queue.popleft()
+
+async def csv_records(lines):
+    """
+    Yield (line_number, row, error) for each CSV record, where line_number is
+    the line the record starts on. A quoted field may span lines, so lines are
+    held back until their quotes balance; a record with an undecodable line
+    is dropped and reported as an error.
+    """
+    pending = Lines()
+    reader = csv.reader(pending)
+    quotes = 0
+    line_number = start = 0
+    async for raw in lines:
+        line_number += 1
+        if not quotes:
+            start = line_number
+        try:
+            line = raw.decode()
+        except UnicodeDecodeError:
+            pending.queue.clear()
+            quotes = 0
+            yield line_number, None, UNDECODABLE_LINE
+            continue
+        pending.queue.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        quotes = 0
+        yield start, next(reader, []), None
+    if pending.queue:
+        yield start, next(reader, []), None
+
+async def parse_payloads(stream, content_type: str):
+    """Yield (line_number, payload, error) for each NDJSON line or CSV record after the header."""
+    if content_type == NDJSON:
+        line_number = 0
+        async for raw in read_lines(stream):
+            line_number += 1
+            try:
+                line = raw.decode()
+            except UnicodeDecodeError:
+                yield line_number, None, UNDECODABLE_LINE
+                continue
+            if line.strip():
+                yield line_number, line, None
+        return
+    header = None
+    async for line_number, row, error in csv_records(read_lines(stream)):
+        if error:
+            yield line_number, None, error
+        elif len(row) <= 1 and not "".join(row).strip():
+            continue
+        elif header is None:
+            header = row
+        else:
+            yield line_number, dict(zip(header, row)), None
+
+async def parse_users(stream, content_type: str):
+    """
+    Parse a streamed NDJSON or CSV (with a header row) body into
+    (line_number, UserData | None, error | None) tuples, one per data line.
+    """
+    async for line_number, payload, error in parse_payloads(stream, content_type):
+        if error:
+            yield line_number, None, error
+            continue
+        try:
+            user = UserData.model_validate_json(payload) if isinstance(payload, str) else UserData.model_validate(payload)
+        except ValidationError as e:
+            yield line_number, None, "; ".join(error["msg"] for error in e.errors())
+        else:
+            yield line_number, user, None
+
+async def batched(rows, size: int):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,19 @@
+from datetime import datetime
+from app.models.audit import to_naive_utc
+
+def paginate(rows, limit: int, cursor_of):
+    """
+    Split a page fetched with `limit + 1` rows into the page itself and the
+    cursor of its last row, or None when there is nothing left to read.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, cursor_of(page[-1])
+
+def encode_audit_cursor(entry) -> str:
+    return f"{entry['timestamp'].isoformat()},{entry['id']}"
+
+def decode_audit_cursor(cursor: str):
+    timestamp, _, entry_id = cursor.rpartition(",")
+    return to_naive_utc(datetime.fromisoformat(timestamp)), int(entry_id)
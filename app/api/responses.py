@@ -0,0 +1,62 @@
+import math
+from fastapi import status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.core.serialization import dumps
+from app.db.admission import Overloaded
+from app.db.backend import EmailTaken
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with `dumps`. Routes return it directly so FastAPI
+    skips `jsonable_encoder` on the content.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+class RawJSONResponse(Response):
+    """A body that is already JSON, e.g. rendered by Postgres."""
+    media_type = "application/json"
+
+async def ndjson_lines(records):
+    async for record in records:
+        yield dumps(dict(record)) + b"\n"
+
+def ndjson_response(records) -> StreamingResponse:
+    """
+    Stream an async iterable of records to the client as newline-delimited JSON,
+    one row per line, without materializing the result set.
+    """
+    return StreamingResponse(ndjson_lines(records), media_type=NDJSON_MEDIA_TYPE)
+
+async def started(chunks):
+    """
+    Run an async iterator up to its first item before the response starts, so
+    a failure to begin (like a shed database call) still gets its own status.
+    """
+    iterator = aiter(chunks)
+    try:
+        first = await anext(iterator)
+    except StopAsyncIteration:
+        first = None
+
+    async def resumed():
+        if first is None:
+            return
+        yield first
+        async for chunk in iterator:
+            yield chunk
+
+    return resumed()
+
+async def overloaded_response(request, exc: Overloaded) -> Response:
+    return FastJSONResponse(
+        {"detail": "Database overloaded, retry later"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+async def email_taken_response(request, exc: EmailTaken) -> Response:
+    return FastJSONResponse({"detail": str(exc)}, status_code=status.HTTP_409_CONFLICT)
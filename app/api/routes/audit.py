@@ -1,10 +1,43 @@
-from fastapi import APIRouter, Depends
-from app.db.db_funcs import Database
-from app.api.dependencies import get_db
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.models.audit import AuditFilters
+from app.db.backend import DatabaseBackend
+from app.api.dependencies import get_db, priority
+from app.api.pagination import paginate, encode_audit_cursor, decode_audit_cursor
+from app.api.responses import FastJSONResponse, RawJSONResponse, ndjson_response, started
+from app.db.admission import Priority
 
 router = APIRouter()
 
 @router.get("/")
-async def get_audit_logs(db: Database = Depends(get_db)):
-    logs = await db.get_audit_logs()
-    return {"audit_logs": logs}
+async def get_audit_logs(
+    filters: AuditFilters = Depends(),
+    before: str | None = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    db: DatabaseBackend = Depends(get_db),
+):
+    try:
+        cursor = decode_audit_cursor(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+    if settings.DB_RENDERED_JSON:
+        return RawJSONResponse(await db.get_audit_logs_json(**filters.model_dump(), before=cursor, limit=limit))
+    logs = await db.get_audit_logs(**filters.model_dump(), before=cursor, limit=limit + 1)
+    logs, next_cursor = paginate(logs, limit, encode_audit_cursor)
+    return FastJSONResponse({"audit_logs": logs, "next_cursor": next_cursor})
+
+@router.get("/export", dependencies=[priority(Priority.LOW)])
+async def export_audit_logs(
+    filters: AuditFilters = Depends(),
+    format: Literal["csv", "ndjson"] = "ndjson",
+    db: DatabaseBackend = Depends(get_db),
+):
+    if format == "csv":
+        return StreamingResponse(
+            await started(db.copy_audit_logs(**filters.model_dump())),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="user_audit.csv"'},
+        )
+    return ndjson_response(await started(db.iter_audit_logs(**filters.model_dump())))
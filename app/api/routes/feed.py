@@ -0,0 +1,57 @@
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.db.backend import DatabaseBackend
+from app.api.dependencies import get_db
+
+router = APIRouter()
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+def sse_event(token: str, entry) -> bytes:
+    return b"id: " + token.encode() + b"\nevent: audit\ndata: " + dumps(dict(entry)) + b"\n\n"
+
+async def sse_events(events, keepalive: float):
+    """
+    Render (token, audit row) pairs as server-sent events, with a comment line
+    every `keepalive` seconds without events so proxies keep the stream open.
+    """
+    events = aiter(events)
+    next_event = asyncio.ensure_future(anext(events))
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event}, timeout=keepalive)
+            if not done:
+                yield b": keepalive\n\n"
+                continue
+            try:
+                token, entry = next_event.result()
+            except StopAsyncIteration:
+                return
+            yield sse_event(token, entry)
+            next_event = asyncio.ensure_future(anext(events))
+    finally:
+        next_event.cancel()
+
+@router.get("/")
+async def audit_feed(
+    after: str | None = None,
+    last_event_id: str | None = Header(None),
+    db: DatabaseBackend = Depends(get_db),
+):
+    """
+    Stream audit rows as they are committed, as server-sent events. The id of
+    each event is a resume token: pass it as `after` (or let the browser send
+    it as Last-Event-ID) to resume with the rows committed since, then live.
+    """
+    try:
+        events = db.audit_feed(last_event_id or after)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid feed token")
+    return StreamingResponse(
+        sse_events(events, settings.AUDIT_FEED_KEEPALIVE),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,7 +1,36 @@
-from fastapi import APIRouter
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.core.config import settings
+from app.db.backend import DatabaseBackend
+from app.api.dependencies import get_db
 
 router = APIRouter()
 
 @router.get("/")
 async def health_check(): # pragma: no cover
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness_check(db: DatabaseBackend = Depends(get_db)):
+    """Ready once the database answers within READINESS_MAX_LATENCY_MS."""
+    max_latency = settings.READINESS_MAX_LATENCY_MS / 1000
+    try:
+        latency = await asyncio.wait_for(db.ping(), timeout=max_latency)
+    except asyncio.TimeoutError:
+        latency = None
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Database unavailable: {e}")
+    if latency is None or latency > max_latency:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database round trip exceeds {settings.READINESS_MAX_LATENCY_MS:g} ms",
+        )
+    return {"status": "ready", "database_latency_ms": round(latency * 1000, 3)}
+
+@router.get("/cache")
+async def cache_stats(db: DatabaseBackend = Depends(get_db)):
+    return {"profile_cache": db.cache.stats() if db.cache else None}
+
+@router.get("/pool")
+async def pool_stats(db: DatabaseBackend = Depends(get_db)):
+    return {"pool": db.pool_status()}
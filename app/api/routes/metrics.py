@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import (
+    AUDIT_FEED,
+    AUDIT_FEED_EVENTS,
+    AUDIT_WRITER_DROPPED,
+    AUDIT_WRITER_PENDING,
+    DB_ADMISSION,
+    DB_ADMISSION_ADMITTED,
+    DB_ADMISSION_SHED,
+    DB_POOL_ACQUIRE_TIMEOUTS,
+    DB_POOL_CONNECTIONS,
+    DB_SINGLE_FLIGHT,
+    DB_SINGLE_FLIGHT_EVENTS,
+    PROFILE_CACHE,
+    PROFILE_CACHE_EVENTS,
+    REGISTRY,
+)
+from app.db.backend import DatabaseBackend
+from app.api.dependencies import get_db
+
+router = APIRouter()
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def collect_stats(stats: dict, gauge, counter, gauges: tuple):
+    """Export the `gauges` stats, which can go down, as gauges and the running totals as counters."""
+    for stat, value in stats.items():
+        (gauge if stat in gauges else counter).set(value, stat)
+
+def collect_database(db: DatabaseBackend):
+    pool = db.pool_status()
+    for state in ("in_use", "idle", "max_size"):
+        DB_POOL_CONNECTIONS.set(pool[state], state.removesuffix("_size"))
+    DB_POOL_ACQUIRE_TIMEOUTS.set(pool["acquire_timeouts"])
+    if "admission" in pool:
+        admission = pool["admission"]
+        for stat in ("limit", "active", "waiting"):
+            DB_ADMISSION.set(admission[stat], stat)
+        DB_ADMISSION_ADMITTED.set(admission["admitted"])
+        for level, count in admission["shed"].items():
+            DB_ADMISSION_SHED.set(count, level)
+    if db.cache:
+        collect_stats(db.cache.stats(), PROFILE_CACHE, PROFILE_CACHE_EVENTS, ("size", "max_size"))
+    if db.flights:
+        collect_stats(db.flights.stats(), DB_SINGLE_FLIGHT, DB_SINGLE_FLIGHT_EVENTS, ("in_flight",))
+    if db.audit_writer:
+        AUDIT_WRITER_PENDING.set(db.audit_writer.pending)
+        AUDIT_WRITER_DROPPED.set(db.audit_writer.dropped)
+    if db.feed:
+        collect_stats(db.feed.stats(), AUDIT_FEED, AUDIT_FEED_EVENTS, ("subscribers",))
+
+@router.get("/", response_class=PlainTextResponse)
+async def metrics(db: DatabaseBackend = Depends(get_db)):
+    collect_database(db)
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_MEDIA_TYPE)
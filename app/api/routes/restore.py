@@ -1,13 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.db.db_funcs import Database
-from app.api.dependencies import get_db
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.core.config import settings
+from app.models.audit import BulkRestoreRequest, to_naive_utc
+from app.db.backend import DatabaseBackend, EmailTaken
+from app.api.dependencies import get_db, priority
+from app.api.responses import FastJSONResponse, ndjson_response
+from app.db.admission import Priority
 
 router = APIRouter()
 
+CHUNK_EMAIL_TAKEN = "An email restored in this chunk belongs to another user"
+
+@router.post("/bulk", dependencies=[priority(Priority.LOW)])
+async def bulk_restore(request: BulkRestoreRequest, db: DatabaseBackend = Depends(get_db)):
+    if request.user_ids is not None:
+        user_ids = sorted(set(request.user_ids))
+    else:
+        user_ids = await db.get_user_ids_changed_since(request.as_of, request.changed_until)
+    size = settings.RESTORE_CHUNK_SIZE
+    chunks = [user_ids[start:start + size] for start in range(0, len(user_ids), size)]
+
+    async def progress():
+        # Each chunk commits on its own, so locks are held for one chunk at a
+        # time and a failing chunk (e.g. an email now taken by another user)
+        # does not undo the others.
+        restored, failed = 0, []
+        for number, chunk in enumerate(chunks, start=1):
+            try:
+                restored_ids = await db.restore_users_as_of(chunk, request.as_of)
+            except EmailTaken:
+                failed.extend(chunk)
+                yield {"chunk": number, "chunks": len(chunks), "error": CHUNK_EMAIL_TAKEN, "user_ids": chunk}
+                continue
+            restored += len(restored_ids)
+            yield {
+                "chunk": number,
+                "chunks": len(chunks),
+                "restored": len(restored_ids),
+                "skipped": len(chunk) - len(restored_ids),
+            }
+        yield {"done": True, "requested": len(user_ids), "restored": restored, "failed_user_ids": failed}
+
+    return ndjson_response(progress())
+
 @router.post("/{user_id}")
-async def restore_user(user_id: int, version: int, db: Database = Depends(get_db)):
-    audit_log = await db.get_user_audit_restore_version(user_id, version)
+async def restore_user(
+    user_id: int,
+    version: int | None = Query(None, ge=1),
+    as_of: datetime | None = None,
+    db: DatabaseBackend = Depends(get_db),
+):
+    if (version is None) == (as_of is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide exactly one of version or as_of.",
+        )
+    if version is not None:
+        audit_log = await db.get_user_audit_restore_version(user_id, version)
+    else:
+        audit_log = await db.get_user_audit_as_of(user_id, to_naive_utc(as_of))
     if not audit_log:
         raise HTTPException(status_code=404, detail="Version not found for restoration.")
     restored_user = await db.restore_user(user_id, audit_log["name"], audit_log["email"], audit_log["deleted"])
-    return {"restored_user": restored_user}
+    return FastJSONResponse({"restored_user": restored_user})
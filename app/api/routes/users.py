@@ -1,37 +1,169 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.models.user import UserData
-from app.db.db_funcs import Database
-from app.api.dependencies import get_db
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from app.core.config import settings
+from app.models.audit import to_naive_utc
+from app.models.user import BulkDeleteRequest, BulkUpdateRequest, UserData
+from app.db.backend import DatabaseBackend
+from app.api.conditional import if_match_timestamps, none_match, user_etag, users_page_etag
+from app.api.dependencies import get_db, priority
+from app.api.history import history_page
+from app.api.imports import IMPORT_CONTENT_TYPES, batched, parse_users
+from app.api.pagination import paginate
+from app.api.responses import FastJSONResponse, RawJSONResponse, ndjson_response, started
+from app.db.admission import Priority, request_priority
 
 router = APIRouter()
 
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+def etag_headers(user) -> dict | None:
+    return {"ETag": user_etag(user["updated_at"])} if user.get("updated_at") else None
+
+async def write_failed(db: DatabaseBackend, user_id: int, if_match: list | None):
+    # The conditional write matched no row: either the user is gone or it changed.
+    if if_match is not None and await db.get_user(user_id=user_id):
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="User was modified")
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_user(user_data: UserData, db: Database = Depends(get_db)):
+async def create_user(user_data: UserData, db: DatabaseBackend = Depends(get_db)):
     user = await db.create_user(name=user_data.name, email=user_data.email)
-    return {"message": "User created successfully", "user": user}
+    return FastJSONResponse({"message": "User created successfully", "user": user}, status_code=status.HTTP_201_CREATED)
+
+@router.post("/bulk", dependencies=[priority(Priority.LOW)])
+async def import_users(request: Request, db: DatabaseBackend = Depends(get_db)):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in IMPORT_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Expected one of: {', '.join(IMPORT_CONTENT_TYPES)}",
+        )
+
+    created, errors = 0, []
+    async for batch in batched(parse_users(request.stream(), content_type), settings.IMPORT_BATCH_SIZE):
+        rows = []
+        for line, user, error in batch:
+            if error:
+                errors.append({"line": line, "detail": error})
+            else:
+                rows.append((line, user.name, user.email))
+        if not rows:
+            continue
+        for result in await db.import_users(rows):
+            if result["id"] is None:
+                errors.append({"line": result["line"], "detail": f"Email {result['email']} already exists"})
+            else:
+                created += 1
+
+    errors.sort(key=lambda error: error["line"])
+    return {"message": "Users imported", "created": created, "errors": errors}
+
+def batch_result(row) -> dict:
+    result = {"id": row["id"], "status": row["status"]}
+    if row["status"] == "updated":
+        result["user"] = {field: row[field] for field in ("id", "name", "email", "updated_at")}
+    return result
+
+@router.put("/bulk", dependencies=[priority(Priority.LOW)])
+async def update_users(request: BulkUpdateRequest, db: DatabaseBackend = Depends(get_db)):
+    """Update many users in one statement; each gets a status: updated, not_found or conflict (email taken)."""
+    rows = await db.update_users([(user.id, user.name, user.email) for user in request.users])
+    return FastJSONResponse({"results": [batch_result(row) for row in rows]})
+
+@router.delete("/bulk", dependencies=[priority(Priority.LOW)])
+async def delete_users(request: BulkDeleteRequest, db: DatabaseBackend = Depends(get_db)):
+    """Delete many users in one statement; each gets a status: deleted or not_found."""
+    rows = await db.delete_users(request.user_ids)
+    return FastJSONResponse({"results": [batch_result(row) for row in rows]})
 
 @router.get("/")
-async def get_users(db: Database = Depends(get_db)):
-    users = await db.get_users()
-    return {"users": users}
+async def get_users(
+    after: int = Query(0, ge=0),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    stream: bool = False,
+    if_none_match: str | None = Header(None),
+    db: DatabaseBackend = Depends(get_db),
+):
+    if stream:
+        request_priority.set(Priority.LOW)
+        return ndjson_response(await started(db.iter_users(after=after)))
+    # A cheap check of the newest change answers an unchanged page without reading it.
+    headers = None
+    changed_at, age = await db.get_users_changed_at()
+    if changed_at is not None and age >= settings.USERS_ETAG_SETTLE_SECONDS:
+        etag = users_page_etag(changed_at, after, limit)
+        if matched := none_match(if_none_match, etag):
+            return not_modified(matched)
+        headers = {"ETag": etag}
+    if settings.DB_RENDERED_JSON:
+        return RawJSONResponse(await db.get_users_json(after=after, limit=limit), headers=headers)
+    users = await db.get_users(after=after, limit=limit + 1)
+    users, next_cursor = paginate(users, limit, lambda user: user["id"])
+    return FastJSONResponse({"users": users, "next_cursor": next_cursor}, headers=headers)
 
 @router.get("/{user_id}")
-async def get_user(user_id: int, db: Database = Depends(get_db)):
+async def get_user(
+    user_id: int,
+    as_of: datetime | None = None,
+    if_none_match: str | None = Header(None),
+    db: DatabaseBackend = Depends(get_db),
+):
+    if as_of is not None:
+        return await get_user_as_of(db, user_id, to_naive_utc(as_of))
     user = await db.get_user(user_id=user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return {"user": user}
+    headers = etag_headers(user)
+    if headers and (matched := none_match(if_none_match, headers["ETag"])):
+        return not_modified(matched)
+    return FastJSONResponse({"user": user}, headers=headers)
+
+async def get_user_as_of(db: DatabaseBackend, user_id: int, as_of: datetime):
+    # The audit row in effect at as_of holds the whole profile, as restores use it.
+    entry = await db.get_user_audit_as_of(user_id, as_of)
+    if not entry or entry["deleted"]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    user = {
+        "id": user_id,
+        "name": entry["name"],
+        "email": entry["email"],
+        "version": entry["version"],
+        "updated_at": entry["timestamp"],
+    }
+    return FastJSONResponse({"user": user, "as_of": as_of})
+
+@router.get("/{user_id}/history")
+async def get_user_history(
+    user_id: int,
+    before: int | None = Query(None, ge=1),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    db: DatabaseBackend = Depends(get_db),
+):
+    """The user's versions, newest first, with the fields each one changed as [old, new]."""
+    rows = await db.get_user_history(user_id, before=before, limit=limit + 1)
+    if not rows and before is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    history, next_cursor = history_page(rows, limit)
+    return FastJSONResponse({"user_id": user_id, "history": history, "next_cursor": next_cursor})
 
 @router.put("/{user_id}")
-async def update_user(user_id: int, user_data: UserData, db: Database = Depends(get_db)):
-    user = await db.update_user(user_id=user_id, name=user_data.name, email=user_data.email)
+async def update_user(
+    user_id: int,
+    user_data: UserData,
+    if_match: str | None = Header(None),
+    db: DatabaseBackend = Depends(get_db),
+):
+    expected = if_match_timestamps(if_match)
+    user = await db.update_user(user_id=user_id, name=user_data.name, email=user_data.email, if_match=expected)
     if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return {"message": "User updated successfully", "user": user}
+        await write_failed(db, user_id, expected)
+    return FastJSONResponse({"message": "User updated successfully", "user": user}, headers=etag_headers(user))
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int, db: Database = Depends(get_db)):
-    user = await db.delete_user(user_id=user_id)
+async def delete_user(user_id: int, if_match: str | None = Header(None), db: DatabaseBackend = Depends(get_db)):
+    expected = if_match_timestamps(if_match)
+    user = await db.delete_user(user_id=user_id, if_match=expected)
     if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return {"message": "User deleted successfully", "user": user}
+        await write_failed(db, user_id, expected)
+    return FastJSONResponse({"message": "User deleted successfully", "user": user})
@@ -0,0 +1,147 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+# Strong ETags name one exact representation, so an encoded body gets its own.
+ENCODING_SUFFIXES = ("-gzip", "-br")
+# Events must reach the client as they happen, not when a compressor flushes.
+UNCOMPRESSED_MEDIA_TYPES = (b"text/event-stream",)
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    weights = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[coding.strip().lower()] = quality
+    return weights
+
+def choose_encoding(header: str, brotli_available: bool = brotli is not None) -> str | None:
+    """The content coding to answer a request's Accept-Encoding with: br, then gzip, else None."""
+    weights = parse_accept_encoding(header)
+    candidates = ["br", "gzip"] if brotli_available else ["gzip"]
+    for coding in candidates:
+        if weights.get(coding, weights.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+class Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.brotli.process(data)
+        return self.zlib.compress(data)
+
+    def flush(self) -> bytes:
+        """Everything compressed so far, decodable without the rest of the stream."""
+        if self.encoding == "br":
+            return self.brotli.flush()
+        return self.zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.brotli.finish()
+        return self.zlib.flush()
+
+def encoded_etag(etag: bytes, encoding: str) -> bytes:
+    if not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + f"-{encoding}".encode() + b'"'
+
+def vary_on_encoding(headers: list) -> list:
+    vary = [value for name, value in headers if name.lower() == b"vary"]
+    headers = [(name, value) for name, value in headers if name.lower() != b"vary"]
+    return [*headers, (b"vary", b", ".join([*vary, b"Accept-Encoding"]))]
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies with brotli (when installed)
+    or gzip, as the request's Accept-Encoding allows. Complete bodies under
+    `minimum_size` bytes are sent as they are; streamed bodies are always
+    compressed, except event streams, and each chunk is flushed so it reaches
+    the client as soon as it is sent.
+    """
+
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = next((value for name, value in scope["headers"] if name == b"accept-encoding"), b"")
+        encoding = choose_encoding(accept.decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                headers = start.get("headers", [])
+                names = {name.lower() for name, _ in headers}
+                content_type = next((value for name, value in headers if name.lower() == b"content-type"), b"")
+                if (
+                    start["status"] in (204, 304)
+                    or b"content-encoding" in names
+                    or content_type.startswith(UNCOMPRESSED_MEDIA_TYPES)
+                ):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send({**start, "headers": vary_on_encoding(headers)})
+                    return await send(message)
+
+                compressor = Compressor(encoding)
+                headers = [
+                    (name, encoded_etag(value, encoding) if name.lower() == b"etag" else value)
+                    for name, value in vary_on_encoding(headers)
+                    if name.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    return await send({"type": "http.response.body", "body": body})
+                await send({**start, "headers": headers})
+
+            if not more_body:
+                body = compressor.compress(body) + compressor.finish()
+            elif body:
+                body = compressor.compress(body) + compressor.flush()
+            if body or not more_body:
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,6 +1,23 @@
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+def url_list(name: str) -> list[str]:
+    return [url.strip() for url in os.getenv(name, "").split(",") if url.strip()]
+
+DATABASE_REPLICA_URLS = url_list("DATABASE_REPLICA_URLS")
+DATABASE_SHARD_URLS = url_list("DATABASE_SHARD_URLS")
+
+def optional_float(name: str):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+def worker_pool_size(budget: int, workers: int) -> int:
+    """The pool size of each worker process so all of them fit in `budget` connections."""
+    # Every worker also holds one LISTEN connection outside its pool.
+    size = budget // workers - 1
+    if size < 1:
+        raise ValueError(f"DB_CONNECTION_BUDGET={budget} is too small for {workers} workers")
+    return size
 
 class Settings:
     TITLE = "User Profile Audit System"
@@ -8,5 +25,86 @@ class Settings:
     VERSION = "1.0.0"
     VALID_USER_NAME = os.getenv("USER_NAME", "admin") # TODO: WARNING! REMOVE THE DEFAULT VALUE IN PRODUCTION
     VALID_PASSWORD = os.getenv("PASSWORD", "admin") # TODO: WARNING! REMOVE THE DEFAULT VALUE IN PRODUCTION
+    DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+    STREAM_PREFETCH = int(os.getenv("STREAM_PREFETCH", "500"))
+    EXPORT_QUEUE_SIZE = int(os.getenv("EXPORT_QUEUE_SIZE", "16"))
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+    BULK_WRITE_MAX_SIZE = int(os.getenv("BULK_WRITE_MAX_SIZE", "10000")) # users per PUT/DELETE /users/bulk
+    # "sync" writes each audit row in the same statement as its mutation;
+    # "batched" queues them in-process and flushes them in bulk (faster, but
+    # rows still queued are lost if the process is killed).
+    AUDIT_DURABILITY = os.getenv("AUDIT_DURABILITY", "sync")
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.05"))
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_DRAIN_TIMEOUT = float(os.getenv("AUDIT_DRAIN_TIMEOUT", "30"))
+    # user_audit is partitioned by month. Every AUDIT_MAINTENANCE_INTERVAL seconds
+    # (0 disables) partitions are created AUDIT_PARTITIONS_AHEAD months ahead and,
+    # with AUDIT_RETENTION_MONTHS set (0 keeps everything), older months are moved
+    # to compressed files in AUDIT_ARCHIVE_DIR that the audit endpoints still read.
+    # Months are only dropped with AUDIT_ARCHIVE_SHARED=true, meaning every
+    # replica mounts AUDIT_ARCHIVE_DIR from the same persistent volume.
+    AUDIT_MAINTENANCE_INTERVAL = float(os.getenv("AUDIT_MAINTENANCE_INTERVAL", "3600"))
+    AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))
+    AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))
+    AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "audit_archive")
+    AUDIT_ARCHIVE_SHARED = os.getenv("AUDIT_ARCHIVE_SHARED", "false").lower() == "true"
+    AUDIT_ARCHIVE_GROUP_SIZE = int(os.getenv("AUDIT_ARCHIVE_GROUP_SIZE", "65536"))
+    # GET /audit/feed: every client gets a buffer of AUDIT_FEED_BUFFER_SIZE rows and
+    # is disconnected when it falls further behind; the last AUDIT_FEED_HISTORY_SIZE
+    # rows are kept so reconnecting clients resume without querying the table.
+    AUDIT_FEED_BUFFER_SIZE = int(os.getenv("AUDIT_FEED_BUFFER_SIZE", "1000"))
+    AUDIT_FEED_HISTORY_SIZE = int(os.getenv("AUDIT_FEED_HISTORY_SIZE", "10000"))
+    # Audit ids commit out of order; a resume token remembers the ids it skipped
+    # within the last AUDIT_FEED_LOOKBACK ids so rows that commit late are not lost.
+    AUDIT_FEED_LOOKBACK = int(os.getenv("AUDIT_FEED_LOOKBACK", "1000"))
+    AUDIT_FEED_KEEPALIVE = float(os.getenv("AUDIT_FEED_KEEPALIVE", "15"))
+    PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000")) # 0 disables the cache
+    PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "30"))
+    # Bodies of at least COMPRESSION_MINIMUM_SIZE bytes are sent with brotli or
+    # gzip, whichever the client accepts (brotli first).
+    COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+    # GET /users pages only get an ETag once no user changed for this long, so
+    # a write that commits after a later one cannot hide behind its timestamp.
+    USERS_ETAG_SETTLE_SECONDS = float(os.getenv("USERS_ETAG_SETTLE_SECONDS", "5"))
+    # Let Postgres render the GET /users and GET /audit pages as JSON.
+    DB_RENDERED_JSON = os.getenv("DB_RENDERED_JSON", "false").lower() == "true"
+    RESTORE_CHUNK_SIZE = int(os.getenv("RESTORE_CHUNK_SIZE", "1000"))
+    # `python -m app.server` runs WEB_CONCURRENCY worker processes.
+    SERVER_HOST = os.getenv("HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # GET /health/ready fails while a database round trip takes longer than this.
+    READINESS_MAX_LATENCY_MS = float(os.getenv("READINESS_MAX_LATENCY_MS", "250"))
+    DB_BACKEND = os.getenv("DB_BACKEND", "postgres") # "postgres", "sharded" or "memory" (in-process, not persisted)
+    # Every worker opens up to DB_POOL_MAX_SIZE connections plus one LISTEN
+    # connection; keep replicas * workers * (DB_POOL_MAX_SIZE + 1) below
+    # max_connections, or set DB_CONNECTION_BUDGET (connections per replica,
+    # 0 disables) to derive DB_POOL_MAX_SIZE from it. Pools open all
+    # DB_POOL_MIN_SIZE connections, with their statements prepared, at startup.
+    DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+    DB_POOL_MAX_SIZE = (
+        worker_pool_size(DB_CONNECTION_BUDGET, WEB_CONCURRENCY) if DB_CONNECTION_BUDGET
+        else int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    )
+    DB_POOL_MIN_SIZE = min(int(os.getenv("DB_POOL_MIN_SIZE", str(DB_POOL_MAX_SIZE))), DB_POOL_MAX_SIZE)
+    # Admission control: at most DB_ADMISSION_LIMIT connections in use per
+    # pool (0 means the pool size) and DB_ADMISSION_QUEUE_SIZE callers waiting
+    # for one, health checks first and bulk work last. A caller still waiting
+    # after DB_ADMISSION_DEADLINE seconds gets a 503 with Retry-After.
+    DB_ADMISSION_LIMIT = int(os.getenv("DB_ADMISSION_LIMIT", "0"))
+    DB_ADMISSION_QUEUE_SIZE = int(os.getenv("DB_ADMISSION_QUEUE_SIZE", "100"))
+    DB_ADMISSION_DEADLINE = float(os.getenv("DB_ADMISSION_DEADLINE", "1"))
+    DB_ADMISSION_RETRY_AFTER = float(os.getenv("DB_ADMISSION_RETRY_AFTER", "1"))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+    DB_COMMAND_TIMEOUT = optional_float("DB_COMMAND_TIMEOUT")
+    DB_ACQUIRE_TIMEOUT = optional_float("DB_ACQUIRE_TIMEOUT")
+    # Replicas that fail are skipped for DB_REPLICA_EJECT_SECONDS. After a write,
+    # the client's reads stay on the primary for DB_READ_YOUR_WRITES_WINDOW seconds.
+    DB_REPLICA_EJECT_SECONDS = float(os.getenv("DB_REPLICA_EJECT_SECONDS", "30"))
+    DB_READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "2"))
+    SLOW_QUERY_THRESHOLD_MS = optional_float("SLOW_QUERY_THRESHOLD_MS") # unset disables the slow-query log
 
 settings = Settings()
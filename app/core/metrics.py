@@ -0,0 +1,181 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def set(self, value: float, *label_values):
+        """Export a running total counted elsewhere, such as a component's stats."""
+        self.values[label_values] = value
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series["buckets"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for label_values, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route"),
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP responses by status code.", ("method", "route", "status"),
+))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Time spent executing database queries, by query name.", ("query",),
+))
+DB_POOL_ACQUIRE_DURATION = REGISTRY.register(Histogram(
+    "db_pool_acquire_duration_seconds", "Time spent waiting for a pooled connection.",
+))
+DB_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "db_pool_connections", "Pooled connections by state (in_use, idle, max).", ("state",),
+))
+DB_POOL_ACQUIRE_TIMEOUTS = REGISTRY.register(Counter(
+    "db_pool_acquire_timeouts_total", "Connection acquires that timed out.",
+))
+DB_ADMISSION = REGISTRY.register(Gauge(
+    "db_admission", "Admission control limit, connections in use and queued callers.", ("stat",),
+))
+DB_ADMISSION_ADMITTED = REGISTRY.register(Counter(
+    "db_admission_admitted_total", "Database calls admitted by admission control.",
+))
+DB_ADMISSION_SHED = REGISTRY.register(Counter(
+    "db_admission_shed_total", "Database calls shed with a 503, by request priority.", ("priority",),
+))
+PROFILE_CACHE = REGISTRY.register(Gauge(
+    "profile_cache", "Profile cache size and capacity.", ("stat",),
+))
+PROFILE_CACHE_EVENTS = REGISTRY.register(Counter(
+    "profile_cache_total", "Profile cache hits, misses, evictions and invalidations.", ("stat",),
+))
+DB_SINGLE_FLIGHT = REGISTRY.register(Gauge(
+    "db_single_flight", "Coalesced reads in flight.", ("stat",),
+))
+DB_SINGLE_FLIGHT_EVENTS = REGISTRY.register(Counter(
+    "db_single_flight_total", "Coalesced reads: queries started and queries saved.", ("stat",),
+))
+AUDIT_WRITER_PENDING = REGISTRY.register(Gauge(
+    "audit_writer_pending", "Audit rows queued by the batched audit writer and not yet written.",
+))
+AUDIT_WRITER_DROPPED = REGISTRY.register(Counter(
+    "audit_writer_dropped_total", "Audit rows the batched audit writer could not write and dropped.",
+))
+AUDIT_FEED = REGISTRY.register(Gauge(
+    "audit_feed", "Audit feed subscribers.", ("stat",),
+))
+AUDIT_FEED_EVENTS = REGISTRY.register(Counter(
+    "audit_feed_total", "Audit feed rows published and slow subscribers disconnected.", ("stat",),
+))
+
+# Name of the Database method currently running, used to label its queries.
+current_query = ContextVar("current_query", default="unnamed")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and status of every request,
+    labelled with the matched route template rather than the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", "<unmatched>")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], route_path)
+            HTTP_REQUESTS.inc(scope["method"], route_path, str(status_code))
@@ -0,0 +1,25 @@
+import json
+from datetime import date, datetime, time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+def json_default(value):
+    """Encode the non-JSON types our rows carry: timestamps and asyncpg Records."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if hasattr(value, "items"):
+        return dict(value.items())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    """
+    Serialize rows straight to JSON bytes, with orjson when it is installed.
+    Unlike `jsonable_encoder` this does not rebuild every row and field as
+    Python objects first.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=json_default)
+    return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode()
@@ -0,0 +1,77 @@
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from starlette.requests import cookie_parser
+
+PRIMARY_COOKIE = "db_primary_until"
+
+class ReadSession:
+    """
+    Read-routing state of one client. After the client writes, its reads go
+    to the primary until `primary_until` (a unix time), so it never reads a
+    replica that has not replayed its own write yet.
+    """
+
+    def __init__(self, primary_until: float = 0.0):
+        self.primary_until = primary_until
+        self.pinned = False
+
+    def pin(self, window: float):
+        self.primary_until = max(self.primary_until, time.time() + window)
+        self.pinned = True
+
+    def reads_primary(self) -> bool:
+        return self.primary_until > time.time()
+
+current_session = ContextVar("current_session", default=None)
+primary_reads = ContextVar("primary_reads", default=False)
+
+@contextmanager
+def read_from_primary():
+    """Send the reads made inside the block to the primary."""
+    token = primary_reads.set(True)
+    try:
+        yield
+    finally:
+        primary_reads.reset(token)
+
+def parse_primary_until(headers) -> float:
+    for name, value in headers:
+        if name == b"cookie":
+            try:
+                return float(cookie_parser(value.decode("latin-1")).get(PRIMARY_COOKIE, 0))
+            except ValueError:
+                return 0.0
+    return 0.0
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware carrying a ReadSession across requests in a cookie, so a
+    client's reads stay on the primary for `window` seconds after its writes.
+    """
+
+    def __init__(self, app, window: float):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.window <= 0:
+            return await self.app(scope, receive, send)
+
+        session = ReadSession(parse_primary_until(scope["headers"]))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and session.pinned:
+                cookie = (
+                    f"{PRIMARY_COOKIE}={session.primary_until:.3f}; Max-Age={math.ceil(self.window)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        token = current_session.set(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_session.reset(token)
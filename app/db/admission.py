@@ -0,0 +1,130 @@
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from enum import IntEnum
+from app.core.config import settings
+
+class Priority(IntEnum):
+    HIGH = 0    # health checks
+    NORMAL = 1  # single-user reads and writes, background work
+    LOW = 2     # bulk imports, exports, restores and feeds
+
+# Set per request by the routes (see app.api.dependencies.priority).
+request_priority = ContextVar("request_priority", default=Priority.NORMAL)
+
+class Overloaded(Exception):
+    """Raised instead of queueing for a connection the database cannot hand out in time."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Database is overloaded")
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Limits the connections in use to `limit` and queues at most `queue_size`
+    more callers, served by priority and then in arrival order. A caller that
+    waits longer than `deadline` seconds, or finds the queue full of callers
+    at least as urgent, is shed with Overloaded instead; a full queue sheds
+    its newest least urgent caller to make room for a more urgent one.
+    """
+
+    def __init__(self, limit: int, queue_size: int, deadline: float, retry_after: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.queues = {priority: deque() for priority in Priority}
+        self.admitted = 0
+        self.shed = {priority: 0 for priority in Priority}
+
+    async def admit(self, priority: Priority):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.waiting >= self.queue_size and not self.shed_below(priority):
+            raise self.overloaded(priority)
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues[priority].append(waiter)
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.deadline):
+                await waiter
+        except TimeoutError:
+            self.abandon(priority, waiter)
+            raise self.overloaded(priority) from None
+        except asyncio.CancelledError:
+            self.abandon(priority, waiter)
+            raise
+        self.admitted += 1
+
+    def release(self):
+        for queue in self.queues.values():
+            while queue:
+                waiter = queue.popleft()
+                self.waiting -= 1
+                if not waiter.done():
+                    # The slot passes straight to the waiter, so active stays the same.
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+    def abandon(self, priority: Priority, waiter):
+        # A caller that timed out or was cancelled after release() handed it
+        # the slot, but before it resumed, passes the slot on.
+        if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+            self.release()
+        else:
+            self.discard(priority, waiter)
+
+    def discard(self, priority: Priority, waiter):
+        try:
+            self.queues[priority].remove(waiter)
+        except ValueError:
+            return
+        self.waiting -= 1
+
+    def shed_below(self, priority: Priority) -> bool:
+        for lower in reversed(Priority):
+            if lower <= priority:
+                return False
+            queue = self.queues[lower]
+            while queue:
+                waiter = queue.pop()
+                self.waiting -= 1
+                if not waiter.done():
+                    waiter.set_exception(self.overloaded(lower))
+                    return True
+        return False
+
+    def overloaded(self, priority: Priority) -> Overloaded:
+        self.shed[priority] += 1
+        return Overloaded(self.retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": {priority.name.lower(): count for priority, count in self.shed.items()},
+        }
+
+
+def pool_admission() -> AdmissionController:
+    """Admission control for one pool of DB_POOL_MAX_SIZE connections."""
+    return AdmissionController(
+        limit=settings.DB_ADMISSION_LIMIT or settings.DB_POOL_MAX_SIZE,
+        queue_size=settings.DB_ADMISSION_QUEUE_SIZE,
+        deadline=settings.DB_ADMISSION_DEADLINE,
+        retry_after=settings.DB_ADMISSION_RETRY_AFTER,
+    )
+
+def combined_stats(stats: list[dict]) -> dict:
+    """The stats of several controllers added up, as one worker's or one replica set's."""
+    return {
+        **{key: sum(controller[key] for controller in stats) for key in ("limit", "active", "waiting", "admitted")},
+        "shed": {level.name.lower(): sum(controller["shed"][level.name.lower()] for controller in stats) for level in Priority},
+    }
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# File layout: MAGIC, then row groups of zlib-compressed columns, then a JSON
+# footer with each group's column offsets and min/max zone maps, its length as
+# 8 little-endian bytes, and MAGIC again. Rows are sorted by (timestamp, id).
+MAGIC = b"UAUDIT01"
+SUFFIX = ".uaudit"
+FOOTER_SIZE = struct.Struct("<Q")
+
+INT_COLUMNS = ("id", "user_id", "version", "timestamp")
+TEXT_COLUMNS = ("operation", "name", "email")
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NULL_BOOL = 2
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+def encode_ints(values) -> bytes:
+    column = array("q", values)
+    if sys.byteorder == "big": # pragma: no cover
+        column.byteswap()
+    return column.tobytes()
+
+def decode_ints(data) -> array:
+    column = array("q")
+    column.frombytes(data)
+    if sys.byteorder == "big": # pragma: no cover
+        column.byteswap()
+    return column
+
+
+class ArchiveWriter:
+    """
+    Write audit rows, already sorted by (timestamp, id), to an archive file.
+    The file only appears under its final name once `close` has synced it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.partial = self.path.with_name(self.path.name + ".partial")
+        self.file = open(self.partial, "wb")
+        self.file.write(MAGIC)
+        self.groups = []
+        self.rows = 0
+
+    def write_group(self, rows: list):
+        if not rows:
+            return
+        columns = {name: [row[name] for row in rows] for name in (*INT_COLUMNS[:3], *TEXT_COLUMNS)}
+        columns["timestamp"] = [to_micros(row["timestamp"]) for row in rows]
+        encoded = {name: encode_ints(columns[name]) for name in INT_COLUMNS}
+        encoded.update({name: json.dumps(columns[name]).encode() for name in TEXT_COLUMNS})
+        encoded["deleted"] = bytes(NULL_BOOL if row["deleted"] is None else int(row["deleted"]) for row in rows)
+
+        offsets = {}
+        for name, data in encoded.items():
+            compressed = zlib.compress(data, 6)
+            offsets[name] = (self.file.tell(), len(compressed))
+            self.file.write(compressed)
+        self.groups.append({
+            "rows": len(rows),
+            "columns": offsets,
+            "min_timestamp": columns["timestamp"][0],
+            "max_timestamp": columns["timestamp"][-1],
+            "min_user_id": min(columns["user_id"]),
+            "max_user_id": max(columns["user_id"]),
+        })
+        self.rows += len(rows)
+
+    def close(self):
+        footer = json.dumps({"rows": self.rows, "groups": self.groups}).encode()
+        self.file.write(footer)
+        self.file.write(FOOTER_SIZE.pack(len(footer)))
+        self.file.write(MAGIC)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.partial, self.path)
+
+
+class ArchiveFile:
+    """
+    A memory-mapped archive file. Scans skip row groups by their zone maps and
+    only decompress the columns of the groups they have to read.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if self.view[:len(MAGIC)] != MAGIC or self.view[-len(MAGIC):] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not an audit archive")
+        footer_end = len(self.view) - len(MAGIC) - FOOTER_SIZE.size
+        (footer_size,) = FOOTER_SIZE.unpack(self.view[footer_end:footer_end + FOOTER_SIZE.size])
+        footer = json.loads(bytes(self.view[footer_end - footer_size:footer_end]))
+        self.rows = footer["rows"]
+        self.groups = footer["groups"]
+        self.min_timestamp = self.groups[0]["min_timestamp"] if self.groups else None
+        self.max_timestamp = self.groups[-1]["max_timestamp"] if self.groups else None
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+    def column(self, group: dict, name: str):
+        offset, length = group["columns"][name]
+        data = zlib.decompress(self.view[offset:offset + length])
+        if name in INT_COLUMNS:
+            return decode_ints(data)
+        if name in TEXT_COLUMNS:
+            return json.loads(data)
+        return data
+
+    def scan(self, user_id=None, operation=None, since=None, until=None, before=None):
+        """Yield the matching rows newest first, like ORDER BY timestamp DESC, id DESC."""
+        for group in self.candidate_groups(user_id, since, until, before):
+            yield from self.read_group(group, user_id, operation, since, until, before)
+
+    def candidate_groups(self, user_id=None, since=None, until=None, before=None):
+        """Yield, newest first, the row groups whose zone maps do not rule out a match."""
+        low = to_micros(since) if since is not None else None
+        high = to_micros(until) if until is not None else None
+        cursor = to_micros(before[0]) if before is not None else None
+        for group in reversed(self.groups):
+            if low is not None and group["max_timestamp"] < low:
+                break
+            if high is not None and group["min_timestamp"] >= high:
+                continue
+            if cursor is not None and group["min_timestamp"] > cursor:
+                continue
+            if user_id is not None and not group["min_user_id"] <= user_id <= group["max_user_id"]:
+                continue
+            yield group
+
+    def read_group(self, group, user_id=None, operation=None, since=None, until=None, before=None,
+                   limit: int | None = None) -> list[dict]:
+        """Decode the first `limit` matching rows of one group, newest first."""
+        low = to_micros(since) if since is not None else None
+        high = to_micros(until) if until is not None else None
+        cursor = (to_micros(before[0]), before[1]) if before is not None else None
+        timestamps = self.column(group, "timestamp")
+        ids = self.column(group, "id")
+        start = bisect_left(timestamps, low) if low is not None else 0
+        end = bisect_left(timestamps, high) if high is not None else len(timestamps)
+        if cursor is not None:
+            end = min(end, bisect_right(timestamps, cursor[0]))
+        user_ids = self.column(group, "user_id")
+        matches = [
+            index for index in range(end - 1, start - 1, -1)
+            if (user_id is None or user_ids[index] == user_id)
+            and (cursor is None or (timestamps[index], ids[index]) < cursor)
+        ]
+        if not matches:
+            return []
+        operations = self.column(group, "operation")
+        if operation is not None:
+            matches = [index for index in matches if operations[index] == operation]
+            if not matches:
+                return []
+        matches = matches[:limit]
+        names, emails = self.column(group, "name"), self.column(group, "email")
+        versions, deleted = self.column(group, "version"), self.column(group, "deleted")
+        return [
+            {
+                "id": ids[index],
+                "user_id": user_ids[index],
+                "operation": operations[index],
+                "name": names[index],
+                "email": emails[index],
+                "deleted": None if deleted[index] == NULL_BOOL else bool(deleted[index]),
+                "timestamp": from_micros(timestamps[index]),
+                "version": versions[index],
+            }
+            for index in matches
+        ]
+
+
+class AuditArchive:
+    """
+    The archived months of user_audit in one directory, one file per detached
+    partition. Every archived row is older than every row still in Postgres,
+    so a scan continues into the archive once the live rows run out.
+    """
+
+    def __init__(self, directory, refresh_interval: float = 60, clock=time.monotonic):
+        self.directory = Path(directory)
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.files = {}
+        self.refreshed_at = None
+
+    def path_for(self, partition: str) -> Path:
+        return self.directory / f"{partition}{SUFFIX}"
+
+    def refresh(self, force: bool = False):
+        # Other replicas archive into the same directory, so new files are
+        # picked up every refresh_interval seconds.
+        now = self.clock()
+        if not force and self.refreshed_at is not None and now - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = now
+        if not self.directory.is_dir():
+            return
+        for path in sorted(self.directory.glob(f"*{SUFFIX}")):
+            if path.name not in self.files:
+                self.files[path.name] = ArchiveFile(path)
+
+    def ordered_files(self) -> list[ArchiveFile]:
+        self.refresh()
+        archives = [archive for archive in self.files.values() if archive.groups]
+        return sorted(archives, key=lambda archive: archive.max_timestamp, reverse=True)
+
+    def overlaps(self, since=None, until=None, before=None) -> bool:
+        """Whether any archived row can fall inside the given time range."""
+        for archive in self.ordered_files():
+            if until is not None and archive.min_timestamp >= to_micros(until):
+                continue
+            if before is not None and archive.min_timestamp > to_micros(before[0]):
+                continue
+            if since is not None and archive.max_timestamp < to_micros(since):
+                continue
+            return True
+        return False
+
+    def live_since(self, since=None):
+        """
+        The `since` to read the rows still in Postgres with, so rows of a
+        month that is archived but not yet dropped are only read from its file.
+        """
+        archives = self.ordered_files()
+        if not archives:
+            return since
+        newest = from_micros(archives[0].max_timestamp + 1)
+        return newest if since is None or since < newest else since
+
+    def scan(self, user_id=None, operation=None, since=None, until=None, before=None):
+        for archive in self.ordered_files():
+            yield from archive.scan(user_id, operation, since, until, before)
+
+    async def read(self, user_id=None, operation=None, since=None, until=None, before=None,
+                   limit: int | None = None):
+        """
+        Like `scan`, for the event loop: each row group is decompressed and
+        decoded in a worker thread, and at most `limit` rows are decoded.
+        """
+        for archive in self.ordered_files():
+            for group in archive.candidate_groups(user_id, since, until, before):
+                if limit is not None and limit <= 0:
+                    return
+                rows = await asyncio.to_thread(archive.read_group, group, user_id, operation, since, until, before, limit)
+                if limit is not None:
+                    limit -= len(rows)
+                for row in rows:
+                    yield row
+
+    def close(self):
+        for archive in self.files.values():
+            archive.close()
+        self.files = {}
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import asyncpg
+from contextlib import suppress
+from app.db.admission import Overloaded
+
+AUDIT_COLUMNS = ("user_id", "operation", "name", "email", "deleted", "version", "timestamp")
+
+_STOP = object()
+
+# Errors after which the same batch may well succeed; anything else is about
+# the rows themselves and fails again however often it is retried.
+TRANSIENT_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    Overloaded,
+    asyncpg.PostgresConnectionError,
+    asyncpg.OperatorInterventionError,
+    asyncpg.InsufficientResourcesError,
+    asyncpg.TransactionRollbackError,
+)
+# Writes of one batch before its transient error is treated like any other.
+WRITE_ATTEMPTS = 10
+
+logger = logging.getLogger(__name__)
+
+class AuditWriter:
+    """
+    Write-behind buffer for user_audit rows. Entries are queued by the
+    mutations and flushed in batches once `batch_size` entries are waiting or
+    `flush_interval` seconds after the first one arrived. The queue is bounded,
+    so a slow database makes `submit` wait instead of growing memory.
+
+    A batch failing with a transient error is retried up to `attempts` times;
+    one that still fails is written an entry at a time, and entries that
+    cannot be written are logged and dropped so they do not hold up the rest.
+    """
+
+    def __init__(self, database, batch_size: int, flush_interval: float, queue_size: int, attempts: int = WRITE_ATTEMPTS):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.attempts = attempts
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.flushed = 0
+        self.dropped = 0
+        self.pending = 0
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, entry: tuple):
+        if self._stopping:
+            raise RuntimeError("Audit writer is shutting down")
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self._batch_ready.set()
+        try:
+            await self.queue.put(entry)
+        except asyncio.CancelledError:
+            self.pending -= 1
+            raise
+
+    async def stop(self, timeout: float | None = None):
+        """Flush everything still queued, then stop the background task."""
+        self._stopping = True
+        self._batch_ready.set()
+        await self.queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Audit writer did not drain in time, %d entries dropped", self.pending)
+
+    async def _run(self):
+        # Submitters blocked on a full queue when stop() was called put their
+        # entries after _STOP, so keep going until every submitted entry is written.
+        stopped = False
+        while not stopped or self.pending:
+            first = await self.queue.get()
+            if not self._stopping:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            self._batch_ready.clear()
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            entries = [entry for entry in batch if entry is not _STOP]
+            self.pending -= len(entries)
+            if self.pending >= self.batch_size:
+                self._batch_ready.set()
+            if entries:
+                await self._flush(entries)
+            stopped = stopped or len(entries) != len(batch)
+
+    async def _flush(self, entries: list[tuple]):
+        try:
+            await self._write(entries)
+        except Exception as e:
+            if len(entries) == 1:
+                return self._drop(entries[0], e)
+            logger.warning("Error writing %d audit entries, writing them one at a time: %r", len(entries), e)
+            for entry in entries:
+                try:
+                    await self._write([entry])
+                except Exception as e:
+                    self._drop(entry, e)
+
+    async def _write(self, entries: list[tuple]):
+        delay = self.flush_interval
+        for attempt in range(1, self.attempts + 1):
+            try:
+                await self.database.write_audit_batch(entries)
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.attempts:
+                    raise
+                logger.warning("Error writing %d audit entries, retrying: %r", len(entries), e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            else:
+                self.flushed += len(entries)
+                return
+
+    def _drop(self, entry: tuple, error: Exception):
+        self.dropped += 1
+        logger.error("Dropped audit entry %r: %r", entry, error)
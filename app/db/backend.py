@@ -0,0 +1,145 @@
+from abc import ABC, abstractmethod
+from app.core.config import settings
+
+class EmailTaken(ValueError):
+    """A write would give a user an email another user already has."""
+
+class DatabaseBackend(ABC):
+    """
+    Storage interface the API routes depend on. `Database` implements it on
+    Postgres through asyncpg, `MemoryDatabase` in process.
+
+    Rows are returned as mappings with the columns of the users and
+    user_audit tables; `iter_*` return async iterators of rows and
+    `copy_audit_logs` an async iterator of CSV chunks. The `*_json` methods
+    return a complete, already serialized page body. Writes given `if_match`
+    only apply while the user's updated_at is one of those timestamps.
+    """
+
+    cache = None
+    audit_writer = None
+    feed = None
+    flights = None
+
+    @abstractmethod
+    async def connect(self):
+        ...
+
+    @abstractmethod
+    async def disconnect(self):
+        ...
+
+    @abstractmethod
+    def pool_status(self) -> dict:
+        ...
+
+    @abstractmethod
+    async def ping(self) -> float:
+        """Seconds a round trip to the database takes, including the pool acquire."""
+
+    @abstractmethod
+    async def create_user(self, name: str, email: str):
+        ...
+
+    @abstractmethod
+    async def import_users(self, rows):
+        ...
+
+    @abstractmethod
+    async def existing_emails(self, emails: list[str]) -> set[str]:
+        ...
+
+    @abstractmethod
+    async def get_user(self, user_id: int):
+        ...
+
+    @abstractmethod
+    async def get_users(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        ...
+
+    @abstractmethod
+    async def get_users_json(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        ...
+
+    @abstractmethod
+    async def get_users_changed_at(self):
+        """
+        (latest updated_at of any user, seconds since then). Every write sets
+        updated_at, so an unchanged value means no page of users changed.
+        """
+
+    @abstractmethod
+    def iter_users(self, after: int = 0):
+        ...
+
+    @abstractmethod
+    async def update_user(self, user_id: int, name: str, email: str, if_match: list | None = None):
+        ...
+
+    @abstractmethod
+    async def update_users(self, changes: list[tuple[int, str, str]]):
+        """
+        Apply (id, name, email) changes with distinct ids as one batch. Returns
+        a row per change, in order, with its id and status: "updated" (and the
+        user's name, email and updated_at), "not_found" or "conflict" for an
+        email another user has or an earlier change claimed.
+        """
+
+    @abstractmethod
+    async def delete_user(self, user_id: int, if_match: list | None = None):
+        ...
+
+    @abstractmethod
+    async def delete_users(self, user_ids: list[int]):
+        """Delete distinct users as one batch; a row per id with status "deleted" or "not_found"."""
+
+    @abstractmethod
+    async def get_audit_logs(self, user_id=None, operation=None, since=None, until=None,
+                             before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        ...
+
+    @abstractmethod
+    async def get_audit_logs_json(self, user_id=None, operation=None, since=None, until=None,
+                                  before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        ...
+
+    @abstractmethod
+    def iter_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        ...
+
+    @abstractmethod
+    def copy_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        ...
+
+    @abstractmethod
+    def audit_feed(self, after: str | None = None):
+        """
+        Async iterator of (token, audit row) for every row committed after the
+        position `after` (a token from an earlier event), or from now on.
+        Raises ValueError for a token this backend cannot resume from.
+        """
+
+    @abstractmethod
+    async def get_user_history(self, user_id: int, before: int | None = None,
+                               limit: int = settings.DEFAULT_PAGE_SIZE):
+        """The user's audit rows with a version below `before`, newest first."""
+
+    @abstractmethod
+    async def get_user_audit_restore_version(self, user_id: int, version: int):
+        ...
+
+    @abstractmethod
+    async def get_user_audit_as_of(self, user_id: int, as_of):
+        ...
+
+    @abstractmethod
+    async def restore_user(self, user_id: int, name, email, deleted):
+        ...
+
+    @abstractmethod
+    async def get_user_ids_changed_since(self, since, until=None):
+        ...
+
+    @abstractmethod
+    async def restore_users_as_of(self, user_ids: list[int], as_of):
+        ...
@@ -0,0 +1,42 @@
+import asyncio
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads: the first caller for a key starts
+    the call in a task of its own and later callers for the same key await
+    that task instead of running the call again. Cancelling a caller (e.g. a
+    client disconnecting) only stops its wait, never the shared call. Results
+    are shared between the callers, so they must not be mutated.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.saved = 0
+
+    async def run(self, key, call):
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = asyncio.ensure_future(call())
+            flight.add_done_callback(lambda done: self.land(key, done))
+            self.leaders += 1
+        else:
+            self.saved += 1
+        return await asyncio.shield(flight)
+
+    def land(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        # Retrieve the exception so a call every caller gave up on does not log it as never retrieved.
+        if not flight.cancelled():
+            flight.exception()
+
+    def forget(self, key):
+        """Make later callers for `key` start a new call, e.g. once a write made the running one stale."""
+        self.flights.pop(key, None)
+
+    def clear(self):
+        self.flights.clear()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.flights), "leaders": self.leaders, "saved": self.saved}
@@ -1,101 +1,970 @@
+import asyncio
+import functools
+import logging
+import time
 import asyncpg
-from app.core.config import DATABASE_URL
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from app.core.config import DATABASE_REPLICA_URLS, DATABASE_URL, settings
+from app.core.metrics import DB_POOL_ACQUIRE_DURATION, DB_QUERY_DURATION, current_query
+from app.core.serialization import dumps
+from app.core.sessions import current_session, primary_reads, read_from_primary
+from app.api.pagination import encode_audit_cursor, paginate
+from app.db.admission import combined_stats, pool_admission, request_priority
+from app.db.archive import AuditArchive
+from app.db.audit_writer import AUDIT_COLUMNS, AuditWriter
+from app.db.backend import DatabaseBackend, EmailTaken
+from app.db.cache import MISSING, ProfileCache
+from app.db.coalesce import SingleFlight
+from app.db.export import csv_chunks
+from app.db.feed import AuditFeed, parse_feed_token, parse_notification
+from app.db.listener import Listener
+from app.db.partitions import AuditMaintenance
+from app.db.pool import PoolStats, PreparedConnection
+from app.db.replicas import REPLICA_ERRORS, ReplicaSet
 
-class Database:
-    def __init__(self): # pragma: no cover
+# Statements on the request hot path. They are module constants so the pool's
+# init hook can prepare exactly the text the methods below send.
+GET_USER = "SELECT id, name, email, created_at, updated_at FROM users WHERE id = $1 AND deleted = false;"
+
+GET_USERS_PAGE = """
+    SELECT id, name, email, created_at, updated_at FROM users
+    WHERE deleted = false AND id > $1
+    ORDER BY id
+    LIMIT $2;
+"""
+
+# The same page rendered by Postgres as the complete `GET /users` body, with
+# one row past the page used to decide the next cursor.
+GET_USERS_PAGE_JSON = """
+    WITH page AS (
+        SELECT id, name, email, created_at, updated_at, row_number() OVER (ORDER BY id) AS page_position
+        FROM (
+            SELECT id, name, email, created_at, updated_at FROM users
+            WHERE deleted = false AND id > $1
+            ORDER BY id
+            LIMIT $2::int + 1
+        ) page_rows
+    )
+    SELECT json_build_object(
+        'users', coalesce(
+            json_agg(json_build_object(
+                'id', id, 'name', name, 'email', email, 'created_at', created_at, 'updated_at', updated_at
+            ) ORDER BY id) FILTER (WHERE page_position <= $2::int),
+            '[]'::json
+        ),
+        'next_cursor', CASE WHEN count(*) > $2::int THEN max(id) FILTER (WHERE page_position <= $2::int) END
+    )::text
+    FROM page;
+"""
+
+CREATE_USER = """
+    INSERT INTO users (name, email, deleted, version)
+    VALUES ($1, $2, false, 1)
+    RETURNING id, name, email, deleted, version, updated_at
+"""
+
+UPDATE_USER = """
+    UPDATE users
+    SET name = $1, email = $2, updated_at = CURRENT_TIMESTAMP, version = version + 1
+    WHERE id = $3 AND deleted = false
+    RETURNING id, name, email, deleted, version, updated_at
+"""
+
+# UPDATE_USER for an If-Match request: only while updated_at is one the client has seen.
+UPDATE_USER_IF_MATCH = """
+    UPDATE users
+    SET name = $1, email = $2, updated_at = CURRENT_TIMESTAMP, version = version + 1
+    WHERE id = $3 AND deleted = false AND updated_at = ANY($4::timestamp[])
+    RETURNING id, name, email, deleted, version, updated_at
+"""
+
+DELETE_USER = """
+    UPDATE users
+    SET email = 'deleted_' || id, deleted = true, updated_at = CURRENT_TIMESTAMP, version = version + 1
+    WHERE id = $1
+    RETURNING id, name, email, deleted, version
+"""
+
+DELETE_USER_IF_MATCH = """
+    UPDATE users
+    SET email = 'deleted_' || id, deleted = true, updated_at = CURRENT_TIMESTAMP, version = version + 1
+    WHERE id = $1 AND updated_at = ANY($2::timestamp[])
+    RETURNING id, name, email, deleted, version
+"""
+
+RESTORE_USER = """
+    UPDATE users
+    SET name = $2, email = $3, updated_at = CURRENT_TIMESTAMP, deleted = $4, version = version + 1
+    WHERE id = $1
+    RETURNING id, name, email, deleted, version, updated_at
+"""
+
+# Every write sets updated_at, so its maximum changes whenever any page of
+# GET /users may have; `age` tells how long ago that was.
+GET_USERS_CHANGED_AT = """
+    SELECT max(updated_at) AS changed_at, extract(epoch FROM LOCALTIMESTAMP - max(updated_at))::float8 AS age
+    FROM users;
+"""
+
+# Batch writes, one statement per batch. `payload` has a row per requested
+# change in request order; a row that cannot apply gets a status instead of
+# failing the batch.
+# Batches lock their users in id order before changing any, so two batches
+# with overlapping ids wait for each other instead of deadlocking.
+LOCK_USERS = """
+    locked AS MATERIALIZED (
+        SELECT id FROM users
+        WHERE id = ANY($1::int[]) AND deleted = false
+        ORDER BY id
+        FOR UPDATE
+    )
+"""
+
+UPDATE_USERS_PAYLOAD = f"""
+    payload AS (
+        SELECT * FROM unnest($1::int[], $2::text[], $3::text[]) WITH ORDINALITY AS p(id, name, email, position)
+    ),
+    {LOCK_USERS.strip()},
+    -- An email goes to the user that has it already, or else to the first
+    -- existing user asking for it while no other user has it.
+    accepted AS (
+        SELECT DISTINCT ON (p.email) p.id, p.name, p.email
+        FROM payload p
+        JOIN locked l ON l.id = p.id
+        WHERE NOT EXISTS (SELECT 1 FROM users o WHERE o.email = p.email AND o.id <> p.id)
+        ORDER BY p.email, p.position
+    )
+"""
+
+UPDATE_USERS = """
+    UPDATE users u
+    SET name = a.name, email = a.email, updated_at = CURRENT_TIMESTAMP, version = u.version + 1
+    FROM accepted a
+    WHERE u.id = a.id AND u.deleted = false
+    RETURNING u.id, u.name, u.email, u.deleted, u.version, u.updated_at
+"""
+
+UPDATE_USERS_RESULTS = """
+    SELECT p.id,
+           CASE WHEN c.id IS NOT NULL THEN 'updated'
+                WHEN NOT EXISTS (SELECT 1 FROM users u WHERE u.id = p.id AND u.deleted = false) THEN 'not_found'
+                ELSE 'conflict' END AS status,
+           c.name, c.email, c.deleted, c.version, c.updated_at, LOCALTIMESTAMP AS changed_at
+    FROM payload p
+    LEFT JOIN changed c ON c.id = p.id
+    ORDER BY p.position
+"""
+
+DELETE_USERS_PAYLOAD = f"""
+    payload AS (
+        SELECT * FROM unnest($1::int[]) WITH ORDINALITY AS p(id, position)
+    ),
+    {LOCK_USERS.strip()}
+"""
+
+DELETE_USERS = """
+    UPDATE users u
+    SET email = 'deleted_' || u.id, deleted = true, updated_at = CURRENT_TIMESTAMP, version = u.version + 1
+    FROM locked l
+    WHERE u.id = l.id AND u.deleted = false
+    RETURNING u.id, u.name, u.email, u.deleted, u.version, u.updated_at
+"""
+
+DELETE_USERS_RESULTS = """
+    SELECT p.id, CASE WHEN c.id IS NOT NULL THEN 'deleted' ELSE 'not_found' END AS status,
+           c.name, c.email, c.deleted, c.version, c.updated_at, LOCALTIMESTAMP AS changed_at
+    FROM payload p
+    LEFT JOIN changed c ON c.id = p.id
+    ORDER BY p.position
+"""
+
+GET_AUDIT_VERSION = "SELECT * FROM user_audit WHERE user_id = $1 AND version = $2;"
+
+GET_USER_HISTORY = """
+    SELECT * FROM user_audit
+    WHERE user_id = $1 AND version < $2
+    ORDER BY version DESC
+    LIMIT $3;
+"""
+# user_audit.version is an INT; the history of a user starts below this.
+VERSION_MAX = 2**31 - 1
+
+GET_AUDIT_AS_OF = """
+    SELECT * FROM user_audit
+    WHERE user_id = $1 AND timestamp <= $2
+    ORDER BY timestamp DESC, id DESC
+    LIMIT 1;
+"""
+
+# The unique index that keeps two users from sharing an email.
+USERS_EMAIL_KEY = "users_email_key"
+
+# Runs of a batch update before a unique violation is left to fail the request.
+BATCH_WRITE_ATTEMPTS = 3
+
+USER_COLUMNS = ("id", "name", "email", "updated_at")
+DELETE_COLUMNS = ("id", "name", "email", "deleted")
+
+logger = logging.getLogger(__name__)
+
+replica_eligible = ContextVar("replica_eligible", default=False)
+
+
+def audit_filter_clauses(user_id=None, operation=None, since=None, until=None):
+    clauses, args = [], []
+    for clause, value in (
+        ("user_id = ${}", user_id),
+        ("operation = ${}", operation),
+        ("timestamp >= ${}", since),
+        ("timestamp < ${}", until),
+    ):
+        if value is not None:
+            args.append(value)
+            clauses.append(clause.format(len(args)))
+    return clauses, args
+
+def audit_page_clauses(user_id=None, operation=None, since=None, until=None, before=None):
+    clauses, args = audit_filter_clauses(user_id, operation, since, until)
+    if before is not None:
+        args.extend(before)
+        clauses.append(f"(timestamp, id) < (${len(args) - 1}, ${len(args)})")
+    return clauses, args
+
+async def chain_rows(*iterators):
+    for iterator in iterators:
+        async for row in iterator:
+            yield row
+
+def where_clause(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+def named_query(method):
+    """Label the queries run by a Database method with the method's name."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        token = current_query.set(method.__name__)
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            current_query.reset(token)
+    return wrapper
+
+def replica_read(method):
+    """Let the queries of a read-only Database method run on a replica."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        token = replica_eligible.set(True)
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            replica_eligible.reset(token)
+    return wrapper
+
+def coalesced(method):
+    """
+    Let concurrent identical calls of a read-only Database method share one
+    execution. Clients reading their own writes from the primary run theirs
+    alone, since a call already running may have started before the write.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if self.reads_primary():
+            return await method(self, *args, **kwargs)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        return await self.flights.run(key, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+@contextmanager
+def timed_query():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        name = current_query.get()
+        DB_QUERY_DURATION.observe(elapsed, name)
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is not None and elapsed * 1000 >= threshold:
+            logger.warning("Slow query %s took %.1f ms", name, elapsed * 1000)
+
+
+class Database(DatabaseBackend):
+    def __init__(self, dsn: str | None = None, replica_dsns: list[str] | None = None,
+                 archive_dir: str | None = None, audit_id_step: int = 1): # pragma: no cover
+        self.dsn = dsn or DATABASE_URL
         self.pool = None
+        self.pool_stats = PoolStats()
+        replica_dsns = DATABASE_REPLICA_URLS if replica_dsns is None else replica_dsns
+        self.replicas = ReplicaSet(replica_dsns, settings.DB_REPLICA_EJECT_SECONDS)
+        # Each pool, the primary's and every replica's, admits its own callers.
+        self.admission = pool_admission()
+        self.audit_writer = None
+        self.archive = AuditArchive(archive_dir or settings.AUDIT_ARCHIVE_DIR)
+        self.maintenance = None
+        self.feed = AuditFeed(
+            settings.AUDIT_FEED_BUFFER_SIZE,
+            settings.AUDIT_FEED_HISTORY_SIZE,
+            lookback=settings.AUDIT_FEED_LOOKBACK,
+            step=audit_id_step,
+        )
+        self.listener = None
+        self.cache = None
+        self.flights = SingleFlight()
 
     async def connect(self): # pragma: no cover
+        if settings.AUDIT_DURABILITY not in ("sync", "batched"):
+            raise ValueError(f"Unknown AUDIT_DURABILITY: {settings.AUDIT_DURABILITY}")
+        # The durability mode decides the text of the write statements, so it
+        # has to be known before the pool prepares them.
+        if settings.AUDIT_DURABILITY == "batched":
+            self.audit_writer = AuditWriter(
+                self,
+                batch_size=settings.AUDIT_BATCH_SIZE,
+                flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+                queue_size=settings.AUDIT_QUEUE_SIZE,
+            )
+        # Pools open their connections (and prepare the hot statements on
+        # each) concurrently, so startup takes one round of connects.
+        await asyncio.gather(
+            self.connect_primary(),
+            *(self.connect_replica(replica) for replica in self.replicas.replicas),
+        )
+        if self.audit_writer:
+            self.audit_writer.start()
+        self.listener = Listener(self.dsn)
+        if settings.PROFILE_CACHE_SIZE > 0:
+            self.cache = ProfileCache(settings.PROFILE_CACHE_SIZE, settings.PROFILE_CACHE_TTL)
+            self.listener.on_reset.append(self.cache.clear)
+            await self.listener.listen("user_changed", self.on_user_changed)
+        self.listener.on_reset.append(self.flights.clear)
+        self.listener.on_reset.append(self.feed.reset)
+        await self.listener.listen("user_audit", self.on_audit_committed)
+        await self.listener.start()
+        if settings.AUDIT_MAINTENANCE_INTERVAL > 0:
+            self.maintenance = AuditMaintenance(
+                self,
+                self.archive,
+                interval=settings.AUDIT_MAINTENANCE_INTERVAL,
+                months_ahead=settings.AUDIT_PARTITIONS_AHEAD,
+                retention_months=settings.AUDIT_RETENTION_MONTHS,
+                group_size=settings.AUDIT_ARCHIVE_GROUP_SIZE,
+                shared=settings.AUDIT_ARCHIVE_SHARED,
+            )
+            self.maintenance.start()
+
+    async def connect_primary(self): # pragma: no cover
         try:
-            self.pool = await asyncpg.create_pool(DATABASE_URL)
+            self.pool = await self.create_pool(self.dsn, self.init_connection)
             print("Connected to database successfully.")
         except Exception as e:
             print(f"Error connecting to database: {e}")
             raise
 
+    async def connect_replica(self, replica): # pragma: no cover
+        # A replica that is down at startup is left out rather than failing
+        # the whole service; its reads go to the other replicas or the primary.
+        try:
+            replica.pool = await self.create_pool(replica.dsn, self.init_replica_connection)
+            print(f"Connected to {replica.name} successfully.")
+        except Exception as e:
+            print(f"Error connecting to {replica.name}: {e}")
+
     async def disconnect(self): # pragma: no cover
+        if self.maintenance:
+            await self.maintenance.stop()
+            self.maintenance = None
+        # Drain queued audit rows while the pool is still open.
+        if self.audit_writer:
+            await self.audit_writer.stop(timeout=settings.AUDIT_DRAIN_TIMEOUT)
+            self.audit_writer = None
+        if self.listener:
+            await self.listener.stop()
+        for replica in self.replicas.replicas:
+            if replica.pool is not None:
+                await replica.pool.close()
         await self.pool.close()
+        self.archive.close()
 
-    async def execute(self, query, *args): # pragma: no cover
-        async with self.pool.acquire() as connection:
-            return await connection.execute(query, *args)
+    async def create_pool(self, dsn: str, init): # pragma: no cover
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            command_timeout=settings.DB_COMMAND_TIMEOUT,
+            connection_class=PreparedConnection,
+            init=init,
+        )
 
-    async def fetch(self, query, *args): # pragma: no cover
-        async with self.pool.acquire() as connection:
-            return await connection.fetch(query, *args)
+    @property
+    def profile_cache(self):
+        # Without a live LISTEN connection, writes made by other replicas would
+        # go unnoticed, so the cache is bypassed until it is back.
+        if self.cache is None or self.listener is None or not self.listener.connected:
+            return None
+        return self.cache
 
-    async def fetchrow(self, query, *args): # pragma: no cover
-        async with self.pool.acquire() as connection:
-            return await connection.fetchrow(query, *args)
+    def on_user_changed(self, payload: str):
+        self.invalidate_user(int(payload))
 
-    async def log_audit(self, user_id, operation, deleted, name=None, email=None):
-        query = """
-        INSERT INTO user_audit (user_id, operation, name, email, deleted)
-        VALUES ($1, $2, $3, $4, $5);
+    def on_audit_committed(self, payload: str):
+        self.feed.publish(parse_notification(payload))
+
+    def invalidate_user(self, user_id: int):
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
+        self.flights.forget(("get_user", user_id))
+
+    def read_queries(self) -> list[str]:
+        return [GET_USER, GET_USERS_PAGE, GET_USERS_PAGE_JSON, GET_USERS_CHANGED_AT, GET_AUDIT_VERSION, GET_AUDIT_AS_OF,
+                GET_USER_HISTORY]
+
+    def hot_queries(self) -> list[str]:
+        return [
+            *self.read_queries(),
+            self.audited_query(CREATE_USER, "CREATE"),
+            self.audited_query(UPDATE_USER, "UPDATE"),
+            self.audited_query(RESTORE_USER, "RESTORE"),
+            self.audited_query(DELETE_USER, "DELETE", DELETE_COLUMNS),
+        ]
+
+    async def init_connection(self, connection): # pragma: no cover
+        for query in self.hot_queries():
+            connection.prepared[query] = await connection.prepare(query)
+
+    async def init_replica_connection(self, connection): # pragma: no cover
+        for query in self.read_queries():
+            connection.prepared[query] = await connection.prepare(query)
+
+    def reads_primary(self) -> bool:
+        """Whether reads are pinned to the primary, for a block or for the current client."""
+        if primary_reads.get():
+            return True
+        session = current_session.get()
+        return session is not None and session.reads_primary()
+
+    def choose_replica(self):
+        if not self.replicas or self.reads_primary():
+            return None
+        return self.replicas.choose()
+
+    def pin_session(self):
+        """Keep the current client's reads on the primary for a while after a write."""
+        session = current_session.get()
+        if session is not None and self.replicas:
+            session.pin(settings.DB_READ_YOUR_WRITES_WINDOW)
+
+    async def acquire_from(self, pool, stats: PoolStats):
+        started = time.perf_counter()
+        try:
+            connection = await pool.acquire(timeout=settings.DB_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            stats.acquire_timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        stats.record_acquire(waited)
+        DB_POOL_ACQUIRE_DURATION.observe(waited)
+        return connection
+
+    async def admitted_connection(self, admission, pool, stats: PoolStats):
+        await admission.admit(request_priority.get())
+        try:
+            return await self.acquire_from(pool, stats)
+        except BaseException:
+            admission.release()
+            raise
+
+    @asynccontextmanager
+    async def acquire(self, read_only: bool = False):
+        """
+        Acquire a primary connection, or with `read_only` a replica one when a
+        healthy replica is available, once the admission control of that pool
+        lets the caller in at its request priority; raises Overloaded when the
+        caller is shed instead. A replica that cannot hand out a connection is
+        skipped for this call (and ejected if it is broken).
         """
-        await self.execute(query, user_id, operation, name, email, deleted)
+        replica = self.choose_replica() if read_only else None
+        if replica is not None:
+            try:
+                connection = await self.admitted_connection(replica.admission, replica.pool, replica.stats)
+            except asyncio.TimeoutError:
+                replica = None
+            except REPLICA_ERRORS as e:
+                self.replicas.eject(replica, e)
+                replica = None
+        if replica is None:
+            connection = await self.admitted_connection(self.admission, self.pool, self.pool_stats)
+        pool, admission = (replica.pool, replica.admission) if replica is not None else (self.pool, self.admission)
+        try:
+            yield connection
+        except REPLICA_ERRORS as e:
+            if replica is not None:
+                self.replicas.eject(replica, e)
+            raise
+        finally:
+            await pool.release(connection)
+            admission.release()
+
+    def pool_status(self) -> dict:
+        return {
+            **self.pool_stats.snapshot(self.pool),
+            "replicas": self.replicas.status(),
+            "admission": combined_stats([
+                self.admission.stats(), *(replica.admission.stats() for replica in self.replicas.replicas)
+            ]),
+        }
 
+    async def ping(self) -> float:
+        if self.pool is None:
+            raise ConnectionError("Database is not connected")
+        started = time.perf_counter()
+        async with self.acquire() as connection:
+            await connection.fetchval("SELECT 1;")
+        return time.perf_counter() - started
+
+    async def execute(self, query, *args):
+        async with self.acquire() as connection:
+            with timed_query():
+                return await connection.execute(query, *args)
+
+    async def fetch(self, query, *args):
+        async with self.acquire(read_only=replica_eligible.get()) as connection:
+            statement = connection.prepared.get(query)
+            with timed_query():
+                if statement is not None:
+                    return await statement.fetch(*args)
+                return await connection.fetch(query, *args)
+
+    async def fetchrow(self, query, *args):
+        async with self.acquire(read_only=replica_eligible.get()) as connection:
+            statement = connection.prepared.get(query)
+            with timed_query():
+                if statement is not None:
+                    return await statement.fetchrow(*args)
+                return await connection.fetchrow(query, *args)
+
+    async def cursor(self, query, *args, read_only: bool = True): # pragma: no cover
+        # Server-side cursors only live inside a transaction; rows are pulled
+        # from Postgres in batches of STREAM_PREFETCH as the consumer iterates.
+        async with self.acquire(read_only=read_only) as connection:
+            async with connection.transaction():
+                async for record in connection.cursor(query, *args, prefetch=settings.STREAM_PREFETCH):
+                    yield record
+
+    async def copy_out(self, query, *args, **copy_options): # pragma: no cover
+        # COPY ... TO STDOUT pushes data as fast as Postgres produces it, so the
+        # chunks go through a bounded queue that blocks the copy while the
+        # client is slower than the database.
+        chunks = asyncio.Queue(maxsize=settings.EXPORT_QUEUE_SIZE)
+
+        async def copy():
+            try:
+                async with self.acquire(read_only=True) as connection:
+                    await connection.copy_from_query(query, *args, output=chunks.put, **copy_options)
+            finally:
+                await chunks.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            await task
+        finally:
+            task.cancel()
+            while not chunks.empty():
+                chunks.get_nowait()
+
+    def audited_query(self, statement: str, operation: str, columns=USER_COLUMNS) -> str:
+        if self.audit_writer is None:
+            return f"""
+                WITH changed AS ({statement}),
+                audit AS (
+                    INSERT INTO user_audit (user_id, operation, name, email, deleted, version)
+                    SELECT id, '{operation}', name, email, deleted, version FROM changed
+                )
+                SELECT {', '.join(columns)} FROM changed;
+            """
+        return f"WITH changed AS ({statement}) SELECT *, LOCALTIMESTAMP AS changed_at FROM changed;"
+
+    async def write_audited(self, statement: str, operation: str, *args, columns=USER_COLUMNS):
+        """
+        Run a users mutation and record it in user_audit. `statement` must
+        bump users.version and return id, name, email, deleted and version.
+
+        With sync durability the audit insert is part of the same statement, so
+        both commit together in one round trip. With batched durability the
+        audit row is handed to the audit writer instead.
+        """
+        query = self.audited_query(statement, operation, columns)
+        self.pin_session()
+        try:
+            changed = await self.fetchrow(query, *args)
+        except asyncpg.UniqueViolationError as e:
+            if e.constraint_name != USERS_EMAIL_KEY:
+                raise
+            raise EmailTaken("Email already exists") from e
+        if self.audit_writer is None or changed is None:
+            return changed
+        await self.audit_writer.submit(
+            (
+                changed["id"], operation, changed["name"], changed["email"],
+                changed["deleted"], changed["version"], changed["changed_at"],
+            )
+        )
+        return {column: changed[column] for column in columns}
+
+    def audited_batch_query(self, payload: str, statement: str, operation: str, results: str) -> str:
+        """
+        The set-based counterpart of audited_query: `statement` updates users
+        FROM the `payload` CTEs, and `results` selects one row per payload row
+        from payload and the changed rows.
+        """
+        audit = ""
+        if self.audit_writer is None:
+            audit = f""",
+                audit AS (
+                    INSERT INTO user_audit (user_id, operation, name, email, deleted, version)
+                    SELECT id, '{operation}', name, email, deleted, version FROM changed
+                )"""
+        return f"WITH {payload}, changed AS ({statement}){audit} {results};"
+
+    async def write_audited_batch(self, payload: str, statement: str, operation: str, results: str, *args):
+        """
+        Run a batch of users mutations and record them in user_audit, like
+        write_audited: in the same statement with sync durability, through the
+        audit writer with batched durability. Returns the per-row results.
+        """
+        query = self.audited_batch_query(payload, statement, operation, results)
+        self.pin_session()
+        rows = await self.fetch(query, *args)
+        changed = [row for row in rows if row["version"] is not None]
+        for row in changed:
+            if self.audit_writer is not None:
+                await self.audit_writer.submit(
+                    (row["id"], operation, row["name"], row["email"], row["deleted"], row["version"], row["changed_at"])
+                )
+            self.invalidate_user(row["id"])
+        return rows
+
+    @named_query
+    async def write_audit_batch(self, entries: list[tuple]): # pragma: no cover
+        async with self.acquire() as connection:
+            with timed_query():
+                await connection.copy_records_to_table("user_audit", records=entries, columns=AUDIT_COLUMNS)
+
+    @named_query
     async def create_user(self, name: str, email: str):
+        return await self.write_audited(CREATE_USER, "CREATE", name, email)
+
+    @named_query
+    async def import_users(self, rows): # pragma: no cover
+        """
+        Bulk-create users from (line, name, email) tuples: COPY them into a
+        staging table, then insert and audit them in one set-based statement.
+        Returns (line, email, id) per row, with id None for duplicate emails.
+        """
         query = """
-        INSERT INTO users (name, email, deleted)
-        VALUES ($1, $2, false)
-        RETURNING id, name, email;
+            WITH staged AS (
+                SELECT DISTINCT ON (email) line, name, email FROM users_import ORDER BY email, line
+            ),
+            inserted AS (
+                INSERT INTO users (name, email, deleted, version)
+                SELECT name, email, false, 1 FROM staged ORDER BY line
+                ON CONFLICT (email) DO NOTHING
+                RETURNING id, name, email, deleted, version
+            ),
+            audit AS (
+                INSERT INTO user_audit (user_id, operation, name, email, deleted, version)
+                SELECT id, 'CREATE', name, email, deleted, version FROM inserted
+            )
+            SELECT u.line, u.email, i.id
+            FROM users_import u
+            LEFT JOIN staged s ON s.line = u.line
+            LEFT JOIN inserted i ON i.email = s.email
+            ORDER BY u.line;
         """
-        user = await self.fetchrow(query, name, email)
-        await self.log_audit(user["id"], "CREATE", False, name, email)
-        return user
+        self.pin_session()
+        async with self.acquire() as connection:
+            with timed_query():
+                async with connection.transaction():
+                    await connection.execute(
+                        "CREATE TEMP TABLE users_import (line INT, name VARCHAR(255), email VARCHAR(255)) ON COMMIT DROP;"
+                    )
+                    await connection.copy_records_to_table("users_import", records=rows)
+                    return await connection.fetch(query)
 
+    @named_query
+    async def existing_emails(self, emails: list[str]) -> set[str]:
+        rows = await self.fetch("SELECT email FROM users WHERE email = ANY($1::text[]);", emails)
+        return {row["email"] for row in rows}
+
+    @named_query
+    @replica_read
     async def get_user(self, user_id: int):
-        query = "SELECT id, name, email, created_at, updated_at FROM users WHERE id = $1 AND deleted = false;"
-        return await self.fetchrow(query, user_id)
+        cache = self.profile_cache
+        if cache is not None:
+            user = cache.get(user_id)
+            if user is not MISSING:
+                return user
+        # Concurrent misses for one user share a query. Writes to the user
+        # forget it (see invalidate_user), so it never predates a commit a
+        # later caller already saw. Without the cache the query may run on a
+        # replica, so clients reading their own writes run theirs alone.
+        if self.reads_primary():
+            return await self.load_user(user_id)
+        return await self.flights.run(("get_user", user_id), lambda: self.load_user(user_id))
+
+    async def load_user(self, user_id: int):
+        cache = self.profile_cache
+        if cache is None:
+            return await self.fetchrow(GET_USER, user_id)
+
+        generation = cache.generation
+        # Invalidations come from the primary, so a lagging replica could
+        # refill the cache with the row they just invalidated.
+        with read_from_primary():
+            user = await self.fetchrow(GET_USER, user_id)
+        if user is not None:
+            cache.put(user_id, user, generation)
+        return user
+
+    @named_query
+    @replica_read
+    async def get_users(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        return await self.fetch(GET_USERS_PAGE, after, limit)
 
-    async def get_users(self):
-        query = "SELECT id, name, email, created_at, updated_at FROM users WHERE deleted = false;"
-        return await self.fetch(query)
+    @named_query
+    @replica_read
+    async def get_users_json(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        return (await self.fetchrow(GET_USERS_PAGE_JSON, after, limit))[0]
 
-    async def update_user(self, user_id: int, name: str, email: str):
+    @named_query
+    @replica_read
+    async def get_users_changed_at(self):
+        row = await self.fetchrow(GET_USERS_CHANGED_AT)
+        return row["changed_at"], row["age"]
+
+    def iter_users(self, after: int = 0):
         query = """
-            UPDATE users
-            SET name = $1, email = $2, updated_at = CURRENT_TIMESTAMP
-            WHERE id = $3 AND deleted = false
-            RETURNING id, name, email;
-        """
-        user = await self.fetchrow(query, name, email, user_id)
-        if user:
-            await self.log_audit(user_id, "UPDATE", False, name, email)
+            SELECT id, name, email, created_at, updated_at FROM users
+            WHERE deleted = false AND id > $1
+            ORDER BY id;
+        """
+        return self.cursor(query, after)
+
+    @named_query
+    async def update_user(self, user_id: int, name: str, email: str, if_match: list | None = None):
+        if if_match is None:
+            user = await self.write_audited(UPDATE_USER, "UPDATE", name, email, user_id)
+        else:
+            user = await self.write_audited(UPDATE_USER_IF_MATCH, "UPDATE", name, email, user_id, if_match)
+        self.invalidate_user(user_id)
         return user
 
-    async def delete_user(self, user_id: int):
-        deleted_unique_string = f'deleted_{user_id}'
-        query = f"UPDATE users SET email = '{deleted_unique_string}', deleted = true WHERE id = $1 RETURNING id, name, email, deleted;"
-        user = await self.fetchrow(query, user_id)
-        if user:
-            await self.log_audit(user_id, "DELETE", True, user['name'], user['email'])
+    @named_query
+    async def update_users(self, changes: list[tuple[int, str, str]]):
+        if not changes:
+            return []
+        user_ids, names, emails = (list(column) for column in zip(*changes))
+        for attempt in range(BATCH_WRITE_ATTEMPTS):
+            try:
+                return await self.write_audited_batch(
+                    UPDATE_USERS_PAYLOAD, UPDATE_USERS, "UPDATE", UPDATE_USERS_RESULTS, user_ids, names, emails,
+                )
+            except asyncpg.UniqueViolationError:
+                # Another write took one of the emails after the statement's
+                # snapshot; run it again, which reports that user as a conflict.
+                if attempt == BATCH_WRITE_ATTEMPTS - 1:
+                    raise
+
+    @named_query
+    async def delete_user(self, user_id: int, if_match: list | None = None):
+        if if_match is None:
+            user = await self.write_audited(DELETE_USER, "DELETE", user_id, columns=DELETE_COLUMNS)
+        else:
+            user = await self.write_audited(DELETE_USER_IF_MATCH, "DELETE", user_id, if_match, columns=DELETE_COLUMNS)
+        self.invalidate_user(user_id)
         return user
 
-    async def get_audit_logs(self):
-        query = "SELECT * FROM user_audit ORDER BY timestamp DESC;"
-        return await self.fetch(query)
+    @named_query
+    async def delete_users(self, user_ids: list[int]):
+        if not user_ids:
+            return []
+        return await self.write_audited_batch(DELETE_USERS_PAYLOAD, DELETE_USERS, "DELETE", DELETE_USERS_RESULTS, user_ids)
 
-    async def get_user_audit_restore_version(self, user_id: int, version: int):
-        query = """
+    @named_query
+    @replica_read
+    @coalesced
+    async def get_audit_logs(self, user_id=None, operation=None, since=None, until=None,
+                             before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        archived = self.archive.overlaps(since, until, before)
+        live_since = self.archive.live_since(since) if archived else since
+        clauses, args = audit_page_clauses(user_id, operation, live_since, until, before)
+        args.append(limit)
+        query = f"""
             SELECT * FROM user_audit
-            WHERE user_id = $1
-            ORDER BY id ASC
-            LIMIT 1 OFFSET $2;
-            """
-        return await self.fetchrow(query, user_id, version - 1)
+            {where_clause(clauses)}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ${len(args)};
+        """
+        logs = await self.fetch(query, *args)
+        # A short page ran out of live rows; the older ones may be archived.
+        if len(logs) < limit and archived:
+            archived = self.archive.read(user_id, operation, since, until, before, limit - len(logs))
+            logs = [*logs, *[row async for row in archived]]
+        return logs
 
-    async def restore_user(self, user_id: int, name, email, deleted):
-        restore_query = """
-            UPDATE users
-            SET name = $2, email = $3, updated_at = CURRENT_TIMESTAMP, deleted = $4
-            WHERE id = $1
-            RETURNING id, name, email;
+    @named_query
+    @replica_read
+    @coalesced
+    async def get_audit_logs_json(self, user_id=None, operation=None, since=None, until=None,
+                                  before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        if self.archive.overlaps(since, until, before):
+            logs = await self.get_audit_logs(user_id, operation, since, until, before, limit + 1)
+            logs, next_cursor = paginate(logs, limit, encode_audit_cursor)
+            return dumps({"audit_logs": logs, "next_cursor": next_cursor})
+        clauses, args = audit_page_clauses(user_id, operation, since, until, before)
+        args.append(limit)
+        limit_arg = f"${len(args)}::int"
+        query = f"""
+            WITH page AS (
+                SELECT *, row_number() OVER (ORDER BY timestamp DESC, id DESC) AS page_position
+                FROM (
+                    SELECT * FROM user_audit
+                    {where_clause(clauses)}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT {limit_arg} + 1
+                ) page_rows
+            )
+            SELECT json_build_object(
+                'audit_logs', coalesce(
+                    json_agg(json_build_object(
+                        'id', id, 'user_id', user_id, 'operation', operation, 'name', name, 'email', email,
+                        'deleted', deleted, 'timestamp', page.timestamp, 'version', version
+                    ) ORDER BY page_position) FILTER (WHERE page_position <= {limit_arg}),
+                    '[]'::json
+                ),
+                'next_cursor', CASE WHEN count(*) > {limit_arg} THEN
+                    max((to_json(page.timestamp) #>> '{{}}') || ',' || page.id) FILTER (WHERE page_position = {limit_arg})
+                END
+            )::text
+            FROM page;
         """
-        restored_user =  await self.fetchrow(restore_query, user_id, name, email, deleted)
+        return (await self.fetchrow(query, *args))[0]
+
+    def iter_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        archived = self.archive.overlaps(since, until)
+        live_since = self.archive.live_since(since) if archived else since
+        clauses, args = audit_filter_clauses(user_id, operation, live_since, until)
+        query = f"SELECT * FROM user_audit {where_clause(clauses)} ORDER BY timestamp DESC, id DESC;"
+        rows = self.cursor(query, *args)
+        if archived:
+            return chain_rows(rows, self.archived_audit_logs(user_id, operation, since, until))
+        return rows
+
+    def copy_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        archived = self.archive.overlaps(since, until)
+        live_since = self.archive.live_since(since) if archived else since
+        clauses, args = audit_filter_clauses(user_id, operation, live_since, until)
+        query = f"SELECT * FROM user_audit {where_clause(clauses)} ORDER BY timestamp DESC, id DESC"
+        chunks = self.copy_out(query, *args, format="csv", header=True)
+        if archived:
+            archived = self.archived_audit_logs(user_id, operation, since, until)
+            return chain_rows(chunks, csv_chunks(archived, header=False))
+        return chunks
+
+    def audit_feed(self, after: str | None = None):
+        position = self.feed.position(*parse_feed_token(after, 1)[0]) if after is not None else None
+        return self.feed.follow(position, self.audit_after)
+
+    def audit_after(self, after: int, missing: list[int]):
+        # Read on the primary: the live rows come from it, and a lagging
+        # replica could miss rows that were already published.
+        return self.cursor(
+            "SELECT * FROM user_audit WHERE id > $1 OR id = ANY($2::int[]) ORDER BY id;",
+            after, missing, read_only=False,
+        )
 
-        if restored_user:
-            await self.log_audit(user_id, "RESTORE", deleted, name, email)
+    async def archived_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        async for row in self.archive.read(user_id, operation, since, until):
+            yield row
 
-        return  restored_user
+    @named_query
+    @replica_read
+    async def get_user_audit_restore_version(self, user_id: int, version: int):
+        return await self.fetchrow(GET_AUDIT_VERSION, user_id, version)
+
+    @named_query
+    @replica_read
+    async def get_user_history(self, user_id: int, before: int | None = None,
+                               limit: int = settings.DEFAULT_PAGE_SIZE):
+        return await self.fetch(GET_USER_HISTORY, user_id, before or VERSION_MAX, limit)
+
+    @named_query
+    @replica_read
+    async def get_user_audit_as_of(self, user_id: int, as_of):
+        return await self.fetchrow(GET_AUDIT_AS_OF, user_id, as_of)
+
+    @named_query
+    async def restore_user(self, user_id: int, name, email, deleted):
+        user = await self.write_audited(RESTORE_USER, "RESTORE", user_id, name, email, deleted)
+        self.invalidate_user(user_id)
+        return user
+
+    @named_query
+    @replica_read
+    async def get_user_ids_changed_since(self, since, until=None):
+        query = """
+            SELECT DISTINCT user_id FROM user_audit
+            WHERE timestamp > $1 AND ($2::timestamp IS NULL OR timestamp <= $2)
+            ORDER BY user_id;
+        """
+        return [row["user_id"] for row in await self.fetch(query, since, until)]
+
+    @named_query
+    async def restore_users_as_of(self, user_ids: list[int], as_of):
+        """
+        Restore every user in `user_ids` to its latest audit entry at or before
+        `as_of` and audit it, in one statement. Users already in that state or
+        without history before `as_of` are left alone. Returns the restored ids.
+        """
+        # Deleted users are locked too, as restoring one undeletes it.
+        query = """
+            WITH locked AS MATERIALIZED (
+                SELECT id FROM users
+                WHERE id = ANY($1::int[])
+                ORDER BY id
+                FOR UPDATE
+            ),
+            target AS (
+                SELECT DISTINCT ON (user_id) user_id, name, email, deleted
+                FROM user_audit
+                WHERE user_id = ANY($1::int[]) AND timestamp <= $2
+                ORDER BY user_id, timestamp DESC, id DESC
+            ),
+            restored AS (
+                UPDATE users u
+                SET name = t.name, email = t.email, deleted = t.deleted,
+                    updated_at = CURRENT_TIMESTAMP, version = u.version + 1
+                FROM target t
+                JOIN locked l ON l.id = t.user_id
+                WHERE u.id = t.user_id
+                  AND (u.name, u.email, u.deleted) IS DISTINCT FROM (t.name, t.email, t.deleted)
+                RETURNING u.id, u.name, u.email, u.deleted, u.version
+            ),
+            audit AS (
+                INSERT INTO user_audit (user_id, operation, name, email, deleted, version)
+                SELECT id, 'RESTORE', name, email, deleted, version FROM restored
+            )
+            SELECT id FROM restored ORDER BY id;
+        """
+        self.pin_session()
+        try:
+            restored = [row["id"] for row in await self.fetch(query, user_ids, as_of)]
+        except asyncpg.UniqueViolationError as e:
+            raise EmailTaken("A restored email belongs to another user") from e
+        for user_id in restored:
+            self.invalidate_user(user_id)
+        return restored
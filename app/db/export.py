@@ -0,0 +1,35 @@
+import csv
+import io
+from datetime import datetime
+from app.core.config import settings
+
+# Column order of `SELECT * FROM user_audit`.
+AUDIT_FIELDS = ("id", "user_id", "operation", "name", "email", "deleted", "timestamp", "version")
+
+def csv_value(value):
+    # Match the text Postgres' COPY ... CSV writes for these types.
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+async def csv_chunks(rows, fields=AUDIT_FIELDS, header: bool = True):
+    """
+    Render an async iterable of rows as CSV with a header line, in chunks of
+    STREAM_PREFETCH rows, like `COPY ... TO STDOUT (FORMAT csv, HEADER)`.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(fields)
+    count = 0
+    async for row in rows:
+        writer.writerow([csv_value(row[field]) for field in fields])
+        count += 1
+        if count % settings.STREAM_PREFETCH == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
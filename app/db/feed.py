@@ -0,0 +1,184 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime
+
+def parse_feed_token(token: str, parts: int) -> list[tuple[int, list[int]]]:
+    """
+    Split a feed resume token into one (last id, missing ids) pair per shard,
+    e.g. "812", "812~805~810" or "812.404".
+    """
+    try:
+        positions = [[int(audit_id) for audit_id in part.split("~")] for part in token.split(".")]
+    except ValueError:
+        raise ValueError(f"Invalid feed token: {token!r}")
+    if len(positions) != parts or any(
+        last < 0 or not all(0 <= audit_id < last for audit_id in missing) for last, *missing in positions
+    ):
+        raise ValueError(f"Invalid feed token: {token!r}")
+    return [(last, missing) for last, *missing in positions]
+
+def parse_notification(payload: str) -> dict:
+    entry = json.loads(payload)
+    entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+    return entry
+
+
+class Subscription:
+    def __init__(self, buffer_size: int):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.closed = False
+
+    def close(self):
+        # Wake a subscriber waiting on an empty queue; a full one drains first.
+        self.closed = True
+        if self.queue.empty():
+            self.queue.put_nowait(None)
+
+
+class FeedPosition:
+    """
+    How far a client has read one database's audit rows: every id up to
+    `last` except the `missing` ones. Ids are taken before their rows commit,
+    so a lower id can still commit after a higher one was sent; the ids
+    skipped within `lookback` of `last` stay in the token until they arrive,
+    and older ones are taken to have been rolled back. `step` is the id
+    sequence's increment.
+    """
+
+    def __init__(self, last: int | None = None, missing=(), lookback: int = 0, step: int = 1):
+        self.last = last
+        self.lookback = lookback
+        self.step = step
+        self.missing = set()
+        if last is not None:
+            self.missing = {audit_id for audit_id in missing if audit_id > last - lookback}
+
+    def lacks(self, audit_id: int) -> bool:
+        return self.last is None or audit_id > self.last or audit_id in self.missing
+
+    def oldest_needed(self) -> int:
+        return min(self.missing, default=self.last + 1)
+
+    def advance(self, audit_id: int):
+        if self.last is None:
+            self.last = audit_id
+        elif audit_id > self.last:
+            low = audit_id - self.lookback + 1
+            start = self.last + self.step
+            if start < low:
+                start += (low - start + self.step - 1) // self.step * self.step
+            self.missing.update(range(start, audit_id, self.step))
+            self.last = audit_id
+            if self.missing:
+                self.missing = {missing for missing in self.missing if missing >= low}
+        else:
+            self.missing.discard(audit_id)
+
+    def __str__(self) -> str:
+        return "~".join(map(str, [self.last, *sorted(self.missing)]))
+
+
+class AuditFeed:
+    """
+    In-process fan-out of committed audit rows to any number of subscribers,
+    fed by one shared source (a LISTEN connection, or the in-memory engine).
+
+    Each subscriber has a queue of `buffer_size` rows. A subscriber that falls
+    that far behind is disconnected rather than slowing the others down; it
+    resumes from its last token like any reconnecting client. The last
+    `history_size` rows are kept in commit order, so a recent token resumes
+    from memory; older tokens catch up from the table first. Tokens are
+    FeedPositions with this feed's `lookback` and `step`.
+    """
+
+    def __init__(self, buffer_size: int, history_size: int, lookback: int = 0, step: int = 1):
+        self.buffer_size = buffer_size
+        self.lookback = lookback
+        self.step = step
+        self.recent = deque(maxlen=history_size)
+        # `recent` holds every published row with an id above `horizon`;
+        # None until a row arrives, as rows may have committed before.
+        self.horizon = None
+        self.subscribers = set()
+        self.published = 0
+        self.disconnected = 0
+
+    def position(self, last: int | None = None, missing=()) -> FeedPosition:
+        return FeedPosition(last, missing, self.lookback, self.step)
+
+    def publish(self, entry: dict):
+        if self.horizon is None:
+            # Rows committed before this one have ids up to `lookback` above it.
+            self.horizon = entry["id"] + self.lookback
+        if len(self.recent) == self.recent.maxlen:
+            self.horizon = max(self.horizon, self.recent[0]["id"])
+        self.recent.append(entry)
+        self.published += 1
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                self.subscribers.discard(subscription)
+                subscription.close()
+                self.disconnected += 1
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self.subscribers), "published": self.published, "disconnected": self.disconnected}
+
+    def reset(self):
+        """Drop every subscriber: the source may have missed rows, so they catch up again."""
+        self.recent.clear()
+        self.horizon = None
+        for subscription in self.subscribers:
+            subscription.close()
+        self.subscribers = set()
+
+    def replay(self, position: FeedPosition) -> list[dict] | None:
+        """The recent rows `position` lacks, in commit order, or None if some may no longer be buffered."""
+        if self.horizon is None or position.oldest_needed() <= self.horizon:
+            return None
+        return [entry for entry in self.recent if position.lacks(entry["id"])]
+
+    async def follow(self, position: FeedPosition | None, catch_up):
+        """
+        Yield (token, row) for every row `position` lacks (or from now on,
+        without it), first from the buffer or `catch_up(last, missing)` (an
+        async iterator of the table rows with an id above `last` or in
+        `missing`, in id order), then live. Rows committed while the catch-up
+        runs are queued live as well and skipped there if the catch-up
+        already returned them.
+        """
+        subscription = Subscription(self.buffer_size)
+        # Subscribe before catching up, so rows committed meanwhile are queued.
+        self.subscribers.add(subscription)
+        # Only the newest rows of the catch-up can also be queued, and never
+        # more of them than the queue holds.
+        caught_up = deque(maxlen=self.buffer_size)
+        try:
+            replayed = self.replay(position) if position is not None else []
+            if position is None:
+                position = self.position()
+            if replayed is None:
+                async for entry in catch_up(position.last, sorted(position.missing)):
+                    caught_up.append(entry["id"])
+                    position.advance(entry["id"])
+                    yield str(position), entry
+            else:
+                for entry in replayed:
+                    position.advance(entry["id"])
+                    yield str(position), entry
+            duplicates = set(caught_up)
+            while True:
+                if subscription.closed and subscription.queue.empty():
+                    return
+                entry = await subscription.queue.get()
+                if entry is None:
+                    return
+                if entry["id"] in duplicates:
+                    duplicates.discard(entry["id"])
+                    continue
+                position.advance(entry["id"])
+                yield str(position), entry
+        finally:
+            self.subscribers.discard(subscription)
@@ -1,43 +1,38 @@
 import os
 import asyncio
-from asyncpg import create_pool
+import logging
+from asyncpg import connect
 from dotenv import load_dotenv
+from app.core.config import url_list
+from app.db.migrate import migrate
+from app.db.sharding import configure_shard_sequences
 
 load_dotenv() # pragma: no cover
 
 DATABASE_URL = os.getenv("DATABASE_URL")  # pragma: no cover
-
-CREATE_USERS_TABLE = """ 
-    CREATE TABLE IF NOT EXISTS users (
-        id SERIAL PRIMARY KEY,
-        name VARCHAR(255) NOT NULL,
-        email VARCHAR(255) NOT NULL UNIQUE,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        deleted BOOLEAN NOT NULL
-    );
-    """ # pragma: no cover
-
-CREATE_USERS_AUDIT_TABLE = """ 
-    CREATE TABLE IF NOT EXISTS user_audit (
-        id SERIAL PRIMARY KEY,
-        user_id INT NOT NULL,
-        operation VARCHAR(50) NOT NULL,
-        name VARCHAR(255),
-        email VARCHAR(255),
-        deleted BOOLEAN,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """ # pragma: no cover
+DATABASE_SHARD_URLS = url_list("DATABASE_SHARD_URLS")  # pragma: no cover
 
 async def init_db():  # pragma: no cover
-    pool = await create_pool(DATABASE_URL)
-    async with pool.acquire() as conn:
+    if DATABASE_SHARD_URLS:
+        for index, url in enumerate(DATABASE_SHARD_URLS):
+            print(f"Shard {index}:")
+            await init_database(url, shard=(index, len(DATABASE_SHARD_URLS)))
+    else:
+        await init_database(DATABASE_URL)
+
+async def init_database(url: str, shard: tuple[int, int] | None = None):  # pragma: no cover
+    # Migrations run on a single session: the advisory lock and the
+    # CREATE INDEX CONCURRENTLY statements both need one.
+    connection = await connect(url)
+    try:
         print("Initializing the database...")
-        await conn.execute(CREATE_USERS_TABLE)
-        await conn.execute(CREATE_USERS_AUDIT_TABLE)
-        print("Database initialized successfully.")
-    await pool.close()
+        applied = await migrate(connection)
+        if shard is not None:
+            await configure_shard_sequences(connection, *shard)
+        print(f"Database initialized successfully ({len(applied)} migrations applied).")
+    finally:
+        await connection.close()
 
 if __name__ == "__main__": # pragma: no cover
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     asyncio.run(init_db())
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+class Listener:
+    """
+    A dedicated connection for Postgres LISTEN, shared by every channel.
+
+    Notifications sent while the connection is down are lost, so the
+    `on_reset` callbacks run whenever it drops and again once it is back;
+    subscribers use them to discard state that may have gone stale.
+    """
+
+    def __init__(self, dsn: str, reconnect_delay: float = 1.0):
+        self.dsn = dsn
+        self.reconnect_delay = reconnect_delay
+        self.connection = None
+        self.on_reset = []
+        self._channels = {}
+        self._reconnect_task = None
+        self._closing = False
+
+    @property
+    def connected(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed()
+
+    async def start(self): # pragma: no cover
+        self.connection = await asyncpg.connect(self.dsn)
+        self.connection.add_termination_listener(self._on_terminated)
+        for channel, callback in self._channels.items():
+            await self.connection.add_listener(channel, callback)
+
+    async def listen(self, channel: str, callback): # pragma: no cover
+        """Register `callback(payload)` for every notification on `channel`."""
+        def on_notification(connection, pid, channel, payload):
+            callback(payload)
+
+        self._channels[channel] = on_notification
+        if self.connected:
+            await self.connection.add_listener(channel, on_notification)
+
+    async def stop(self): # pragma: no cover
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self.connected:
+            await self.connection.close()
+
+    def _reset(self):
+        for callback in self.on_reset:
+            callback()
+
+    def _on_terminated(self, connection): # pragma: no cover
+        self.connection = None
+        self._reset()
+        if not self._closing:
+            logger.warning("Lost the LISTEN connection, reconnecting")
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self): # pragma: no cover
+        while not self._closing:
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Error reconnecting the LISTEN connection: %r", e)
+                await asyncio.sleep(self.reconnect_delay)
+            else:
+                self._reset()
+                return
@@ -0,0 +1,333 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.api.pagination import encode_audit_cursor, paginate
+from app.db.backend import DatabaseBackend, EmailTaken
+from app.db.export import csv_chunks
+from app.db.feed import AuditFeed, parse_feed_token
+from app.db.pool import PoolStats
+
+USER_FIELDS = ("id", "name", "email", "created_at", "updated_at")
+WRITE_FIELDS = ("id", "name", "email", "updated_at")
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def timestamp_of(entry):
+    return entry["timestamp"]
+
+def audit_key(entry):
+    return entry["timestamp"], entry["id"]
+
+def project(row, fields):
+    return {field: row[field] for field in fields}
+
+def batch_result(user_id: int, status: str, user: dict | None = None) -> dict:
+    # Shaped like the result rows of the Postgres batch writes.
+    fields = ("name", "email", "updated_at")
+    return {"id": user_id, "status": status, **(project(user, fields) if user else dict.fromkeys(fields))}
+
+
+class MemoryDatabase(DatabaseBackend):
+    """
+    In-process backend with the indexes the Postgres schema relies on: users
+    by id, a unique email index, the audit log in (timestamp, id) order and
+    each user's audit rows by version, so a version lookup is a list index.
+
+    Nothing is persisted or shared between processes. No method awaits while
+    it changes state, so every call is atomic with respect to the event loop.
+    """
+
+    def __init__(self, clock=utcnow, id_start: int = 1, id_step: int = 1):
+        self.clock = clock
+        # Like the Postgres id sequences, which shards set to INCREMENT BY the
+        # shard count so every id encodes its shard.
+        self.id_start = id_start
+        self.id_step = id_step
+        self.users = {}
+        self.user_ids = []  # ascending; ids are never reused
+        self.emails = {}
+        self.audit = []  # ordered by (timestamp, id)
+        self.history = {}  # user id -> audit rows, history[user_id][version - 1]
+        self.pool_stats = PoolStats()
+        self.feed = AuditFeed(settings.AUDIT_FEED_BUFFER_SIZE, settings.AUDIT_FEED_HISTORY_SIZE)
+        self.last_timestamp = datetime.min
+
+    async def connect(self):
+        print("Using the in-memory database.")
+
+    async def disconnect(self):
+        pass
+
+    def pool_status(self) -> dict:
+        return self.pool_stats.snapshot(None)
+
+    async def ping(self) -> float:
+        return 0.0
+
+    def now(self) -> datetime:
+        # Keep the audit log sorted even if the wall clock steps back.
+        self.last_timestamp = max(self.clock(), self.last_timestamp)
+        return self.last_timestamp
+
+    def check_email(self, email: str, user_id: int | None = None):
+        owner = self.emails.get(email)
+        if owner is not None and owner != user_id:
+            raise EmailTaken(f"Email {email} already exists")
+
+    def record(self, user: dict, operation: str, timestamp: datetime):
+        user["version"] += 1
+        entry = {
+            "id": self.id_start + self.id_step * len(self.audit),
+            "user_id": user["id"],
+            "operation": operation,
+            "name": user["name"],
+            "email": user["email"],
+            "deleted": user["deleted"],
+            "timestamp": timestamp,
+            "version": user["version"],
+        }
+        self.audit.append(entry)
+        self.history.setdefault(user["id"], []).append(entry)
+        self.feed.publish(entry)
+
+    def insert(self, name: str, email: str) -> dict:
+        self.check_email(email)
+        timestamp = self.now()
+        user = {
+            "id": self.id_start + self.id_step * len(self.user_ids),
+            "name": name,
+            "email": email,
+            "created_at": timestamp,
+            "updated_at": timestamp,
+            "deleted": False,
+            "version": 0,
+        }
+        self.users[user["id"]] = user
+        self.user_ids.append(user["id"])
+        self.emails[email] = user["id"]
+        self.record(user, "CREATE", timestamp)
+        return user
+
+    def change(self, user: dict, operation: str, **fields):
+        email = fields.get("email", user["email"])
+        if email != user["email"]:
+            self.check_email(email, user["id"])
+            if self.emails.get(user["email"]) == user["id"]:
+                del self.emails[user["email"]]
+            self.emails[email] = user["id"]
+        timestamp = self.now()
+        user.update(fields)
+        user["updated_at"] = timestamp
+        self.record(user, operation, timestamp)
+
+    async def create_user(self, name: str, email: str):
+        return project(self.insert(name, email), WRITE_FIELDS)
+
+    async def import_users(self, rows):
+        """
+        Bulk-create users from (line, name, email) tuples. Returns (line, email,
+        id) per row, with id None for emails that exist or repeat an earlier line.
+        """
+        rows = sorted(rows)
+        first_line = {}
+        for line, _, email in rows:
+            first_line.setdefault(email, line)
+        ids = {}
+        for line, name, email in rows:
+            if first_line[email] == line and email not in self.emails:
+                ids[line] = self.insert(name, email)["id"]
+        return [{"line": line, "email": email, "id": ids.get(line)} for line, _, email in rows]
+
+    async def existing_emails(self, emails: list[str]) -> set[str]:
+        return {email for email in emails if email in self.emails}
+
+    async def get_user(self, user_id: int):
+        user = self.users.get(user_id)
+        if user is None or user["deleted"]:
+            return None
+        return project(user, USER_FIELDS)
+
+    async def get_users(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        page = []
+        for index in range(bisect_right(self.user_ids, after), len(self.user_ids)):
+            user = self.users[self.user_ids[index]]
+            if not user["deleted"]:
+                page.append(project(user, USER_FIELDS))
+                if len(page) == limit:
+                    break
+        return page
+
+    async def get_users_json(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        users, next_cursor = paginate(await self.get_users(after, limit + 1), limit, lambda user: user["id"])
+        return dumps({"users": users, "next_cursor": next_cursor})
+
+    async def get_users_changed_at(self):
+        if not self.users:
+            return None, None
+        return self.last_timestamp, (self.clock() - self.last_timestamp).total_seconds()
+
+    async def iter_users(self, after: int = 0):
+        index = bisect_right(self.user_ids, after)
+        while index < len(self.user_ids):
+            user = self.users[self.user_ids[index]]
+            index += 1
+            if not user["deleted"]:
+                yield project(user, USER_FIELDS)
+
+    async def update_user(self, user_id: int, name: str, email: str, if_match: list | None = None):
+        user = self.users.get(user_id)
+        if user is None or user["deleted"] or (if_match is not None and user["updated_at"] not in if_match):
+            return None
+        self.change(user, "UPDATE", name=name, email=email)
+        return project(user, WRITE_FIELDS)
+
+    async def update_users(self, changes: list[tuple[int, str, str]]):
+        results = []
+        for user_id, name, email in changes:
+            user = self.users.get(user_id)
+            if user is None or user["deleted"]:
+                results.append(batch_result(user_id, "not_found"))
+                continue
+            try:
+                self.change(user, "UPDATE", name=name, email=email)
+            except ValueError:
+                results.append(batch_result(user_id, "conflict"))
+                continue
+            results.append(batch_result(user_id, "updated", user))
+        return results
+
+    async def delete_user(self, user_id: int, if_match: list | None = None):
+        user = self.users.get(user_id)
+        if user is None or (if_match is not None and user["updated_at"] not in if_match):
+            return None
+        self.change(user, "DELETE", email=f"deleted_{user_id}", deleted=True)
+        return project(user, ("id", "name", "email", "deleted"))
+
+    async def delete_users(self, user_ids: list[int]):
+        results = []
+        for user_id in user_ids:
+            user = self.users.get(user_id)
+            if user is None or user["deleted"]:
+                results.append(batch_result(user_id, "not_found"))
+                continue
+            self.change(user, "DELETE", email=f"deleted_{user_id}", deleted=True)
+            results.append(batch_result(user_id, "deleted", user))
+        return results
+
+    def audit_range(self, user_id=None, since=None, until=None, before=None):
+        """
+        Return the rows to scan (one user's history or the whole log) and the
+        [start, end) slice of them inside the time bounds and before the cursor.
+        """
+        rows = self.history.get(user_id, []) if user_id is not None else self.audit
+        start = bisect_left(rows, since, key=timestamp_of) if since is not None else 0
+        end = bisect_left(rows, until, key=timestamp_of) if until is not None else len(rows)
+        if before is not None:
+            end = min(end, bisect_left(rows, tuple(before), key=audit_key))
+        return rows, start, end
+
+    def scan_audit(self, operation=None, **bounds):
+        # Newest first, like ORDER BY timestamp DESC, id DESC.
+        rows, start, end = self.audit_range(**bounds)
+        for index in range(end - 1, start - 1, -1):
+            if operation is None or rows[index]["operation"] == operation:
+                yield dict(rows[index])
+
+    async def get_audit_logs(self, user_id=None, operation=None, since=None, until=None,
+                             before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        page = []
+        for entry in self.scan_audit(operation, user_id=user_id, since=since, until=until, before=before):
+            page.append(entry)
+            if len(page) == limit:
+                break
+        return page
+
+    async def get_audit_logs_json(self, user_id=None, operation=None, since=None, until=None,
+                                  before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        logs = await self.get_audit_logs(user_id, operation, since, until, before, limit + 1)
+        logs, next_cursor = paginate(logs, limit, encode_audit_cursor)
+        return dumps({"audit_logs": logs, "next_cursor": next_cursor})
+
+    async def iter_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        # The log is append-only, so the range fixed when the scan starts is a
+        # consistent snapshot even if rows are added while the client reads.
+        for entry in self.scan_audit(operation, user_id=user_id, since=since, until=until):
+            yield entry
+
+    def copy_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        return csv_chunks(self.iter_audit_logs(user_id, operation, since, until))
+
+    def audit_feed(self, after: str | None = None):
+        position = self.feed.position(*parse_feed_token(after, 1)[0]) if after is not None else None
+        return self.feed.follow(position, self.audit_after)
+
+    async def audit_after(self, after: int, missing: list[int]):
+        # Ids are assigned in append order, so the position follows from the id.
+        oldest = min(missing, default=after + 1)
+        start = max(0, (oldest - 1 - self.id_start) // self.id_step + 1)
+        for entry in self.audit[start:]:
+            if entry["id"] > after or entry["id"] in missing:
+                yield entry
+
+    async def get_user_history(self, user_id: int, before: int | None = None,
+                               limit: int = settings.DEFAULT_PAGE_SIZE):
+        history = self.history.get(user_id, [])
+        end = len(history) if before is None else min(max(before - 1, 0), len(history))
+        return [dict(entry) for entry in reversed(history[max(end - limit, 0):end])]
+
+    async def get_user_audit_restore_version(self, user_id: int, version: int):
+        history = self.history.get(user_id, [])
+        return dict(history[version - 1]) if 0 < version <= len(history) else None
+
+    def entry_as_of(self, user_id: int, as_of):
+        history = self.history.get(user_id, [])
+        index = bisect_right(history, as_of, key=timestamp_of)
+        return history[index - 1] if index else None
+
+    async def get_user_audit_as_of(self, user_id: int, as_of):
+        entry = self.entry_as_of(user_id, as_of)
+        return dict(entry) if entry is not None else None
+
+    async def restore_user(self, user_id: int, name, email, deleted):
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        self.change(user, "RESTORE", name=name, email=email, deleted=deleted)
+        return project(user, WRITE_FIELDS)
+
+    async def get_user_ids_changed_since(self, since, until=None):
+        start = bisect_right(self.audit, since, key=timestamp_of)
+        end = bisect_right(self.audit, until, key=timestamp_of) if until is not None else len(self.audit)
+        return sorted({self.audit[index]["user_id"] for index in range(start, end)})
+
+    async def restore_users_as_of(self, user_ids: list[int], as_of):
+        """
+        Restore every user in `user_ids` to its latest audit entry at or before
+        `as_of`. Like the single statement Postgres runs, either every user is
+        restored or, on an email conflict, none is. Returns the restored ids.
+        """
+        targets = {}
+        for user_id in sorted(set(user_ids)):
+            user, entry = self.users.get(user_id), self.entry_as_of(user_id, as_of)
+            if user is None or entry is None:
+                continue
+            if (user["name"], user["email"], user["deleted"]) != (entry["name"], entry["email"], entry["deleted"]):
+                targets[user_id] = entry
+
+        emails = [entry["email"] for entry in targets.values()]
+        if len(set(emails)) != len(emails):
+            raise EmailTaken("Restored users would share an email")
+        for email in emails:
+            owner = self.emails.get(email)
+            if owner is not None and owner not in targets:
+                raise EmailTaken(f"Email {email} already exists")
+
+        # Release the emails that change first, so users can swap them.
+        for user_id, entry in targets.items():
+            if self.users[user_id]["email"] != entry["email"]:
+                del self.emails[self.users[user_id]["email"]]
+        for user_id, entry in targets.items():
+            self.change(self.users[user_id], "RESTORE", name=entry["name"], email=entry["email"], deleted=entry["deleted"])
+        return list(targets)
@@ -0,0 +1,76 @@
+import logging
+from pathlib import Path
+from typing import NamedTuple
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Statements such as CREATE INDEX CONCURRENTLY cannot run inside a transaction
+# block; migrations starting with this marker run one statement at a time.
+NO_TRANSACTION = "-- migrate:no-transaction"
+
+# Arbitrary key for pg_advisory_lock, so concurrent runners apply migrations one at a time.
+MIGRATION_LOCK_ID = 7_213_004
+
+logger = logging.getLogger(__name__)
+
+CREATE_SCHEMA_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+    transactional: bool
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> list[Migration]:
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        version, _, name = path.stem.partition("_")
+        sql = path.read_text()
+        migrations.append(Migration(int(version), name, sql, not sql.startswith(NO_TRANSACTION)))
+
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+def split_statements(sql: str) -> list[str]:
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+async def migrate(connection, migrations: list[Migration] | None = None) -> list[Migration]:
+    """
+    Apply every migration that is not yet recorded in schema_migrations, in
+    version order, and return the ones applied by this run.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    await connection.execute(CREATE_SCHEMA_MIGRATIONS_TABLE)
+    await connection.execute("SELECT pg_advisory_lock($1);", MIGRATION_LOCK_ID)
+    try:
+        applied = {row["version"] for row in await connection.fetch("SELECT version FROM schema_migrations;")}
+        pending = [migration for migration in migrations if migration.version not in applied]
+        for migration in pending:
+            logger.info("Applying migration %04d_%s", migration.version, migration.name)
+            if migration.transactional:
+                async with connection.transaction():
+                    await connection.execute(migration.sql)
+                    await record_migration(connection, migration)
+            else:
+                for statement in split_statements(migration.sql):
+                    await connection.execute(statement)
+                await record_migration(connection, migration)
+        return pending
+    finally:
+        await connection.execute("SELECT pg_advisory_unlock($1);", MIGRATION_LOCK_ID)
+
+async def record_migration(connection, migration: Migration):
+    await connection.execute(
+        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2);",
+        migration.version,
+        migration.name,
+    )
@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted BOOLEAN NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_audit (
+    id SERIAL PRIMARY KEY,
+    user_id INT NOT NULL,
+    operation VARCHAR(50) NOT NULL,
+    name VARCHAR(255),
+    email VARCHAR(255),
+    deleted BOOLEAN,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,9 @@
+-- migrate:no-transaction
+-- Serves the per-user history scan behind restore and the (timestamp, id)
+-- keyset pagination of the audit log. A failed concurrent build leaves an
+-- INVALID index behind, so a re-run drops it and starts over.
+DROP INDEX CONCURRENTLY IF EXISTS user_audit_user_id_id_idx;
+CREATE INDEX CONCURRENTLY user_audit_user_id_id_idx ON user_audit (user_id, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS user_audit_timestamp_id_idx;
+CREATE INDEX CONCURRENTLY user_audit_timestamp_id_idx ON user_audit (timestamp, id);
@@ -0,0 +1,4 @@
+-- migrate:no-transaction
+-- Keyset pagination of active users only ever reads rows with deleted = false.
+DROP INDEX CONCURRENTLY IF EXISTS users_active_id_idx;
+CREATE INDEX CONCURRENTLY users_active_id_idx ON users (id) WHERE deleted = false;
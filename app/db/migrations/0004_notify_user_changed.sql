@@ -0,0 +1,13 @@
+-- Publishes the id of every updated user on the user_changed channel, so each
+-- replica can drop its cached copy of the profile once the write commits.
+CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('user_changed', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_notify_changed ON users;
+CREATE TRIGGER users_notify_changed
+    AFTER UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_changed();
@@ -0,0 +1,20 @@
+-- users.version is the number of the user's latest audit row. Every mutation
+-- bumps it under the row lock it already holds, so concurrent writes to the
+-- same user get consecutive, gap-free versions.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 0;
+ALTER TABLE user_audit ADD COLUMN IF NOT EXISTS version INT;
+
+UPDATE user_audit a
+SET version = numbered.version
+FROM (
+    SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY id) AS version
+    FROM user_audit
+) numbered
+WHERE a.id = numbered.id AND a.version IS NULL;
+
+UPDATE users u
+SET version = latest.version
+FROM (SELECT user_id, max(version) AS version FROM user_audit GROUP BY user_id) latest
+WHERE u.id = latest.user_id;
+
+ALTER TABLE user_audit ALTER COLUMN version SET NOT NULL;
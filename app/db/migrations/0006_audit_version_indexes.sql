@@ -0,0 +1,8 @@
+-- migrate:no-transaction
+-- Restore by version is a single probe of (user_id, version); restore by
+-- timestamp reads the latest (user_id, timestamp) entry at or before it.
+DROP INDEX CONCURRENTLY IF EXISTS user_audit_user_id_version_key;
+CREATE UNIQUE INDEX CONCURRENTLY user_audit_user_id_version_key ON user_audit (user_id, version);
+
+DROP INDEX CONCURRENTLY IF EXISTS user_audit_user_id_timestamp_idx;
+CREATE INDEX CONCURRENTLY user_audit_user_id_timestamp_idx ON user_audit (user_id, timestamp, id);
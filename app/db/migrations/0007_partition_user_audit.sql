@@ -0,0 +1,70 @@
+-- Turns user_audit into a table range-partitioned by month on timestamp, so
+-- scans bounded in time only read the months they ask for, vacuum works on
+-- one month at a time, and months past the retention window can be detached
+-- and archived instead of deleted row by row.
+--
+-- Unique indexes on a partitioned table must include the partition key: the
+-- primary key becomes (id, timestamp) and (user_id, version) is no longer
+-- enforced unique. Versions stay unique because every mutation bumps
+-- users.version under the user's row lock.
+--
+-- Copies every audit row once; on a large table run it in a maintenance window.
+
+-- Creates the monthly partitions user_audit_pYYYYMM from first_month through
+-- last_month that do not exist yet, and returns how many it created.
+CREATE OR REPLACE FUNCTION create_user_audit_partitions(first_month DATE, last_month DATE) RETURNS INT AS $$
+DECLARE
+    bound DATE := date_trunc('month', first_month);
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE bound <= last_month LOOP
+        partition_name := 'user_audit_p' || to_char(bound, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF user_audit FOR VALUES FROM (%L) TO (%L)',
+                partition_name, bound, (bound + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        bound := bound + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE user_audit RENAME TO user_audit_unpartitioned;
+ALTER INDEX user_audit_pkey RENAME TO user_audit_unpartitioned_pkey;
+
+CREATE TABLE user_audit (
+    id INT NOT NULL DEFAULT nextval('user_audit_id_seq'),
+    user_id INT NOT NULL,
+    operation VARCHAR(50) NOT NULL,
+    name VARCHAR(255),
+    email VARCHAR(255),
+    deleted BOOLEAN,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    version INT NOT NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Catches rows for months that have no partition yet. The maintenance job
+-- creates partitions ahead of time, so it should stay empty.
+CREATE TABLE user_audit_default PARTITION OF user_audit DEFAULT;
+
+SELECT create_user_audit_partitions(
+    coalesce((SELECT min(timestamp) FROM user_audit_unpartitioned), CURRENT_TIMESTAMP)::date,
+    (CURRENT_TIMESTAMP + INTERVAL '3 months')::date
+);
+
+INSERT INTO user_audit (id, user_id, operation, name, email, deleted, timestamp, version)
+SELECT id, user_id, operation, name, email, deleted, coalesce(timestamp, 'epoch'), version
+FROM user_audit_unpartitioned;
+
+ALTER SEQUENCE user_audit_id_seq OWNED BY user_audit.id;
+DROP TABLE user_audit_unpartitioned;
+
+CREATE INDEX user_audit_user_id_id_idx ON user_audit (user_id, id);
+CREATE INDEX user_audit_timestamp_id_idx ON user_audit (timestamp, id);
+CREATE INDEX user_audit_user_id_version_idx ON user_audit (user_id, version);
+CREATE INDEX user_audit_user_id_timestamp_idx ON user_audit (user_id, timestamp, id);
@@ -0,0 +1,14 @@
+-- Publishes every audit row as JSON on the user_audit channel. Notifications
+-- are delivered when the transaction commits and in commit order, which is
+-- what GET /audit/feed streams to its subscribers.
+CREATE OR REPLACE FUNCTION notify_audit_committed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('user_audit', row_to_json(NEW)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_audit_notify_committed ON user_audit;
+CREATE TRIGGER user_audit_notify_committed
+    AFTER INSERT ON user_audit
+    FOR EACH ROW EXECUTE FUNCTION notify_audit_committed();
@@ -0,0 +1,5 @@
+-- migrate:no-transaction
+-- GET /users compares max(updated_at) with the client's ETag before reading
+-- a page; with this index that is a single probe of the index's last entry.
+DROP INDEX CONCURRENTLY IF EXISTS users_updated_at_idx;
+CREATE INDEX CONCURRENTLY users_updated_at_idx ON users (updated_at);
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import re
+from contextlib import suppress
+from app.db.archive import ArchiveWriter, AuditArchive
+
+# Arbitrary key for pg_try_advisory_lock, so one replica at a time runs the job.
+MAINTENANCE_LOCK_ID = 7_213_017
+
+PARTITION_NAME = re.compile(r"user_audit_p\d{6}")
+
+logger = logging.getLogger(__name__)
+
+LIST_PARTITIONS = r"""
+    SELECT c.relname AS name, i.inhparent IS NOT NULL AS attached
+    FROM pg_class c
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+    WHERE c.relkind = 'r' AND pg_table_is_visible(c.oid)
+      AND c.relname ~ '^user_audit_p[0-9]{6}$'
+      AND c.relname::text < 'user_audit_p' || to_char(CURRENT_DATE - make_interval(months => $1), 'YYYYMM')
+    ORDER BY c.relname;
+"""
+
+CREATE_PARTITIONS = "SELECT create_user_audit_partitions(CURRENT_DATE, (CURRENT_DATE + make_interval(months => $1))::date);"
+
+
+class AuditMaintenance:
+    """
+    Background housekeeping of the partitioned user_audit table. Every
+    `interval` seconds it creates the monthly partitions for the next
+    `months_ahead` months, and with `retention_months` set, writes every
+    month older than that to `archive` and drops it.
+
+    Dropping needs an archive directory every replica reads (`shared`), or
+    the rows would only survive on one of them. A partition is only dropped
+    once its archive file is synced and every replica has had
+    `archive.refresh_interval` seconds to load it, so each row stays readable
+    throughout; detached tables left by an interrupted run are picked up by
+    the next one.
+    """
+
+    def __init__(self, database, archive: AuditArchive, interval: float, months_ahead: int,
+                 retention_months: int, group_size: int, shared: bool = False):
+        self.database = database
+        self.archive = archive
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.group_size = group_size
+        self.shared = shared
+        self.archived = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Error maintaining user_audit partitions")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> list[str]:
+        """Run one maintenance pass and return the partitions it archived."""
+        archived = []
+        async with self.database.acquire() as connection:
+            if not await connection.fetchval("SELECT pg_try_advisory_lock($1);", MAINTENANCE_LOCK_ID):
+                return archived
+            try:
+                # Months are those of the database clock, which also stamps the rows.
+                await connection.execute(CREATE_PARTITIONS, self.months_ahead)
+                if self.retention_months > 0 and not self.shared:
+                    logger.warning(
+                        "Not archiving user_audit partitions: %s is not shared by every replica", self.archive.directory,
+                    )
+                elif self.retention_months > 0:
+                    for partition in await connection.fetch(LIST_PARTITIONS, self.retention_months):
+                        await self.archive_partition(connection, partition["name"], partition["attached"])
+                        archived.append(partition["name"])
+            finally:
+                await connection.execute("SELECT pg_advisory_unlock($1);", MAINTENANCE_LOCK_ID)
+        self.archived += archived
+        return archived
+
+    async def archive_partition(self, connection, name: str, attached: bool):
+        if not PARTITION_NAME.fullmatch(name):
+            raise ValueError(f"Not a user_audit partition: {name}")
+
+        # The month is past, so no rows are added while it is copied.
+        self.archive.directory.mkdir(parents=True, exist_ok=True)
+        writer = ArchiveWriter(self.archive.path_for(name))
+        group = []
+        async with connection.transaction():
+            async for record in connection.cursor(f"SELECT * FROM {name} ORDER BY timestamp, id;", prefetch=self.group_size):
+                group.append(dict(record))
+                if len(group) == self.group_size:
+                    await asyncio.to_thread(writer.write_group, group)
+                    group = []
+        await asyncio.to_thread(writer.write_group, group)
+        await asyncio.to_thread(writer.close)
+
+        # Until the partition is dropped its rows are in both places; live
+        # audit reads skip the archived months, so none is read twice.
+        self.archive.refresh(force=True)
+        await asyncio.sleep(self.archive.refresh_interval)
+        async with connection.transaction():
+            if attached:
+                # DETACH ... CONCURRENTLY is not allowed next to a default partition or
+                # in a transaction; the plain DETACH locks user_audit only for the catalog change.
+                await connection.execute(f"ALTER TABLE user_audit DETACH PARTITION {name};")
+            await connection.execute(f"DROP TABLE {name};")
+        logger.info("Archived %d audit rows from %s to %s", writer.rows, name, writer.path)
@@ -0,0 +1,38 @@
+import asyncpg
+
+class PreparedConnection(asyncpg.Connection):
+    """
+    Pool connection that carries the hot statements, prepared once by the
+    pool's init hook and reused for the connection's whole lifetime.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+
+class PoolStats:
+    def __init__(self):
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+
+    def record_acquire(self, wait: float):
+        self.acquires += 1
+        self.acquire_wait_total += wait
+        self.acquire_wait_max = max(self.acquire_wait_max, wait)
+
+    def snapshot(self, pool) -> dict:
+        size = pool.get_size() if pool else 0
+        idle = pool.get_idle_size() if pool else 0
+        return {
+            "min_size": pool.get_min_size() if pool else 0,
+            "max_size": pool.get_max_size() if pool else 0,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "acquires": self.acquires,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_avg_ms": 1000 * self.acquire_wait_total / self.acquires if self.acquires else 0.0,
+            "acquire_wait_max_ms": 1000 * self.acquire_wait_max,
+        }
@@ -0,0 +1,67 @@
+import logging
+import time
+import asyncpg
+from app.db.admission import pool_admission
+from app.db.pool import PoolStats
+
+# Errors that say the replica itself is unusable rather than the query wrong.
+REPLICA_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.OperatorInterventionError,
+)
+
+logger = logging.getLogger(__name__)
+
+class Replica:
+    def __init__(self, dsn: str, name: str):
+        self.dsn = dsn
+        self.name = name
+        self.pool = None
+        self.stats = PoolStats()
+        self.admission = pool_admission()
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def status(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "healthy": self.pool is not None and self.ejected_until <= now,
+            "ejections": self.ejections,
+            **self.stats.snapshot(self.pool),
+            "admission": self.admission.stats(),
+        }
+
+class ReplicaSet:
+    """
+    Read replicas picked round-robin. A replica that fails is ejected for
+    `eject_seconds` and skipped until then; with none left, `choose` returns
+    None and reads go to the primary.
+    """
+
+    def __init__(self, dsns: list[str], eject_seconds: float, clock=time.monotonic):
+        self.replicas = [Replica(dsn, f"replica{number}") for number, dsn in enumerate(dsns)]
+        self.eject_seconds = eject_seconds
+        self.clock = clock
+        self.next = 0
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self) -> Replica | None:
+        now = self.clock()
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(self.next + offset) % len(self.replicas)]
+            if replica.pool is not None and replica.ejected_until <= now:
+                self.next = (self.next + offset + 1) % len(self.replicas)
+                return replica
+        return None
+
+    def eject(self, replica: Replica, error: Exception):
+        replica.ejected_until = self.clock() + self.eject_seconds
+        replica.ejections += 1
+        logger.warning("Ejected %s for %ss: %r", replica.name, self.eject_seconds, error)
+
+    def status(self) -> list[dict]:
+        now = self.clock()
+        return [replica.status(now) for replica in self.replicas]
@@ -0,0 +1,319 @@
+import asyncio
+import heapq
+import os
+import zlib
+from app.core.config import DATABASE_SHARD_URLS, settings
+from app.core.serialization import dumps
+from app.api.pagination import encode_audit_cursor, paginate
+from app.db.admission import combined_stats
+from app.db.backend import DatabaseBackend, EmailTaken
+from app.db.db_funcs import Database
+from app.db.export import csv_chunks
+from app.db.feed import parse_feed_token
+
+def first_shard_id(index: int, count: int) -> int:
+    """The smallest positive id of shard `index`, i.e. with id % count == index."""
+    return index or count
+
+def next_shard_id(max_id: int, index: int, count: int) -> int:
+    """The smallest id above `max_id` that belongs to shard `index`."""
+    start = max_id + 1
+    return start + (index - start) % count
+
+async def configure_shard_sequences(connection, index: int, count: int): # pragma: no cover
+    """
+    Make the users and user_audit id sequences of shard `index` hand out only
+    ids with id % count == index, so every id names the shard that owns it.
+    """
+    for table in ("users", "user_audit"):
+        sequence = await connection.fetchval("SELECT pg_get_serial_sequence($1, 'id');", table)
+        max_id = await connection.fetchval(f"SELECT coalesce(max(id), 0) FROM {table};")
+        await connection.execute(f"ALTER SEQUENCE {sequence} INCREMENT BY {count};")
+        await connection.execute("SELECT setval($1, $2, false);", sequence, next_shard_id(max_id, index, count))
+
+class Descending:
+    """Sort key wrapper that inverts the order of the key it wraps."""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+async def merge_sorted(iterators, key, reverse: bool = False):
+    """K-way merge of async iterators that are each sorted by `key`, like heapq.merge."""
+    heap = []
+
+    async def push(number, iterator):
+        try:
+            row = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        heapq.heappush(heap, (Descending(key(row)) if reverse else key(row), number, row, iterator))
+
+    for number, iterator in enumerate(iterators):
+        await push(number, aiter(iterator))
+    while heap:
+        _, number, row, iterator = heapq.heappop(heap)
+        yield row
+        await push(number, iterator)
+
+async def interleave(iterators):
+    """Yield (index, item) from several async iterators in the order the items arrive; stop when one ends."""
+    iterators = [aiter(iterator) for iterator in iterators]
+    pending = {asyncio.ensure_future(anext(iterator)): index for index, iterator in enumerate(iterators)}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=pending.get):
+                index = pending.pop(task)
+                try:
+                    item = task.result()
+                except StopAsyncIteration:
+                    return
+                yield index, item
+                pending[asyncio.ensure_future(anext(iterators[index]))] = index
+    finally:
+        for task in pending:
+            task.cancel()
+
+def user_key(user):
+    return user["id"]
+
+def audit_key(entry):
+    return entry["timestamp"], entry["id"]
+
+def in_order(user_ids: list[int], results) -> list:
+    """Batch write results, gathered from several shards, back in request order."""
+    by_id = {result["id"]: result for result in results}
+    return [by_id[user_id] for user_id in user_ids]
+
+
+class ShardedDatabase(DatabaseBackend):
+    """
+    Users and their audit rows hash-partitioned over several databases.
+
+    Every id is generated by its shard's sequence with id % shard count equal
+    to the shard's index, so a user id alone routes single-user reads, writes
+    and restores to exactly one shard. New users are placed by a stable hash
+    of their email, so two signups with the same email meet on the same
+    shard's unique index. List reads fan out to every shard in parallel and
+    k-way merge the sorted pages.
+
+    Each shard's unique index only covers its own users, so creates, email
+    changes and restores first ask the other shards whether the email is
+    taken: a single-user write reads every shard and writes one. Two such
+    writes racing on different shards can still both pass. A taken email
+    raises EmailTaken, as it does on one database. Multi-user restores
+    commit per shard.
+    """
+
+    def __init__(self, shards: list[DatabaseBackend] | None = None):
+        if shards is None: # pragma: no cover
+            # Each shard archives its old audit months to a directory of its own.
+            shards = [
+                Database(
+                    dsn=dsn,
+                    replica_dsns=[],
+                    archive_dir=os.path.join(settings.AUDIT_ARCHIVE_DIR, f"shard{index}"),
+                    audit_id_step=len(DATABASE_SHARD_URLS),
+                )
+                for index, dsn in enumerate(DATABASE_SHARD_URLS)
+            ]
+        if not shards:
+            raise ValueError("DB_BACKEND=sharded needs DATABASE_SHARD_URLS")
+        self.shards = shards
+
+    def shard_for(self, user_id: int) -> DatabaseBackend:
+        return self.shards[user_id % len(self.shards)]
+
+    def shard_for_email(self, email: str) -> DatabaseBackend:
+        return self.shards[zlib.crc32(email.encode()) % len(self.shards)]
+
+    async def fan_out(self, call):
+        return await asyncio.gather(*(call(shard) for shard in self.shards))
+
+    async def connect(self):
+        await self.fan_out(lambda shard: shard.connect())
+
+    async def disconnect(self):
+        await self.fan_out(lambda shard: shard.disconnect())
+
+    def pool_status(self) -> dict:
+        shards = [shard.pool_status() for shard in self.shards]
+        totals = {key: sum(status[key] for status in shards) for key in ("in_use", "idle", "max_size", "acquire_timeouts")}
+        status = {**totals, "shards": shards}
+        admissions = [shard["admission"] for shard in shards if "admission" in shard]
+        if admissions:
+            status["admission"] = combined_stats(admissions)
+        return status
+
+    async def ping(self) -> float:
+        # Requests can touch every shard, so the slowest one is the latency.
+        return max(await self.fan_out(lambda shard: shard.ping()))
+
+    async def existing_emails(self, emails: list[str]) -> set[str]:
+        return set().union(*await self.fan_out(lambda shard: shard.existing_emails(emails)))
+
+    async def check_email_elsewhere(self, email: str, home: DatabaseBackend):
+        others = [shard for shard in self.shards if shard is not home]
+        if any(await asyncio.gather(*(shard.existing_emails([email]) for shard in others))):
+            raise EmailTaken(f"Email {email} already exists")
+
+    async def create_user(self, name: str, email: str):
+        shard = self.shard_for_email(email)
+        await self.check_email_elsewhere(email, shard)
+        return await shard.create_user(name, email)
+
+    async def import_users(self, rows):
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(self.shard_for_email(row[2]), []).append(row)
+        taken = await self.existing_emails(sorted({email for _, _, email in rows}))
+
+        async def import_shard(shard):
+            shard_rows = by_shard.get(shard, [])
+            fresh = [row for row in shard_rows if row[2] not in taken]
+            results = list(await shard.import_users(fresh)) if fresh else []
+            results += [{"line": line, "email": email, "id": None} for line, _, email in shard_rows if email in taken]
+            return results
+
+        results = [result for shard_results in await self.fan_out(import_shard) for result in shard_results]
+        return sorted(results, key=lambda result: result["line"])
+
+    async def get_user(self, user_id: int):
+        return await self.shard_for(user_id).get_user(user_id)
+
+    async def get_users(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        pages = await self.fan_out(lambda shard: shard.get_users(after=after, limit=limit))
+        return list(heapq.merge(*pages, key=user_key))[:limit]
+
+    async def get_users_json(self, after: int = 0, limit: int = settings.DEFAULT_PAGE_SIZE):
+        users, next_cursor = paginate(await self.get_users(after, limit + 1), limit, lambda user: user["id"])
+        return dumps({"users": users, "next_cursor": next_cursor})
+
+    async def get_users_changed_at(self):
+        changes = [change for change in await self.fan_out(lambda shard: shard.get_users_changed_at()) if change[0]]
+        if not changes:
+            return None, None
+        return max(changed_at for changed_at, _ in changes), min(age for _, age in changes)
+
+    def iter_users(self, after: int = 0):
+        return merge_sorted([shard.iter_users(after=after) for shard in self.shards], key=user_key)
+
+    async def update_user(self, user_id: int, name: str, email: str, if_match: list | None = None):
+        shard = self.shard_for(user_id)
+        await self.check_email_elsewhere(email, shard)
+        return await shard.update_user(user_id, name, email, if_match)
+
+    async def delete_user(self, user_id: int, if_match: list | None = None):
+        return await self.shard_for(user_id).delete_user(user_id, if_match)
+
+    async def update_users(self, changes: list[tuple[int, str, str]]):
+        # Each shard only sees its own users' emails, so emails another shard
+        # has, or an earlier change in the batch claimed, are refused here.
+        emails = sorted({email for _, _, email in changes})
+        taken = dict(zip(self.shards, await self.fan_out(lambda shard: shard.existing_emails(emails))))
+        by_shard, conflicts, claimed = {}, [], set()
+        for user_id, name, email in changes:
+            home = self.shard_for(user_id)
+            elsewhere = any(email in shard_emails for shard, shard_emails in taken.items() if shard is not home)
+            if elsewhere or email in claimed:
+                conflicts.append({"id": user_id, "status": "conflict", "name": None, "email": None, "updated_at": None})
+                continue
+            claimed.add(email)
+            by_shard.setdefault(home, []).append((user_id, name, email))
+
+        async def update_shard(shard):
+            shard_changes = by_shard.get(shard)
+            return await shard.update_users(shard_changes) if shard_changes else []
+
+        results = [*conflicts, *(row for rows in await self.fan_out(update_shard) for row in rows)]
+        return in_order([user_id for user_id, _, _ in changes], results)
+
+    async def delete_users(self, user_ids: list[int]):
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(self.shard_for(user_id), []).append(user_id)
+
+        async def delete_shard(shard):
+            shard_ids = by_shard.get(shard)
+            return await shard.delete_users(shard_ids) if shard_ids else []
+
+        return in_order(user_ids, [row for rows in await self.fan_out(delete_shard) for row in rows])
+
+    async def get_audit_logs(self, user_id=None, operation=None, since=None, until=None,
+                             before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        filters = {"user_id": user_id, "operation": operation, "since": since, "until": until, "before": before}
+        if user_id is not None:
+            return await self.shard_for(user_id).get_audit_logs(**filters, limit=limit)
+        pages = await self.fan_out(lambda shard: shard.get_audit_logs(**filters, limit=limit))
+        return list(heapq.merge(*pages, key=audit_key, reverse=True))[:limit]
+
+    async def get_audit_logs_json(self, user_id=None, operation=None, since=None, until=None,
+                                  before=None, limit: int = settings.DEFAULT_PAGE_SIZE):
+        logs = await self.get_audit_logs(user_id, operation, since, until, before, limit + 1)
+        logs, next_cursor = paginate(logs, limit, encode_audit_cursor)
+        return dumps({"audit_logs": logs, "next_cursor": next_cursor})
+
+    def iter_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        filters = {"user_id": user_id, "operation": operation, "since": since, "until": until}
+        if user_id is not None:
+            return self.shard_for(user_id).iter_audit_logs(**filters)
+        return merge_sorted([shard.iter_audit_logs(**filters) for shard in self.shards], key=audit_key, reverse=True)
+
+    def copy_audit_logs(self, user_id=None, operation=None, since=None, until=None):
+        if user_id is not None:
+            return self.shard_for(user_id).copy_audit_logs(user_id, operation, since, until)
+        return csv_chunks(self.iter_audit_logs(user_id, operation, since, until))
+
+    def audit_feed(self, after: str | None = None):
+        # The token joins each shard's own token, e.g. "812.404~401.96".
+        tokens = after.split(".") if after is not None else None
+        if tokens is not None:
+            parse_feed_token(after, len(self.shards))
+        return self.follow_shards(tokens)
+
+    async def follow_shards(self, tokens: list[str] | None):
+        if tokens is None:
+            # Starting live: pin each shard's position now, so the first
+            # token already resumes every shard from here.
+            latest = await self.fan_out(lambda shard: shard.get_audit_logs(limit=1))
+            tokens = [str(page[0]["id"]) if page else "0" for page in latest]
+        feeds = [shard.audit_feed(token) for shard, token in zip(self.shards, tokens)]
+        async for index, (token, entry) in interleave(feeds):
+            tokens[index] = token
+            yield ".".join(tokens), entry
+
+    async def get_user_history(self, user_id: int, before: int | None = None,
+                               limit: int = settings.DEFAULT_PAGE_SIZE):
+        return await self.shard_for(user_id).get_user_history(user_id, before, limit)
+
+    async def get_user_audit_restore_version(self, user_id: int, version: int):
+        return await self.shard_for(user_id).get_user_audit_restore_version(user_id, version)
+
+    async def get_user_audit_as_of(self, user_id: int, as_of):
+        return await self.shard_for(user_id).get_user_audit_as_of(user_id, as_of)
+
+    async def restore_user(self, user_id: int, name, email, deleted):
+        shard = self.shard_for(user_id)
+        await self.check_email_elsewhere(email, shard)
+        return await shard.restore_user(user_id, name, email, deleted)
+
+    async def get_user_ids_changed_since(self, since, until=None):
+        return list(heapq.merge(*await self.fan_out(lambda shard: shard.get_user_ids_changed_since(since, until))))
+
+    async def restore_users_as_of(self, user_ids: list[int], as_of):
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(self.shard_for(user_id), []).append(user_id)
+
+        async def restore_shard(shard):
+            shard_ids = by_shard.get(shard)
+            return await shard.restore_users_as_of(shard_ids, as_of) if shard_ids else []
+
+        return list(heapq.merge(*await self.fan_out(restore_shard)))
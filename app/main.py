@@ -1,14 +1,19 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from app.core.config import settings
-from app.core.openapi import customize_openapi
-from app.api.dependencies import db
-from app.api.routes import health, users, audit, restore
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware
+from app.core.openapi import install_openapi
+from app.core.sessions import ReadYourWritesMiddleware
+from app.api.dependencies import db, priority
+from app.api.responses import FastJSONResponse, email_taken_response, overloaded_response
+from app.db.admission import Overloaded, Priority
+from app.db.backend import EmailTaken
+from app.api.routes import health, users, audit, feed, restore, metrics
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):  # pragma: no cover
     await db.connect()
-    customize_openapi(app)
     try:
         yield
     finally:
@@ -19,9 +24,19 @@ app = FastAPI(
     description=settings.DESCRIPTION,
     version=settings.VERSION,
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+install_openapi(app)
+app.add_exception_handler(Overloaded, overloaded_response)
+app.add_exception_handler(EmailTaken, email_taken_response)
 
-app.include_router(health.router, prefix="/health", tags=["Health Check"])
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+app.add_middleware(ReadYourWritesMiddleware, window=settings.DB_READ_YOUR_WRITES_WINDOW)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(health.router, prefix="/health", tags=["Health Check"], dependencies=[priority(Priority.HIGH)])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(audit.router, prefix="/audit", tags=["Audit"])
+app.include_router(feed.router, prefix="/audit/feed", tags=["Audit"], dependencies=[priority(Priority.LOW)])
 app.include_router(restore.router, prefix="/restore", tags=["Restore"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
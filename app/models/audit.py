@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from typing import Literal
+from pydantic import BaseModel, field_validator
+
+def to_naive_utc(value: datetime | None):
+    # user_audit.timestamp is a TIMESTAMP WITHOUT TIME ZONE column.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class AuditFilters(BaseModel):
+    user_id: int | None = None
+    operation: Literal["CREATE", "UPDATE", "DELETE", "RESTORE"] | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+
+    @field_validator("since", "until")
+    @classmethod
+    def naive_utc(cls, value: datetime | None):
+        return to_naive_utc(value)
+
+
+class BulkRestoreRequest(BaseModel):
+    as_of: datetime
+    # Either an explicit list of users, or every user changed after as_of
+    # (and, with changed_until, no later than that).
+    user_ids: list[int] | None = None
+    changed_until: datetime | None = None
+
+    @field_validator("as_of", "changed_until")
+    @classmethod
+    def naive_utc(cls, value: datetime | None):
+        return to_naive_utc(value)
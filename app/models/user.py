@@ -1,5 +1,31 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+from app.core.config import settings
 
 class UserData(BaseModel):
-    name: str
-    email: str
\ No newline at end of file
+    name: str = Field(max_length=255)
+    email: str = Field(max_length=255)
+
+class UserChange(UserData):
+    id: int
+
+def distinct_ids(user_ids: list[int]) -> list[int]:
+    if len(set(user_ids)) != len(user_ids):
+        raise ValueError("User ids must be distinct")
+    return user_ids
+
+class BulkUpdateRequest(BaseModel):
+    users: list[UserChange] = Field(min_length=1, max_length=settings.BULK_WRITE_MAX_SIZE)
+
+    @field_validator("users")
+    @classmethod
+    def distinct_users(cls, users: list[UserChange]):
+        distinct_ids([user.id for user in users])
+        return users
+
+class BulkDeleteRequest(BaseModel):
+    user_ids: list[int] = Field(min_length=1, max_length=settings.BULK_WRITE_MAX_SIZE)
+
+    @field_validator("user_ids")
+    @classmethod
+    def distinct_user_ids(cls, user_ids: list[int]):
+        return distinct_ids(user_ids)
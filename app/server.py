@@ -0,0 +1,32 @@
+"""
+Production entry point: `python -m app.server` serves the app with
+WEB_CONCURRENCY worker processes, each with its own event loop and pool.
+"""
+from importlib.util import find_spec
+import uvicorn
+from app.core.config import settings
+
+def event_loop() -> str:
+    return "uvloop" if find_spec("uvloop") else "asyncio"
+
+def http_protocol() -> str:
+    return "httptools" if find_spec("httptools") else "h11"
+
+def main(): # pragma: no cover
+    loop, http = event_loop(), http_protocol()
+    print(
+        f"Starting {settings.WEB_CONCURRENCY} workers ({loop}, {http}) with "
+        f"{settings.DB_POOL_MIN_SIZE}-{settings.DB_POOL_MAX_SIZE} connections each."
+    )
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.WEB_CONCURRENCY,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+    )
+
+if __name__ == "__main__": # pragma: no cover
+    main()
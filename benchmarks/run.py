@@ -0,0 +1,290 @@
+"""
+Load benchmarks for the CRUD, audit and restore paths.
+
+The ASGI app is driven in-process through httpx, against either the in-memory
+backend (default) or a real Postgres:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario read-heavy --requests 20000 --concurrency 64
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.run --backend postgres --audit-rows 5000000
+
+WARNING: the postgres backend migrates and TRUNCATEs the users and user_audit
+tables of BENCH_DATABASE_URL; point it at a throwaway database.
+
+Results are written as JSON (default benchmarks/results/<commit>-<backend>.json)
+and can be compared with an earlier run using --compare.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from app.main import app
+from app.api.dependencies import get_db
+from app.db.memory import MemoryDatabase
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+    }
+
+class MemoryTarget:
+    name = "memory"
+
+    async def start(self):
+        self.database = MemoryDatabase()
+
+    async def stop(self):
+        pass
+
+    async def seed_users(self, count: int):
+        for number in range(count):
+            await self.database.create_user(f"User {number}", f"user{number}@bench.local")
+
+    async def seed_audit(self, rows: int):
+        users = max(1, len(self.database.user_ids))
+        for number in range(rows):
+            await self.database.update_user(number % users + 1, f"User {number}", f"user{number % users}@bench.local")
+
+    async def seed_history(self, user_id: int, versions: int):
+        for version in range(versions - 1):
+            await self.database.update_user(user_id, f"Name {version}", f"user{user_id - 1}@bench.local")
+
+class PostgresTarget:
+    name = "postgres"
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+
+    async def start(self): # pragma: no cover
+        import asyncpg
+        from app.db.db_funcs import Database
+        from app.db.migrate import migrate
+
+        # The pools prepare statements against the schema as they connect, so
+        # a fresh database is migrated over a plain connection first.
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            await migrate(connection)
+            await connection.execute("TRUNCATE users, user_audit RESTART IDENTITY;")
+        finally:
+            await connection.close()
+        self.database = Database(dsn=self.dsn)
+        await self.database.connect()
+
+    async def stop(self): # pragma: no cover
+        await self.database.disconnect()
+
+    async def seed_users(self, count: int): # pragma: no cover
+        await self.database.execute("""
+            WITH created AS (
+                INSERT INTO users (name, email, deleted, version)
+                SELECT 'User ' || g, 'user' || g || '@bench.local', false, 1 FROM generate_series(0, $1 - 1) g
+                RETURNING id, name, email
+            )
+            INSERT INTO user_audit (user_id, operation, name, email, deleted, version)
+            SELECT id, 'CREATE', name, email, false, 1 FROM created;
+        """, count)
+
+    async def seed_audit(self, rows: int): # pragma: no cover
+        await self.database.execute("""
+            WITH counts AS (SELECT count(*) AS users FROM users)
+            INSERT INTO user_audit (user_id, operation, name, email, deleted, version, timestamp)
+            SELECT g % users + 1, 'UPDATE', 'User ' || g, 'user' || g || '@bench.local', false,
+                   g / users + 1000000, now() - make_interval(secs => $1 - g)
+            FROM counts, generate_series(0, $1 - 1) g;
+        """, rows)
+
+    async def seed_history(self, user_id: int, versions: int): # pragma: no cover
+        await self.database.execute("""
+            WITH history AS (
+                INSERT INTO user_audit (user_id, operation, name, email, deleted, version)
+                SELECT $1, 'UPDATE', 'Name ' || v, 'user' || ($1 - 1) || '@bench.local', false, v
+                FROM generate_series(2, $2) v
+                RETURNING version
+            )
+            UPDATE users SET version = (SELECT max(version) FROM history) WHERE id = $1;
+        """, user_id, versions)
+
+class Scenario(ABC):
+    name = ""
+
+    async def setup(self, target, options):
+        pass
+
+    @abstractmethod
+    async def call(self, client: httpx.AsyncClient, number: int) -> httpx.Response:
+        pass
+
+class CreateHeavy(Scenario):
+    name = "create-heavy"
+
+    async def setup(self, target, options):
+        self.run = uuid.uuid4().hex[:8]
+
+    async def call(self, client, number):
+        return await client.post("/users/", json={"name": f"Bench {number}", "email": f"{self.run}-{number}@bench.local"})
+
+class ReadHeavy(Scenario):
+    name = "read-heavy"
+
+    async def setup(self, target, options):
+        self.users = options.users
+        await target.seed_users(options.users)
+
+    async def call(self, client, number):
+        return await client.get(f"/users/{random.randint(1, self.users)}")
+
+# Each worker runs in its own task and so pages through the log on its own.
+scan_cursor: ContextVar[str | None] = ContextVar("scan_cursor", default=None)
+
+class AuditScan(Scenario):
+    name = "audit-scan"
+
+    async def setup(self, target, options):
+        self.page_size = options.page_size
+        await target.seed_users(options.users)
+        await target.seed_audit(options.audit_rows)
+
+    async def call(self, client, number):
+        params = {"limit": self.page_size}
+        if cursor := scan_cursor.get():
+            params["before"] = cursor
+        response = await client.get("/audit/", params=params)
+        scan_cursor.set(response.json().get("next_cursor") if response.status_code == 200 else None)
+        return response
+
+class RestoreDeep(Scenario):
+    name = "restore-deep"
+
+    async def setup(self, target, options):
+        self.versions = options.history
+        await target.seed_users(1)
+        await target.seed_history(1, options.history)
+
+    async def call(self, client, number):
+        return await client.post(f"/restore/1?version={random.randint(1, self.versions)}")
+
+SCENARIOS = {scenario.name: scenario for scenario in (CreateHeavy, ReadHeavy, AuditScan, RestoreDeep)}
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    numbers = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (number := next(numbers)) < requests:
+            started = time.perf_counter()
+            response = await scenario.call(client, number)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+async def run(options) -> dict:
+    results = {}
+    for name in options.scenario or list(SCENARIOS):
+        target = PostgresTarget(options.database_url) if options.backend == "postgres" else MemoryTarget()
+        await target.start()
+        app.dependency_overrides[get_db] = lambda: target.database
+        try:
+            scenario = SCENARIOS[name]()
+            await scenario.setup(target, options)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                results[name] = run_result = await run_scenario(client, scenario, options.requests, options.concurrency)
+            print(
+                f"{name:>14}: {run_result['rps']:9.1f} req/s  p50 {run_result['p50_ms']:7.2f} ms  "
+                f"p99 {run_result['p99_ms']:7.2f} ms  errors {run_result['errors']}"
+            )
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            await target.stop()
+    return results
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    lines = []
+    for name, result in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("rps", "p50_ms", "p99_ms"):
+            change = (result[metric] - previous[metric]) / previous[metric] * 100 if previous[metric] else 0.0
+            lines.append(f"{name:>14} {metric:>6}: {previous[metric]:9.2f} -> {result[metric]:9.2f} ({change:+.1f}%)")
+    return lines
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--audit-rows", type=int, default=100000)
+    parser.add_argument("--history", type=int, default=1000, help="versions of the user in restore-deep")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    options = parser.parse_args(argv)
+    if options.backend == "postgres" and not options.database_url:
+        parser.error("the postgres backend needs --database-url or BENCH_DATABASE_URL")
+    return options
+
+def main(argv=None):
+    options = parse_args(argv)
+    results = asyncio.run(run(options))
+    commit = current_commit()
+    report = {
+        "commit": commit,
+        "backend": options.backend,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "options": {key: str(value) if isinstance(value, Path) else value for key, value in vars(options).items()
+                    if key not in ("database_url", "output", "compare")},
+        "scenarios": results,
+    }
+    output = options.output or RESULTS_DIR / f"{commit}-{options.backend}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+    if options.compare:
+        print("\n".join(compare(results, json.loads(options.compare.read_text()))))
+
+if __name__ == "__main__":
+    main()
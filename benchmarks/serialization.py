@@ -0,0 +1,88 @@
+"""
+CPU cost of rendering one GET /users or GET /audit page, per response:
+
+    python -m benchmarks.serialization --rows 1000
+
+- encoder: what FastAPI did before, `jsonable_encoder` then `json.dumps`
+- fast: `FastJSONResponse` (orjson when installed, stdlib json otherwise)
+- prerendered: the app's share of DB_RENDERED_JSON=true, wrapping a body
+  Postgres already rendered in a Response. The query and `json_agg` run on
+  the database and are not included; compare them with EXPLAIN ANALYZE.
+
+Times are process CPU time, so they exclude waiting on anything else.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.responses import FastJSONResponse, RawJSONResponse
+from app.core.serialization import dumps, orjson
+
+def users_page(rows: int) -> dict:
+    created = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    return {
+        "users": [
+            {
+                "id": user_id,
+                "name": f"User {user_id}",
+                "email": f"user{user_id}@example.com",
+                "created_at": created + timedelta(seconds=user_id),
+                "updated_at": created + timedelta(seconds=2 * user_id),
+            }
+            for user_id in range(1, rows + 1)
+        ],
+        "next_cursor": rows,
+    }
+
+def audit_page(rows: int) -> dict:
+    changed = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    return {
+        "audit_logs": [
+            {
+                "id": entry_id,
+                "user_id": entry_id % 97,
+                "operation": "UPDATE",
+                "name": f"User {entry_id}",
+                "email": f"user{entry_id}@example.com",
+                "deleted": False,
+                "timestamp": changed - timedelta(seconds=entry_id),
+                "version": entry_id % 13 + 1,
+            }
+            for entry_id in range(rows, 0, -1)
+        ],
+        "next_cursor": f"{changed.isoformat()},1",
+    }
+
+def cpu_time_per_call(render, repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        render()
+    return (time.process_time() - started) / repeat
+
+def measure(page: dict, repeat: int) -> dict:
+    body = dumps(page)
+    return {
+        "encoder": cpu_time_per_call(lambda: JSONResponse(jsonable_encoder(page)), repeat),
+        "fast": cpu_time_per_call(lambda: FastJSONResponse(page), repeat),
+        "prerendered": cpu_time_per_call(lambda: RawJSONResponse(body), repeat),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=50)
+    options = parser.parse_args(argv)
+
+    print(f"serializer: {'orjson' if orjson else 'json'}, {options.rows} rows per page")
+    results = {}
+    for name, page in (("users", users_page(options.rows)), ("audit", audit_page(options.rows))):
+        results[name] = timings = measure(page, options.repeat)
+        baseline = timings["encoder"]
+        for path, seconds in timings.items():
+            print(f"{name:>6} {path:>11}: {seconds * 1e6:10.1f} us CPU/response ({baseline / seconds:6.1f}x)")
+    return results
+
+if __name__ == "__main__":
+    main()
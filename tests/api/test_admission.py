@@ -0,0 +1,61 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from fastapi import status
+
+from app.main import app
+from app.api.dependencies import db
+from app.db.admission import Overloaded, Priority, request_priority
+from app.db.db_funcs import Database
+
+client = TestClient(app)
+
+
+def test_shed_calls_answer_503_with_retry_after():
+    with patch.object(Database, "get_user", side_effect=Overloaded(retry_after=0.5)):
+        response = client.get("/users/1")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "1"
+
+def test_shed_exports_answer_503_before_streaming():
+    async def shed_rows(**filters):
+        raise Overloaded(retry_after=3)
+        yield
+
+    with patch.object(Database, "iter_audit_logs", side_effect=shed_rows):
+        response = client.get("/audit/export")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "3"
+
+def test_routes_run_their_database_calls_at_their_priority():
+    priorities = []
+
+    async def ping():
+        priorities.append(request_priority.get())
+        return 0.001
+
+    async def rows(**filters):
+        priorities.append(request_priority.get())
+        yield {"id": 1}
+
+    async def get_user(user_id):
+        priorities.append(request_priority.get())
+
+    with patch.object(Database, "ping", side_effect=ping), \
+            patch.object(Database, "iter_audit_logs", side_effect=rows), \
+            patch.object(Database, "get_user", side_effect=get_user):
+        client.get("/health/ready")
+        client.get("/audit/export")
+        client.get("/users/1")
+
+    assert priorities == [Priority.HIGH, Priority.LOW, Priority.NORMAL]
+
+def test_metrics_expose_admission_stats(monkeypatch):
+    monkeypatch.setattr(db, "pool", None)
+
+    response = client.get("/metrics/")
+
+    assert 'db_admission{stat="waiting"} 0' in response.text
+    assert 'db_admission_shed_total{priority="low"}' in response.text
+    assert "# TYPE db_admission_admitted_total counter" in response.text
@@ -1,9 +1,11 @@
 import pytest
+from datetime import datetime
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from fastapi import status
 
 from app.main import app
+from app.core.config import settings
 from app.db.db_funcs import Database
 
 client = TestClient(app)
@@ -27,3 +29,79 @@ def test_get_audit_logs(mock_get_audit_logs):
     response = client.get("/audit")
     assert response.status_code == status.HTTP_200_OK
     assert "audit_logs" in response.json()
+
+def test_get_audit_logs_filters_and_cursor(mock_get_audit_logs):
+    mock_get_audit_logs.return_value = [
+        {"id": entry_id, "user_id": 1, "operation": "UPDATE", "timestamp": datetime(2024, 1, day)}
+        for entry_id, day in ((9, 3), (8, 2), (7, 1))
+    ]
+    response = client.get(
+        "/audit",
+        params={
+            "user_id": 1,
+            "operation": "UPDATE",
+            "since": "2024-01-01T00:00:00+02:00",
+            "before": "2024-01-04T00:00:00,10",
+            "limit": 2,
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [log["id"] for log in response.json()["audit_logs"]] == [9, 8]
+    assert response.json()["next_cursor"] == "2024-01-02T00:00:00,8"
+    mock_get_audit_logs.assert_called_once_with(
+        user_id=1,
+        operation="UPDATE",
+        since=datetime(2023, 12, 31, 22, 0),
+        until=None,
+        before=(datetime(2024, 1, 4), 10),
+        limit=3,
+    )
+
+def test_get_audit_logs_rendered_by_database():
+    body = '{"audit_logs": [], "next_cursor": null}'
+    with patch.object(settings, "DB_RENDERED_JSON", True), \
+         patch.object(Database, "get_audit_logs_json", return_value=body) as mock:
+        response = client.get("/audit", params={"operation": "DELETE", "before": "2024-01-04T00:00:00,10"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"audit_logs": [], "next_cursor": None}
+    mock.assert_called_once_with(
+        user_id=None, operation="DELETE", since=None, until=None,
+        before=(datetime(2024, 1, 4), 10), limit=settings.DEFAULT_PAGE_SIZE,
+    )
+
+def test_get_audit_logs_invalid_cursor(mock_get_audit_logs):
+    response = client.get("/audit?before=yesterday")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_get_audit_logs_cursor_with_offset(mock_get_audit_logs):
+    response = client.get("/audit", params={"before": "2024-01-04T02:00:00+02:00,10"})
+    assert response.status_code == status.HTTP_200_OK
+    assert mock_get_audit_logs.call_args.kwargs["before"] == (datetime(2024, 1, 4), 10)
+
+def test_get_audit_logs_invalid_operation(mock_get_audit_logs):
+    response = client.get("/audit?operation=DROP")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_export_audit_logs_csv():
+    async def chunks():
+        yield b"id,user_id\n"
+        yield b"1,1\n"
+
+    with patch.object(Database, "copy_audit_logs", side_effect=lambda **filters: chunks()) as mock:
+        response = client.get("/audit/export?format=csv&user_id=1")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text == "id,user_id\n1,1\n"
+    assert mock.call_args.kwargs["user_id"] == 1
+
+def test_export_audit_logs_ndjson():
+    async def rows():
+        yield {"id": 1, "user_id": 1, "operation": "CREATE"}
+
+    with patch.object(Database, "iter_audit_logs", side_effect=lambda **filters: rows()):
+        response = client.get("/audit/export")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text == '{"id":1,"user_id":1,"operation":"CREATE"}\n'
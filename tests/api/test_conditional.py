@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from app.api.conditional import if_match_timestamps, none_match, parse_etags, user_etag
+
+
+def test_parse_etags():
+    assert parse_etags('"a", W/"b",  "c-gzip"') == [(False, "a"), (True, "b"), (False, "c-gzip")]
+    assert parse_etags("garbage") == []
+
+def test_none_match_uses_weak_comparison():
+    assert none_match(None, '"1"') is None
+    assert none_match("*", '"1"') == '"1"'
+    assert none_match('W/"1"', '"1"') == 'W/"1"'
+    assert none_match('"1-br"', '"1"') == '"1-br"'
+    assert none_match('"2"', '"1"') is None
+
+def test_if_match_timestamps_use_strong_comparison():
+    updated_at = datetime(2024, 1, 1, 12, 0, 0, 5)
+    etag = user_etag(updated_at)
+
+    assert if_match_timestamps(None) is None
+    assert if_match_timestamps("*") is None
+    assert if_match_timestamps(etag) == [updated_at]
+    assert if_match_timestamps(etag[:-1] + '-gzip"') == [updated_at]
+    assert if_match_timestamps(f"W/{etag}") == []
+    assert if_match_timestamps('"not-ours"') == []
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from fastapi import status
+
+from app.main import app
+from app.api.routes.feed import sse_events
+from app.db.db_funcs import Database
+
+client = TestClient(app)
+
+ENTRY = {"id": 7, "user_id": 1, "operation": "UPDATE", "timestamp": datetime(2024, 1, 1, 12)}
+
+async def events(*entries):
+    for entry in entries:
+        yield str(entry["id"]), entry
+
+def test_audit_feed_streams_server_sent_events():
+    with patch.object(Database, "audit_feed", return_value=events(ENTRY)) as mock:
+        response = client.get("/audit/feed", params={"after": "6"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'id: 7\nevent: audit\ndata: {"id":7,"user_id":1,"operation":"UPDATE","timestamp":"2024-01-01T12:00:00"}\n\n'
+    )
+    mock.assert_called_once_with("6")
+
+def test_audit_feed_prefers_last_event_id():
+    with patch.object(Database, "audit_feed", return_value=events()) as mock:
+        client.get("/audit/feed", params={"after": "6"}, headers={"Last-Event-ID": "9"})
+
+    mock.assert_called_once_with("9")
+
+def test_audit_feed_rejects_invalid_tokens():
+    with patch.object(Database, "audit_feed", side_effect=ValueError("Invalid feed token")):
+        response = client.get("/audit/feed", params={"after": "x"})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_sse_events_send_keepalives_while_idle():
+    async def slow():
+        await asyncio.sleep(0.05)
+        yield "7", ENTRY
+
+    chunks = [chunk async for chunk in sse_events(slow(), keepalive=0.01)]
+
+    assert chunks[0] == b": keepalive\n\n"
+    assert chunks[-1].startswith(b"id: 7\nevent: audit\n")
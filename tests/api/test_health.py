@@ -0,0 +1,61 @@
+import asyncio
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from fastapi import status
+
+from app.main import app
+from app.api.dependencies import db
+from app.core.config import settings
+from app.db.cache import ProfileCache
+from app.db.db_funcs import Database
+
+client = TestClient(app)
+
+
+def test_cache_stats(monkeypatch):
+    monkeypatch.setattr(db, "cache", ProfileCache(max_size=5, ttl=60))
+    response = client.get("/health/cache")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["profile_cache"]["max_size"] == 5
+
+def test_cache_stats_disabled(monkeypatch):
+    monkeypatch.setattr(db, "cache", None)
+    response = client.get("/health/cache")
+    assert response.json() == {"profile_cache": None}
+
+def test_pool_stats(monkeypatch):
+    monkeypatch.setattr(db, "pool", None)
+    response = client.get("/health/pool")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["pool"]["in_use"] == 0
+
+def test_ready_when_the_database_answers():
+    with patch.object(Database, "ping", return_value=0.002):
+        response = client.get("/health/ready")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "ready", "database_latency_ms": 2.0}
+
+def test_not_ready_when_the_database_is_slow(monkeypatch):
+    monkeypatch.setattr(settings, "READINESS_MAX_LATENCY_MS", 10)
+
+    async def slow_ping():
+        await asyncio.sleep(1)
+
+    with patch.object(Database, "ping", side_effect=slow_ping):
+        response = client.get("/health/ready")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+def test_not_ready_when_the_database_is_down():
+    with patch.object(Database, "ping", side_effect=ConnectionError("Database is not connected")):
+        response = client.get("/health/ready")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["detail"] == "Database unavailable: Database is not connected"
+
+def test_openapi_schema_declares_basic_auth():
+    schema = client.get("/openapi.json").json()
+
+    assert schema["components"]["securitySchemes"]["BasicAuth"]["scheme"] == "basic"
+    assert schema["paths"]["/users/"]["post"]["security"] == [{"BasicAuth": []}]
@@ -0,0 +1,108 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.dependencies import create_database, get_db
+from app.db.memory import MemoryDatabase
+
+
+class SteppingClock:
+    def __init__(self):
+        self.now = datetime(2024, 1, 1)
+
+    def __call__(self):
+        self.now += timedelta(minutes=1)
+        return self.now
+
+
+@pytest.fixture
+def client():
+    database = MemoryDatabase(clock=SteppingClock())
+    app.dependency_overrides[get_db] = lambda: database
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_create_database():
+    assert isinstance(create_database("memory"), MemoryDatabase)
+    with pytest.raises(ValueError):
+        create_database("sqlite")
+
+
+def test_taken_email_is_a_conflict(client):
+    client.post("/users/", json={"name": "Jane", "email": "jane@example.com"})
+
+    response = client.post("/users/", json={"name": "Other", "email": "jane@example.com"})
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Email jane@example.com already exists"}
+
+
+def test_crud_audit_and_restore_round_trip(client):
+    created = client.post("/users/", json={"name": "Jane", "email": "jane@example.com"}).json()["user"]
+    user_id = created["id"]
+    client.put(f"/users/{user_id}", json={"name": "Janet", "email": "janet@example.com"})
+    client.delete(f"/users/{user_id}")
+    assert client.get(f"/users/{user_id}").status_code == 404
+
+    logs = client.get("/audit/", params={"user_id": user_id}).json()["audit_logs"]
+    assert [entry["operation"] for entry in logs] == ["DELETE", "UPDATE", "CREATE"]
+
+    restored = client.post(f"/restore/{user_id}", params={"version": 2}).json()["restored_user"]
+    assert restored == {"id": user_id, "name": "Janet", "email": "janet@example.com", "updated_at": restored["updated_at"]}
+    assert client.get(f"/users/{user_id}").json()["user"]["name"] == "Janet"
+    assert client.get("/users/").json()["users"][0]["id"] == user_id
+
+
+def test_history_and_as_of_reads(client):
+    user_id = client.post("/users/", json={"name": "Jane", "email": "jane@example.com"}).json()["user"]["id"]
+    client.put(f"/users/{user_id}", json={"name": "Janet", "email": "jane@example.com"})
+    client.put(f"/users/{user_id}", json={"name": "Janet", "email": "janet@example.com"})
+    client.delete(f"/users/{user_id}")
+
+    page = client.get(f"/users/{user_id}/history", params={"limit": 2}).json()
+    assert [(entry["version"], entry["operation"]) for entry in page["history"]] == [(4, "DELETE"), (3, "UPDATE")]
+    assert page["history"][1]["changes"] == {"email": ["jane@example.com", "janet@example.com"]}
+    assert page["history"][0]["changes"] == {"email": ["janet@example.com", f"deleted_{user_id}"], "deleted": [False, True]}
+    assert page["next_cursor"] == 3
+
+    rest = client.get(f"/users/{user_id}/history", params={"limit": 2, "before": 3}).json()
+    assert [entry["version"] for entry in rest["history"]] == [2, 1]
+    assert rest["history"][1]["changes"] == {
+        "name": [None, "Jane"], "email": [None, "jane@example.com"], "deleted": [None, False],
+    }
+    assert rest["next_cursor"] is None
+    assert client.get("/users/999/history").status_code == 404
+
+    as_of = rest["history"][0]["timestamp"]
+    user = client.get(f"/users/{user_id}", params={"as_of": as_of}).json()["user"]
+    assert (user["name"], user["email"], user["version"]) == ("Janet", "jane@example.com", 2)
+    assert client.get(f"/users/{user_id}", params={"as_of": "2023-12-31T00:00:00Z"}).status_code == 404
+    assert client.get(f"/users/{user_id}", params={"as_of": page["history"][0]["timestamp"]}).status_code == 404
+
+
+def test_bulk_update_and_delete(client):
+    ids = [client.post("/users/", json={"name": f"User {n}", "email": f"user{n}@example.com"}).json()["user"]["id"]
+           for n in range(3)]
+
+    response = client.put("/users/bulk", json={"users": [
+        {"id": ids[0], "name": "Renamed", "email": "user0@example.com"},
+        {"id": ids[1], "name": "Thief", "email": "user2@example.com"},
+        {"id": 999, "name": "Nobody", "email": "nobody@example.com"},
+    ]})
+    results = response.json()["results"]
+    assert [(result["id"], result["status"]) for result in results] == [
+        (ids[0], "updated"), (ids[1], "conflict"), (999, "not_found"),
+    ]
+    assert results[0]["user"]["name"] == "Renamed"
+
+    response = client.request("DELETE", "/users/bulk", json={"user_ids": [ids[2], ids[0], 999]})
+    assert [result["status"] for result in response.json()["results"]] == ["deleted", "deleted", "not_found"]
+    assert client.get(f"/users/{ids[2]}").status_code == 404
+    assert client.request("DELETE", "/users/bulk", json={"user_ids": [ids[2]]}).json()["results"][0]["status"] == "not_found"
+
+    assert client.put("/users/bulk", json={"users": []}).status_code == 422
+    assert client.request("DELETE", "/users/bulk", json={"user_ids": [1, 1]}).status_code == 422
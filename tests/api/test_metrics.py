@@ -0,0 +1,33 @@
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from fastapi import status
+
+from app.main import app
+from app.api.dependencies import db
+from app.db.db_funcs import Database
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def mock_get_user():
+    with patch.object(Database, "get_user") as mock:
+        mock.return_value = {"id": 1, "name": "Lukas Ruiz", "email": "lukasculture@example.com"}
+        yield mock
+
+def test_metrics_records_route_templates(mock_get_user, monkeypatch):
+    monkeypatch.setattr(db, "pool", None)
+    client.get("/users/1")
+    client.get("/users/2")
+
+    response = client.get("/metrics/")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/users/{user_id}",status="200"}' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/users/{user_id}"}' in response.text
+    assert 'db_pool_connections{state="in_use"} 0' in response.text
+    assert "# TYPE db_pool_acquire_timeouts_total counter" in response.text
+    assert 'audit_feed{stat="subscribers"} 0' in response.text
+    assert 'audit_feed_total{stat="published"} 0' in response.text
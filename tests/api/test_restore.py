@@ -1,9 +1,12 @@
+import json
 import pytest
+from datetime import datetime
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from fastapi import status
 
 from app.main import app
+from app.db.backend import EmailTaken
 from app.db.db_funcs import Database
 
 client = TestClient(app)
@@ -32,3 +35,49 @@ def test_restore_user(mock_restore_user):
     response = client.post("restore/1?version=1")
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["restored_user"]["name"] == "Restored User"
+
+def test_restore_user_as_of(mock_restore_user):
+    with patch.object(Database, "get_user_audit_as_of") as mock_as_of:
+        mock_as_of.return_value = {"id": 3, "name": "Old Name", "email": "old@example.com", "deleted": False}
+        response = client.post("restore/1?as_of=2024-01-01T12:00:00%2B01:00")
+
+    assert response.status_code == status.HTTP_200_OK
+    mock_as_of.assert_called_once_with(1, datetime(2024, 1, 1, 11, 0))
+    mock_restore_user.assert_called_once_with(1, "Old Name", "old@example.com", False)
+
+@pytest.mark.parametrize("query", ["", "?version=1&as_of=2024-01-01T00:00:00", "?version=0"])
+def test_restore_user_requires_one_target(query, mock_restore_user):
+    response = client.post(f"restore/1{query}")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_restore_user_version_not_found(mock_restore_user):
+    with patch.object(Database, "get_user_audit_restore_version", return_value=None):
+        response = client.post("restore/1?version=99")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_bulk_restore_user_ids(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.RESTORE_CHUNK_SIZE", 2)
+    with patch.object(Database, "restore_users_as_of") as mock_restore:
+        mock_restore.side_effect = [[1], EmailTaken("users_email_key"), [5]]
+        response = client.post(
+            "restore/bulk",
+            json={"as_of": "2024-01-01T00:00:00Z", "user_ids": [5, 1, 2, 3, 4, 1]},
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0] == {"chunk": 1, "chunks": 3, "restored": 1, "skipped": 1}
+    assert events[1]["error"] == "An email restored in this chunk belongs to another user"
+    assert events[-1] == {"done": True, "requested": 5, "restored": 2, "failed_user_ids": [3, 4]}
+    assert mock_restore.call_args_list[0].args == ([1, 2], datetime(2024, 1, 1))
+
+def test_bulk_restore_changed_since():
+    with patch.object(Database, "get_user_ids_changed_since", return_value=[7, 9]) as mock_ids, \
+         patch.object(Database, "restore_users_as_of", return_value=[7, 9]):
+        response = client.post(
+            "restore/bulk",
+            json={"as_of": "2024-01-01T00:00:00", "changed_until": "2024-01-02T00:00:00"},
+        )
+
+    mock_ids.assert_called_once_with(datetime(2024, 1, 1), datetime(2024, 1, 2))
+    assert json.loads(response.text.splitlines()[-1])["restored"] == 2
@@ -1,13 +1,24 @@
+import json
 import pytest
+from datetime import datetime
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from fastapi import status
 
 from app.main import app
+from app.core.config import settings
 from app.db.db_funcs import Database
 
 client = TestClient(app)
 
+UPDATED_AT = datetime(2023, 11, 22, 16, 28, 57, 123456)
+
+@pytest.fixture(autouse=True)
+def mock_get_users_changed_at():
+    with patch.object(Database, "get_users_changed_at") as mock:
+        mock.return_value = (None, None)
+        yield mock
+
 @pytest.fixture
 def sample_user():
     return {"name": "Lukas Ruiz", "email": "lukasculture@example.com"}
@@ -20,7 +31,7 @@ def mock_create_user():
             "name": "Lukas Ruiz",
             "email": "lukasculture@example.com",
             "created_at": "2023-11-22T16:28:57.123456+00:00",
-            "updated_at": "2023-11-22T16:28:57.123456+00:00",
+            "updated_at": UPDATED_AT,
         }
         yield mock
 
@@ -33,7 +44,7 @@ def mock_get_users():
                 "name": "Lukas Ruiz",
                 "email": "lukasculture@example.com",
                 "created_at": "2023-11-22T16:28:57.123456+00:00",
-                "updated_at": "2023-11-22T16:28:57.123456+00:00",
+                "updated_at": UPDATED_AT,
             }
         ]
         yield mock
@@ -47,7 +58,7 @@ def mock_get_user():
                 "name": "Lukas Ruiz",
                 "email": "lukasculture@example.com",
                 "created_at": "2023-11-22T16:28:57.123456+00:00",
-                "updated_at": "2023-11-22T16:28:57.123456+00:00",
+                "updated_at": UPDATED_AT,
             }
         }.get(user_id)
         yield mock
@@ -55,12 +66,12 @@ def mock_get_user():
 @pytest.fixture
 def mock_update_user():
     with patch.object(Database, "update_user") as mock:
-        mock.side_effect = lambda user_id, name, email: {
+        mock.side_effect = lambda user_id, name, email, if_match: {
             "id": user_id,
             "name": name,
             "email": email,
             "created_at": "2023-11-22T16:28:57.123456+00:00",
-            "updated_at": "2023-11-22T16:28:57.123456+00:00",
+            "updated_at": UPDATED_AT,
         }
         yield mock
 
@@ -72,7 +83,7 @@ def mock_delete_user():
             "name": "Lukas Ruiz",
             "email": "lukasculture@example.com",
             "created_at": "2023-11-22T16:28:57.123456+00:00",
-            "updated_at": "2023-11-22T16:28:57.123456+00:00",
+            "updated_at": UPDATED_AT,
         }
         yield mock
 
@@ -94,6 +105,48 @@ def test_get_all_users(mock_get_users):
     response = client.get("/users")
     assert response.status_code == status.HTTP_200_OK
     assert "users" in response.json()
+    assert response.json()["next_cursor"] is None
+    mock_get_users.assert_called_once_with(after=0, limit=101)
+
+def test_get_users_next_cursor(mock_get_users):
+    mock_get_users.return_value = [
+        {"id": user_id, "name": f"User{user_id}", "email": f"user{user_id}@example.com"}
+        for user_id in (3, 4, 7)
+    ]
+    response = client.get("/users?after=2&limit=2")
+    assert response.status_code == status.HTTP_200_OK
+    assert [user["id"] for user in response.json()["users"]] == [3, 4]
+    assert response.json()["next_cursor"] == 4
+    mock_get_users.assert_called_once_with(after=2, limit=3)
+
+def test_get_users_rendered_by_database():
+    body = '{"users": [{"id": 3, "created_at": "2023-11-22T16:28:57"}], "next_cursor": 3}'
+    with patch.object(settings, "DB_RENDERED_JSON", True), \
+         patch.object(Database, "get_users_json", return_value=body) as mock:
+        response = client.get("/users?after=2&limit=1")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == json.loads(body)
+    mock.assert_called_once_with(after=2, limit=1)
+
+def test_get_users_limit_out_of_range(mock_get_users):
+    response = client.get("/users?limit=0")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_stream_users():
+    async def rows(after):
+        for user_id in (after + 1, after + 2):
+            yield {"id": user_id, "name": f"User{user_id}", "created_at": datetime(2023, 11, 22, 16, 28, 57)}
+
+    with patch.object(Database, "iter_users", side_effect=lambda after: rows(after)):
+        response = client.get("/users?stream=true&after=5")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [6, 7]
+    assert lines[0]["created_at"] == "2023-11-22T16:28:57"
 
 def test_update_user(mock_update_user):
     updated_data = {"name": "Updated User", "email": "updated@example.com"}
@@ -104,3 +157,116 @@ def test_update_user(mock_update_user):
 def test_delete_user(mock_delete_user):
     response = client.delete("/users/1")
     assert response.status_code == status.HTTP_200_OK
+
+@pytest.fixture
+def mock_import_users():
+    with patch.object(Database, "import_users") as mock:
+        mock.side_effect = lambda rows: [
+            {"line": line, "email": email, "id": None if email == "taken@example.com" else line}
+            for line, name, email in rows
+        ]
+        yield mock
+
+def test_import_users_ndjson(mock_import_users):
+    body = "\n".join([
+        '{"name": "Ana", "email": "ana@example.com"}',
+        '{"name": "Bo"}',
+        "",
+        '{"name": "Cy", "email": "taken@example.com"}',
+    ])
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["created"] == 1
+    assert [error["line"] for error in response.json()["errors"]] == [2, 4]
+    assert "already exists" in response.json()["errors"][1]["detail"]
+    mock_import_users.assert_called_once_with([(1, "Ana", "ana@example.com"), (4, "Cy", "taken@example.com")])
+
+def test_import_users_csv_in_batches(mock_import_users, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.IMPORT_BATCH_SIZE", 2)
+    body = "name,email\r\nAna,ana@example.com\r\n\"Bo, Jr\",bo@example.com\r\nCy,cy@example.com\r\n"
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"message": "Users imported", "created": 3, "errors": []}
+    assert mock_import_users.call_count == 2
+    assert mock_import_users.call_args_list[0].args[0][1] == (3, "Bo, Jr", "bo@example.com")
+
+def test_import_users_csv_quoted_newline(mock_import_users):
+    body = 'name,email\n"Ana\nBelle",ana@example.com\n\nBo\n'
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [error["line"] for error in response.json()["errors"]] == [5]
+    mock_import_users.assert_called_once_with([(2, "Ana\nBelle", "ana@example.com")])
+
+def test_import_users_reports_lines_that_are_not_utf8(mock_import_users):
+    body = b'{"name": "Ana", "email": "ana@example.com"}\n{"name": "B\xff"}\n'
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["errors"] == [{"line": 2, "detail": "Line is not valid UTF-8"}]
+
+    body = b'name,email\nB\xff,bo@example.com\nAna,ana@example.com\n'
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "text/csv"})
+
+    assert response.json()["errors"] == [{"line": 2, "detail": "Line is not valid UTF-8"}]
+    assert mock_import_users.call_args.args[0] == [(3, "Ana", "ana@example.com")]
+
+def test_import_users_unsupported_media_type(mock_import_users):
+    response = client.post("/users/bulk", json=[{"name": "Ana", "email": "ana@example.com"}])
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+def test_get_user_etag_and_not_modified(mock_get_user):
+    response = client.get("/users/1")
+    etag = response.headers["etag"]
+    assert etag == '"1700670537123456"'
+
+    assert client.get("/users/1", headers={"If-None-Match": etag}).status_code == status.HTTP_304_NOT_MODIFIED
+    gzip_etag = etag[:-1] + '-gzip"'
+    response = client.get("/users/1", headers={"If-None-Match": f'"other", {gzip_etag}'})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == gzip_etag
+    assert client.get("/users/1", headers={"If-None-Match": '"other"'}).status_code == status.HTTP_200_OK
+
+def test_get_users_not_modified_skips_the_page(mock_get_users, mock_get_users_changed_at):
+    mock_get_users_changed_at.return_value = (UPDATED_AT, 60.0)
+    etag = client.get("/users?limit=10").headers["etag"]
+    mock_get_users.reset_mock()
+
+    response = client.get("/users?limit=10", headers={"If-None-Match": etag})
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    mock_get_users.assert_not_called()
+    assert client.get("/users?limit=20", headers={"If-None-Match": etag}).status_code == status.HTTP_200_OK
+
+def test_get_users_without_etag_while_changes_settle(mock_get_users, mock_get_users_changed_at):
+    mock_get_users_changed_at.return_value = (UPDATED_AT, settings.USERS_ETAG_SETTLE_SECONDS / 2)
+
+    response = client.get("/users")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "etag" not in response.headers
+
+def test_update_user_if_match(mock_update_user):
+    response = client.put(
+        "/users/1", json={"name": "New", "email": "new@example.com"}, headers={"If-Match": '"1700670537123456"'}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"1700670537123456"'
+    assert mock_update_user.call_args.kwargs["if_match"] == [UPDATED_AT]
+
+def test_update_user_precondition_failed(mock_update_user, mock_get_user):
+    mock_update_user.side_effect = None
+    mock_update_user.return_value = None
+
+    response = client.put("/users/1", json={"name": "New", "email": "new@example.com"}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = client.put("/users/2", json={"name": "New", "email": "new@example.com"}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_delete_user_if_match_any(mock_delete_user):
+    assert client.delete("/users/1", headers={"If-Match": "*"}).status_code == status.HTTP_200_OK
+    assert mock_delete_user.call_args.kwargs["if_match"] is None
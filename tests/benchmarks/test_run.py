@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from argparse import Namespace
+from httpx import Response
+
+from benchmarks.run import SCENARIOS, AuditScan, compare, percentile, run, summarize
+
+
+def test_percentile():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.99) == 0.0
+
+
+def test_summarize():
+    summary = summarize([0.001, 0.003], elapsed=0.5, errors=1)
+    assert summary["requests"] == 2
+    assert summary["errors"] == 1
+    assert summary["rps"] == 4.0
+    assert summary["p99_ms"] == pytest.approx(3.0)
+
+
+def test_compare():
+    lines = compare({"read-heavy": {"rps": 200.0, "p50_ms": 1.0, "p99_ms": 2.0}},
+                    {"scenarios": {"read-heavy": {"rps": 100.0, "p50_ms": 1.0, "p99_ms": 4.0}}})
+    assert any("rps" in line and "+100.0%" in line for line in lines)
+    assert any("p99_ms" in line and "-50.0%" in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_all_scenarios_run_against_memory():
+    options = Namespace(
+        backend="memory", scenario=None, requests=20, concurrency=4,
+        users=10, audit_rows=50, history=5, page_size=10,
+    )
+    results = await run(options)
+    assert set(results) == set(SCENARIOS)
+    for result in results.values():
+        assert result["requests"] == 20
+        assert result["errors"] == 0
+
+@pytest.mark.asyncio
+async def test_audit_scan_workers_page_independently():
+    scenario = AuditScan()
+    scenario.page_size = 10
+    seen = []
+
+    class Client:
+        async def get(self, path, params):
+            seen.append(params.get("before"))
+            return Response(200, json={"next_cursor": f"page-{len(seen)}"})
+
+    other_worker_done = asyncio.Event()
+
+    async def scan_twice():
+        await scenario.call(Client(), 0)
+        await other_worker_done.wait()
+        await scenario.call(Client(), 2)
+
+    async def scan_once():
+        await scenario.call(Client(), 1)
+        other_worker_done.set()
+
+    await asyncio.gather(scan_twice(), scan_once())
+
+    assert seen == [None, None, "page-1"]
@@ -0,0 +1,13 @@
+import json
+
+from benchmarks.serialization import audit_page, measure, users_page
+from app.core.serialization import dumps
+
+
+def test_pages_render_the_same_json_on_every_path():
+    page = users_page(3)
+    assert json.loads(dumps(page))["users"][0]["created_at"] == "2024-01-01T12:30:16.123456"
+    assert len(audit_page(3)["audit_logs"]) == 3
+
+    timings = measure(page, repeat=2)
+    assert set(timings) == {"encoder", "fast", "prerendered"}
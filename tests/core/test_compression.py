@@ -0,0 +1,103 @@
+import asyncio
+import gzip
+import zlib
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, choose_encoding
+
+BODY = "user audit " * 200
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+@app.get("/large")
+def large():
+    return PlainTextResponse(BODY, headers={"ETag": '"42"'})
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("small", headers={"ETag": '"42"'})
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse(iter([BODY, BODY]), media_type="application/x-ndjson")
+
+@app.get("/events")
+def events():
+    return StreamingResponse(iter(["data: 1\n\n"]), media_type="text/event-stream")
+
+@app.get("/empty")
+def empty():
+    return Response(status_code=204)
+
+client = TestClient(app)
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br", brotli_available=True) == "br"
+    assert choose_encoding("gzip, deflate, br", brotli_available=False) == "gzip"
+    assert choose_encoding("br;q=0, gzip;q=0.5", brotli_available=True) == "gzip"
+    assert choose_encoding("*", brotli_available=False) == "gzip"
+    assert choose_encoding("gzip;q=0, identity", brotli_available=False) is None
+    assert choose_encoding("", brotli_available=True) is None
+
+def test_compresses_large_bodies_and_tags_the_encoding():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"42-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.text == BODY
+
+def test_leaves_small_bodies_uncompressed():
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"42"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+def test_skips_clients_without_accept_encoding():
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == BODY
+
+def test_compresses_streamed_bodies():
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == BODY * 2
+
+def test_leaves_event_streams_and_empty_responses_alone():
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "data: 1\n\n"
+
+    assert client.get("/empty", headers={"Accept-Encoding": "gzip"}).status_code == 204
+
+def test_gzip_output_is_standard():
+    with client.stream("GET", "/large", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert gzip.decompress(raw).decode() == BODY
+
+def test_flushes_each_streamed_chunk():
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        await send({"type": "http.response.body", "body": BODY.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    messages = []
+    async def send(message):
+        messages.append(message)
+
+    middleware = CompressionMiddleware(streaming_app, minimum_size=1024)
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(middleware(scope, None, send))
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(messages[1]["body"]).decode() == BODY
+    assert messages[1]["more_body"] is True
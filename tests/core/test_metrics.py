@@ -0,0 +1,33 @@
+from app.core.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_histogram_render():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+
+    lines = histogram.render()
+
+    assert lines[:2] == ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+
+def test_counter_and_gauge_render():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests.", ("status",)))
+    gauge = registry.register(Gauge("queue_depth", "Depth."))
+    counter.inc("200")
+    counter.inc("200")
+    counter.inc('5"0\\0')
+    gauge.set(3)
+
+    output = registry.render()
+
+    assert 'requests_total{status="200"} 2\n' in output
+    assert 'requests_total{status="5\\"0\\\\0"} 1\n' in output
+    assert "queue_depth 3\n" in output
+    assert output.endswith("\n")
@@ -0,0 +1,40 @@
+import json
+import pytest
+from datetime import date, datetime
+
+from unittest.mock import patch
+
+from app.core import serialization
+from app.core.serialization import dumps
+
+
+class Record:
+    """Mapping-like row, as asyncpg returns them."""
+
+    def __init__(self, **values):
+        self.values = values
+
+    def items(self):
+        return self.values.items()
+
+
+@pytest.fixture(params=["orjson", "json"])
+def serializer(request):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+        yield
+    else:
+        with patch.object(serialization, "orjson", None):
+            yield
+
+def test_dumps_encodes_rows_and_timestamps(serializer):
+    body = dumps({"users": [Record(id=1, created_at=datetime(2024, 1, 2, 3, 4, 5, 6))], "day": date(2024, 1, 2)})
+
+    assert json.loads(body) == {
+        "users": [{"id": 1, "created_at": "2024-01-02T03:04:05.000006"}],
+        "day": "2024-01-02",
+    }
+
+def test_dumps_rejects_unknown_types(serializer):
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
@@ -0,0 +1,18 @@
+import pytest
+from unittest.mock import patch
+
+from app import server
+from app.core.config import worker_pool_size
+
+
+def test_worker_pool_size_splits_the_budget():
+    assert worker_pool_size(40, 2) == 19
+    assert worker_pool_size(40, 3) == 12
+    with pytest.raises(ValueError):
+        worker_pool_size(4, 4)
+
+def test_prefers_uvloop_and_httptools_when_installed():
+    with patch.object(server, "find_spec", return_value=object()):
+        assert (server.event_loop(), server.http_protocol()) == ("uvloop", "httptools")
+    with patch.object(server, "find_spec", return_value=None):
+        assert (server.event_loop(), server.http_protocol()) == ("asyncio", "h11")
@@ -0,0 +1,36 @@
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.sessions import PRIMARY_COOKIE, ReadYourWritesMiddleware, current_session
+
+app = FastAPI()
+app.add_middleware(ReadYourWritesMiddleware, window=5)
+
+@app.post("/write")
+async def write():
+    current_session.get().pin(5)
+    return {}
+
+@app.get("/read")
+async def read():
+    return {"reads_primary": current_session.get().reads_primary()}
+
+
+def test_write_sets_cookie_that_pins_later_reads():
+    client = TestClient(app)
+    response = client.post("/write")
+
+    assert PRIMARY_COOKIE in response.headers["set-cookie"]
+    assert float(response.cookies[PRIMARY_COOKIE]) > time.time()
+    assert client.get("/read").json() == {"reads_primary": True}
+
+def test_reads_without_cookie_are_not_pinned():
+    response = TestClient(app).get("/read")
+
+    assert response.json() == {"reads_primary": False}
+    assert "set-cookie" not in response.headers
+
+def test_invalid_cookie_is_ignored():
+    response = TestClient(app, cookies={PRIMARY_COOKIE: "soon"}).get("/read")
+    assert response.json() == {"reads_primary": False}
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+
+from app.db.admission import AdmissionController, Overloaded, Priority
+
+
+def controller(limit=1, queue_size=10, deadline=1.0):
+    return AdmissionController(limit=limit, queue_size=queue_size, deadline=deadline, retry_after=2)
+
+@pytest.mark.asyncio
+async def test_admits_up_to_the_limit_then_queues_by_priority():
+    admission = controller()
+    await admission.admit(Priority.NORMAL)
+    order = []
+
+    async def wait(priority):
+        await admission.admit(priority)
+        order.append(priority)
+
+    waiters = [asyncio.create_task(wait(priority)) for priority in (Priority.LOW, Priority.NORMAL, Priority.HIGH)]
+    await asyncio.sleep(0)
+    assert admission.stats()["waiting"] == 3
+
+    for _ in range(3):
+        admission.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*waiters)
+
+    assert order == [Priority.HIGH, Priority.NORMAL, Priority.LOW]
+    admission.release()
+    assert admission.stats() == {
+        "limit": 1, "active": 0, "waiting": 0, "admitted": 4, "shed": {"high": 0, "normal": 0, "low": 0},
+    }
+
+@pytest.mark.asyncio
+async def test_sheds_callers_past_the_deadline():
+    admission = controller(deadline=0.01)
+    await admission.admit(Priority.NORMAL)
+
+    with pytest.raises(Overloaded) as shed:
+        await admission.admit(Priority.NORMAL)
+
+    assert shed.value.retry_after == 2
+    assert admission.stats()["waiting"] == 0
+    assert admission.stats()["shed"]["normal"] == 1
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_less_urgent_callers_first():
+    admission = controller(queue_size=1)
+    await admission.admit(Priority.NORMAL)
+    low = asyncio.create_task(admission.admit(Priority.LOW))
+    await asyncio.sleep(0)
+
+    high = asyncio.create_task(admission.admit(Priority.HIGH))
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded):
+        await low
+    with pytest.raises(Overloaded):
+        await admission.admit(Priority.HIGH)
+
+    admission.release()
+    await high
+    assert admission.stats()["shed"] == {"high": 1, "normal": 0, "low": 1}
+
+@pytest.mark.asyncio
+async def test_cancelled_callers_leave_the_queue():
+    admission = controller()
+    await admission.admit(Priority.NORMAL)
+    waiter = asyncio.create_task(admission.admit(Priority.NORMAL))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    admission.release()
+
+    assert (admission.stats()["active"], admission.stats()["waiting"]) == (0, 0)
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_passes_on_a_slot_it_was_handed():
+    admission = controller()
+    await admission.admit(Priority.NORMAL)
+    waiter = asyncio.create_task(admission.admit(Priority.NORMAL))
+    await asyncio.sleep(0)
+
+    # The slot is handed over, but the caller is cancelled before it resumes.
+    admission.release()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert (admission.stats()["active"], admission.stats()["waiting"]) == (0, 0)
+    await asyncio.wait_for(admission.admit(Priority.NORMAL), 0.1)
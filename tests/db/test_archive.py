@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+
+from app.db.archive import ArchiveFile, ArchiveWriter, AuditArchive
+
+
+START = datetime(2024, 1, 1)
+
+def entry(entry_id, user_id=None, operation="UPDATE", deleted=False):
+    return {
+        "id": entry_id,
+        "user_id": user_id if user_id is not None else entry_id % 3 + 1,
+        "operation": operation,
+        "name": f"User {entry_id}",
+        "email": None if entry_id % 5 == 0 else f"user{entry_id}@example.com",
+        "deleted": deleted,
+        "timestamp": START + timedelta(hours=entry_id, microseconds=entry_id),
+        "version": entry_id,
+    }
+
+def write(path, rows, group_size=4):
+    writer = ArchiveWriter(path)
+    for start in range(0, len(rows), group_size):
+        writer.write_group(rows[start:start + group_size])
+    writer.close()
+    return path
+
+@pytest.fixture
+def rows():
+    return [entry(entry_id, deleted=None if entry_id == 7 else entry_id % 2 == 0) for entry_id in range(1, 11)]
+
+def test_round_trip_newest_first(tmp_path, rows):
+    archive = ArchiveFile(write(tmp_path / "user_audit_p202401.uaudit", rows))
+
+    assert archive.rows == 10
+    assert len(archive.groups) == 3
+    assert list(archive.scan()) == rows[::-1]
+    assert not (tmp_path / "user_audit_p202401.uaudit.partial").exists()
+    archive.close()
+
+def test_scan_filters_and_cursor(tmp_path, rows):
+    archive = ArchiveFile(write(tmp_path / "a.uaudit", rows))
+
+    assert [row["id"] for row in archive.scan(user_id=2)] == [10, 7, 4, 1]
+    assert [row["id"] for row in archive.scan(since=rows[2]["timestamp"], until=rows[6]["timestamp"])] == [6, 5, 4, 3]
+    assert [row["id"] for row in archive.scan(before=(rows[5]["timestamp"], 6))] == [5, 4, 3, 2, 1]
+    assert [row["id"] for row in archive.scan(operation="DELETE")] == []
+    archive.close()
+
+def test_scan_skips_groups_outside_the_zone_maps(tmp_path, rows, monkeypatch):
+    archive = ArchiveFile(write(tmp_path / "a.uaudit", rows))
+    read = []
+    original = archive.column
+    monkeypatch.setattr(archive, "column", lambda group, name: read.append(group["min_timestamp"]) or original(group, name))
+
+    assert [row["id"] for row in archive.scan(until=rows[2]["timestamp"])] == [2, 1]
+    assert set(read) == {archive.groups[0]["min_timestamp"]}
+    archive.close()
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "broken.uaudit"
+    path.write_bytes(b"not an archive at all")
+
+    with pytest.raises(ValueError):
+        ArchiveFile(path)
+
+def test_audit_archive_scans_files_newest_first(tmp_path):
+    write(tmp_path / "user_audit_p202401.uaudit", [entry(entry_id) for entry_id in range(1, 4)])
+    write(tmp_path / "user_audit_p202402.uaudit", [entry(entry_id) for entry_id in range(800, 803)])
+    archive = AuditArchive(tmp_path)
+
+    assert [row["id"] for row in archive.scan()] == [802, 801, 800, 3, 2, 1]
+    assert archive.overlaps()
+    assert archive.overlaps(until=entry(2)["timestamp"])
+    assert not archive.overlaps(since=entry(900)["timestamp"])
+    assert not archive.overlaps(until=START)
+    newest = entry(802)["timestamp"] + timedelta(microseconds=1)
+    assert archive.live_since() == newest
+    assert archive.live_since(START) == newest
+    assert archive.live_since(entry(900)["timestamp"]) == entry(900)["timestamp"]
+    archive.close()
+
+@pytest.mark.asyncio
+async def test_audit_archive_read_decodes_groups_in_threads(tmp_path, rows, monkeypatch):
+    write(tmp_path / "user_audit_p202401.uaudit", rows)
+    archive = AuditArchive(tmp_path)
+    threads = []
+    to_thread = asyncio.to_thread
+    monkeypatch.setattr(asyncio, "to_thread", lambda func, *args: threads.append(args[0]) or to_thread(func, *args))
+
+    assert [row async for row in archive.read(user_id=2)] == [row for row in rows[::-1] if row["user_id"] == 2]
+    assert [row["id"] async for row in archive.read(limit=5)] == [10, 9, 8, 7, 6]
+    assert len(threads) == 3 + 2
+    archive.close()
+
+def test_audit_archive_refresh_interval(tmp_path):
+    now = [0.0]
+    archive = AuditArchive(tmp_path / "archive", refresh_interval=60, clock=lambda: now[0])
+
+    assert not archive.overlaps()
+    archive.directory.mkdir()
+    write(archive.path_for("user_audit_p202401"), [entry(1)])
+    assert not archive.overlaps()
+
+    now[0] = 61
+    assert archive.overlaps()
+    archive.close()
@@ -0,0 +1,124 @@
+import asyncio
+import asyncpg
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.db.audit_writer import AuditWriter
+
+
+def entry(user_id):
+    return (user_id, "UPDATE", "Name", f"user{user_id}@example.com", False, None)
+
+@pytest.fixture
+def mock_database():
+    database = MagicMock()
+    database.write_audit_batch = AsyncMock()
+    return database
+
+@pytest.mark.asyncio
+async def test_flushes_when_batch_is_full(mock_database):
+    writer = AuditWriter(mock_database, batch_size=2, flush_interval=60, queue_size=10)
+    writer.start()
+
+    await writer.submit(entry(1))
+    await writer.submit(entry(2))
+    await asyncio.sleep(0.01)
+
+    mock_database.write_audit_batch.assert_awaited_once_with([entry(1), entry(2)])
+    await writer.stop()
+
+@pytest.mark.asyncio
+async def test_flushes_after_interval(mock_database):
+    writer = AuditWriter(mock_database, batch_size=100, flush_interval=0.01, queue_size=10)
+    writer.start()
+
+    await writer.submit(entry(1))
+    await asyncio.sleep(0.05)
+
+    mock_database.write_audit_batch.assert_awaited_once_with([entry(1)])
+    assert writer.flushed == 1
+    await writer.stop()
+
+@pytest.mark.asyncio
+async def test_stop_drains_queue(mock_database):
+    writer = AuditWriter(mock_database, batch_size=2, flush_interval=60, queue_size=10)
+    writer.start()
+    for user_id in range(5):
+        await writer.submit(entry(user_id))
+
+    await writer.stop(timeout=1)
+
+    written = [e for call in mock_database.write_audit_batch.await_args_list for e in call.args[0]]
+    assert written == [entry(user_id) for user_id in range(5)]
+    with pytest.raises(RuntimeError):
+        await writer.submit(entry(6))
+
+@pytest.mark.asyncio
+async def test_submit_waits_when_queue_is_full(mock_database):
+    writer = AuditWriter(mock_database, batch_size=10, flush_interval=60, queue_size=1)
+
+    await writer.submit(entry(1))
+    blocked = asyncio.create_task(writer.submit(entry(2)))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    writer.start()
+    await asyncio.wait_for(blocked, 1)
+    await writer.stop(timeout=1)
+    assert writer.flushed == 2
+
+@pytest.mark.asyncio
+async def test_stop_drains_entries_queued_behind_it(mock_database):
+    writer = AuditWriter(mock_database, batch_size=10, flush_interval=60, queue_size=1)
+    await writer.submit(entry(1))
+    blocked = asyncio.create_task(writer.submit(entry(2)))
+    await asyncio.sleep(0)
+
+    # The writer frees the slot blocked is woken for, but stop() takes it first.
+    writer.start()
+    await asyncio.create_task(writer.stop(timeout=1))
+
+    await blocked
+    written = [e for call in mock_database.write_audit_batch.await_args_list for e in call.args[0]]
+    assert written == [entry(1), entry(2)]
+    assert writer.pending == 0
+
+@pytest.mark.asyncio
+async def test_retries_failed_flush(mock_database):
+    mock_database.write_audit_batch.side_effect = [ConnectionError("down"), None]
+    writer = AuditWriter(mock_database, batch_size=1, flush_interval=0.01, queue_size=10)
+    writer.start()
+
+    await writer.submit(entry(1))
+    await writer.stop(timeout=1)
+
+    assert mock_database.write_audit_batch.await_count == 2
+    assert writer.flushed == 1
+
+@pytest.mark.asyncio
+async def test_writes_entries_one_at_a_time_after_a_row_error(mock_database):
+    duplicate = asyncpg.UniqueViolationError("user_audit_user_id_version_key")
+    mock_database.write_audit_batch.side_effect = [duplicate, None, duplicate, None]
+    writer = AuditWriter(mock_database, batch_size=3, flush_interval=0.01, queue_size=10)
+    writer.start()
+    for user_id in range(3):
+        await writer.submit(entry(user_id))
+
+    await writer.stop(timeout=1)
+
+    assert mock_database.write_audit_batch.await_count == 4
+    assert writer.flushed == 2
+    assert writer.dropped == 1
+
+@pytest.mark.asyncio
+async def test_drops_entries_after_bounded_retries(mock_database):
+    mock_database.write_audit_batch.side_effect = ConnectionError("down")
+    writer = AuditWriter(mock_database, batch_size=1, flush_interval=0, queue_size=10, attempts=3)
+    writer.start()
+
+    await writer.submit(entry(1))
+    await writer.submit(entry(2))
+    await writer.stop(timeout=1)
+
+    assert mock_database.write_audit_batch.await_count == 6
+    assert writer.dropped == 2
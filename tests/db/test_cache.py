@@ -0,0 +1,58 @@
+import pytest
+
+from app.db.cache import MISSING, ProfileCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return ProfileCache(max_size=2, ttl=10, clock=clock)
+
+def test_get_put(cache):
+    assert cache.get(1) is MISSING
+    cache.put(1, {"id": 1}, cache.generation)
+
+    assert cache.get(1) == {"id": 1}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_entries_expire(cache, clock):
+    cache.put(1, {"id": 1}, cache.generation)
+    clock.now = 10
+
+    assert cache.get(1) is MISSING
+    assert cache.stats()["size"] == 0
+
+def test_evicts_least_recently_used(cache):
+    for user_id in (1, 2):
+        cache.put(user_id, {"id": user_id}, cache.generation)
+    cache.get(1)
+    cache.put(3, {"id": 3}, cache.generation)
+
+    assert cache.get(2) is MISSING
+    assert cache.get(1) == {"id": 1}
+    assert cache.stats()["evictions"] == 1
+
+def test_put_after_invalidation_is_dropped(cache):
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put(1, {"id": 1, "name": "stale"}, generation)
+
+    assert cache.get(1) is MISSING
+    assert cache.stats()["invalidations"] == 1
+
+def test_clear(cache):
+    cache.put(1, {"id": 1}, cache.generation)
+    cache.clear()
+
+    assert cache.get(1) is MISSING
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+
+from app.db.coalesce import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flights, calls = SingleFlight(), []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    results = await asyncio.gather(*(flights.run("user:1", load) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "saved": 4}
+    await flights.run("user:1", load)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_failures_reach_every_caller():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise ConnectionError("lost")
+
+    results = await asyncio.gather(*(flights.run("key", fail) for _ in range(2)), return_exceptions=True)
+
+    assert [type(result) for result in results] == [ConnectionError, ConnectionError]
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_the_others():
+    flights, release = SingleFlight(), asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return "row"
+
+    leader = asyncio.create_task(flights.run("key", load))
+    follower = asyncio.create_task(flights.run("key", load))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert await follower == "row"
+
+@pytest.mark.asyncio
+async def test_forgotten_calls_are_not_joined():
+    flights, release = SingleFlight(), asyncio.Event()
+    results = iter(["stale", "fresh"])
+
+    async def load():
+        value = next(results)
+        await release.wait()
+        return value
+
+    first = asyncio.create_task(flights.run("key", load))
+    await asyncio.sleep(0)
+    flights.forget("key")
+    second = asyncio.create_task(flights.run("key", load))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert (await first, await second) == ("stale", "fresh")
+    assert flights.stats()["in_flight"] == 0
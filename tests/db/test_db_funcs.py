@@ -1,7 +1,17 @@
+import asyncio
+import asyncpg
 import pytest
-from unittest.mock import AsyncMock
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
 
+from app.core.metrics import DB_QUERY_DURATION
+from app.core.sessions import ReadSession, current_session, read_from_primary
+from app.db.admission import Overloaded
+from app.db.archive import ArchiveWriter, AuditArchive
+from app.db.backend import EmailTaken
+from app.db.cache import ProfileCache
 from app.db.db_funcs import Database
+from app.db.replicas import ReplicaSet
 
 # This test needs the actual connection with the db to function and to have a user in it
 #async def test_create_user():
@@ -30,13 +40,11 @@ async def test_create_user(mock_database):
     assert user["email"] == "test@example.com"
 
     mock_database.fetchrow.assert_awaited_once()
-    mock_database.execute.assert_awaited_once_with(
-        """
-        INSERT INTO user_audit (user_id, operation, name, email, deleted)
-        VALUES ($1, $2, $3, $4, $5);
-        """,
-        1, "CREATE", "Test User", "test@example.com", False
-    )
+    mock_database.execute.assert_not_awaited()
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "INSERT INTO users" in query
+    assert "SELECT id, 'CREATE', name, email, deleted, version FROM changed" in query
+    assert args == ["Test User", "test@example.com"]
 
 @pytest.mark.asyncio
 async def test_get_user(mock_database):
@@ -57,12 +65,13 @@ async def test_get_users(mock_database):
         {"id": 2, "name": "User2", "email": "user2@example.com"}
     ])
 
-    users = await mock_database.get_users()
+    users = await mock_database.get_users(after=10, limit=2)
 
     assert len(users) == 2
     assert users[0]["name"] == "User1"
 
     mock_database.fetch.assert_awaited_once()
+    assert mock_database.fetch.await_args.args[1:] == (10, 2)
 
 @pytest.mark.asyncio
 async def test_update_user(mock_database):
@@ -75,13 +84,12 @@ async def test_update_user(mock_database):
     assert user["email"] == "updated@example.com"
 
     mock_database.fetchrow.assert_awaited_once()
-    mock_database.execute.assert_awaited_once_with(
-        """
-        INSERT INTO user_audit (user_id, operation, name, email, deleted)
-        VALUES ($1, $2, $3, $4, $5);
-        """,
-        1, "UPDATE", "Updated User", "updated@example.com", False
-    )
+    mock_database.execute.assert_not_awaited()
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "UPDATE users" in query
+    assert "SELECT id, 'UPDATE', name, email, deleted, version FROM changed" in query
+    assert "version = version + 1" in query
+    assert args == ["Updated User", "updated@example.com", 1]
 
 @pytest.mark.asyncio
 async def test_delete_user(mock_database):
@@ -94,10 +102,490 @@ async def test_delete_user(mock_database):
     assert user["deleted"] is True
 
     mock_database.fetchrow.assert_awaited_once()
-    mock_database.execute.assert_awaited_once_with(
-        """
-        INSERT INTO user_audit (user_id, operation, name, email, deleted)
-        VALUES ($1, $2, $3, $4, $5);
-        """,
-        1, "DELETE", "Test User", "deleted_1", True
+    mock_database.execute.assert_not_awaited()
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "SELECT id, 'DELETE', name, email, deleted, version FROM changed" in query
+    assert "SELECT id, name, email, deleted FROM changed;" in query
+    assert "SET email = 'deleted_' || id" in query
+    assert args == [1]
+    assert query in mock_database.hot_queries()
+
+@pytest.mark.asyncio
+async def test_restore_user(mock_database):
+    mock_database.fetchrow = AsyncMock(return_value={"id": 1, "name": "Old Name", "email": "old@example.com"})
+
+    user = await mock_database.restore_user(1, "Old Name", "old@example.com", False)
+
+    assert user["name"] == "Old Name"
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "SELECT id, 'RESTORE', name, email, deleted, version FROM changed" in query
+    assert args == [1, "Old Name", "old@example.com", False]
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_filters(mock_database):
+    mock_database.fetch = AsyncMock(return_value=[])
+    before = (datetime(2024, 1, 2), 8)
+
+    await mock_database.get_audit_logs(user_id=1, operation="UPDATE", before=before, limit=3)
+
+    query, *args = mock_database.fetch.await_args.args
+    assert "WHERE user_id = $1 AND operation = $2 AND (timestamp, id) < ($3, $4)" in query
+    assert "LIMIT $5" in query
+    assert args == [1, "UPDATE", datetime(2024, 1, 2), 8, 3]
+
+@pytest.fixture
+def archived(mock_database, tmp_path):
+    writer = ArchiveWriter(tmp_path / "user_audit_p202312.uaudit")
+    writer.write_group([
+        {"id": entry_id, "user_id": 1, "operation": "UPDATE", "name": "Old", "email": "old@example.com",
+         "deleted": False, "timestamp": datetime(2023, 12, entry_id), "version": entry_id}
+        for entry_id in (1, 2, 3)
+    ])
+    writer.close()
+    mock_database.archive = AuditArchive(tmp_path)
+    yield mock_database.archive
+    mock_database.archive.close()
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_continues_into_archive(mock_database, archived):
+    live = {"id": 10, "user_id": 1, "timestamp": datetime(2024, 1, 5)}
+    mock_database.fetch = AsyncMock(return_value=[live])
+
+    logs = await mock_database.get_audit_logs(user_id=1, limit=3)
+
+    assert [log["id"] for log in logs] == [10, 3, 2]
+    # Rows of archived months still in Postgres are only read from the archive.
+    assert datetime(2023, 12, 3, 0, 0, 0, 1) in mock_database.fetch.await_args.args
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_full_page_skips_archive(mock_database, archived):
+    page = [{"id": 10}, {"id": 9}]
+    mock_database.fetch = AsyncMock(return_value=page)
+
+    assert await mock_database.get_audit_logs(limit=2) == page
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_json_with_archive(mock_database, archived):
+    mock_database.fetch = AsyncMock(return_value=[])
+    mock_database.fetchrow = AsyncMock()
+
+    body = await mock_database.get_audit_logs_json(limit=2)
+
+    mock_database.fetchrow.assert_not_awaited()
+    assert b'"next_cursor":"2023-12-02T00:00:00,2"' in body
+
+@pytest.mark.asyncio
+async def test_get_users_json(mock_database):
+    mock_database.fetchrow = AsyncMock(return_value=['{"users": [], "next_cursor": null}'])
+
+    body = await mock_database.get_users_json(after=10, limit=2)
+
+    assert body == '{"users": [], "next_cursor": null}'
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "json_agg" in query
+    assert args == [10, 2]
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_json(mock_database):
+    mock_database.fetchrow = AsyncMock(return_value=['{"audit_logs": [], "next_cursor": null}'])
+
+    await mock_database.get_audit_logs_json(operation="DELETE", before=(datetime(2024, 1, 2), 8), limit=3)
+
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "WHERE operation = $1 AND (timestamp, id) < ($2, $3)" in query
+    assert "LIMIT $4::int + 1" in query
+    assert "FILTER (WHERE page_position = $4::int)" in query
+    assert args == ["DELETE", datetime(2024, 1, 2), 8, 3]
+
+@pytest.mark.asyncio
+async def test_update_user_batched_audit(mock_database):
+    changed_at = datetime(2024, 1, 1)
+    mock_database.audit_writer = AsyncMock()
+    mock_database.fetchrow = AsyncMock(return_value={
+        "id": 1, "name": "Updated User", "email": "updated@example.com", "deleted": False, "version": 4,
+        "updated_at": changed_at, "changed_at": changed_at,
+    })
+
+    user = await mock_database.update_user(1, "Updated User", "updated@example.com")
+
+    assert user == {"id": 1, "name": "Updated User", "email": "updated@example.com", "updated_at": changed_at}
+    query = mock_database.fetchrow.await_args.args[0]
+    assert "INSERT INTO user_audit" not in query
+    mock_database.audit_writer.submit.assert_awaited_once_with(
+        (1, "UPDATE", "Updated User", "updated@example.com", False, 4, changed_at)
     )
+
+@pytest.mark.asyncio
+async def test_update_user_batched_audit_not_found(mock_database):
+    mock_database.audit_writer = AsyncMock()
+    mock_database.fetchrow = AsyncMock(return_value=None)
+
+    assert await mock_database.update_user(1, "Updated User", "updated@example.com") is None
+    mock_database.audit_writer.submit.assert_not_awaited()
+
+@pytest.fixture
+def cached_database(mock_database):
+    mock_database.cache = ProfileCache(max_size=10, ttl=60)
+    mock_database.listener = MagicMock(connected=True)
+    return mock_database
+
+@pytest.mark.asyncio
+async def test_get_user_cached(cached_database):
+    cached_database.fetchrow = AsyncMock(return_value={"id": 1, "name": "Test User", "email": "test@example.com"})
+
+    await cached_database.get_user(1)
+    user = await cached_database.get_user(1)
+
+    assert user["name"] == "Test User"
+    cached_database.fetchrow.assert_awaited_once()
+    assert cached_database.cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_get_user_bypasses_cache_without_listener(cached_database):
+    cached_database.listener.connected = False
+    cached_database.fetchrow = AsyncMock(return_value={"id": 1, "name": "Test User", "email": "test@example.com"})
+
+    await cached_database.get_user(1)
+    await cached_database.get_user(1)
+
+    assert cached_database.fetchrow.await_count == 2
+
+@pytest.mark.asyncio
+async def test_update_user_invalidates_cache(cached_database):
+    cached_database.fetchrow = AsyncMock(return_value={"id": 1, "name": "Test User", "email": "test@example.com"})
+    await cached_database.get_user(1)
+
+    await cached_database.update_user(1, "Updated User", "updated@example.com")
+    await cached_database.get_user(1)
+
+    assert cached_database.fetchrow.await_count == 3
+
+def test_notification_invalidates_cache(cached_database):
+    cached_database.cache.put(7, {"id": 7}, cached_database.cache.generation)
+
+    cached_database.on_user_changed("7")
+
+    assert cached_database.cache.stats()["size"] == 0
+
+@pytest.mark.asyncio
+async def test_get_user_audit_restore_version(mock_database):
+    mock_database.fetchrow = AsyncMock(return_value={"id": 12, "user_id": 1, "version": 3})
+
+    audit_log = await mock_database.get_user_audit_restore_version(1, 3)
+
+    assert audit_log["version"] == 3
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "user_id = $1 AND version = $2" in query
+    assert "OFFSET" not in query
+    assert args == [1, 3]
+
+@pytest.mark.asyncio
+async def test_get_user_audit_as_of(mock_database):
+    mock_database.fetchrow = AsyncMock(return_value=None)
+
+    await mock_database.get_user_audit_as_of(1, datetime(2024, 1, 1))
+
+    query, *args = mock_database.fetchrow.await_args.args
+    assert "timestamp <= $2" in query
+    assert args == [1, datetime(2024, 1, 1)]
+
+@pytest.mark.asyncio
+async def test_restore_users_as_of(cached_database):
+    cached_database.fetch = AsyncMock(return_value=[{"id": 1}, {"id": 3}])
+    cached_database.cache.put(3, {"id": 3}, cached_database.cache.generation)
+
+    restored = await cached_database.restore_users_as_of([1, 2, 3], datetime(2024, 1, 1))
+
+    assert restored == [1, 3]
+    query, *args = cached_database.fetch.await_args.args
+    assert "DISTINCT ON (user_id)" in query
+    assert "ORDER BY id\n                FOR UPDATE" in query
+    assert "JOIN locked l ON l.id = t.user_id" in query
+    assert "SELECT id, 'RESTORE', name, email, deleted, version FROM restored" in query
+    assert args == [[1, 2, 3], datetime(2024, 1, 1)]
+    assert cached_database.cache.stats()["size"] == 0
+
+@pytest.mark.asyncio
+async def test_write_email_taken(mock_database):
+    taken = asyncpg.UniqueViolationError("duplicate key")
+    taken.constraint_name = "users_email_key"
+    mock_database.fetchrow = AsyncMock(side_effect=taken)
+
+    with pytest.raises(EmailTaken):
+        await mock_database.create_user("Name", "taken@example.com")
+
+@pytest.mark.asyncio
+async def test_restore_users_as_of_email_taken(mock_database):
+    mock_database.fetch = AsyncMock(side_effect=asyncpg.UniqueViolationError("users_email_key"))
+
+    with pytest.raises(EmailTaken):
+        await mock_database.restore_users_as_of([1], datetime(2024, 1, 1))
+
+@pytest.fixture
+def mock_connection(mock_database):
+    connection = MagicMock(prepared={})
+    connection.fetch = AsyncMock(return_value=[])
+    connection.fetchrow = AsyncMock(return_value={"id": 1})
+    mock_database.pool = MagicMock()
+    mock_database.pool.acquire = AsyncMock(return_value=connection)
+    mock_database.pool.release = AsyncMock()
+    return connection
+
+@pytest.mark.asyncio
+async def test_fetchrow_uses_prepared_statement(mock_database, mock_connection):
+    statement = MagicMock()
+    statement.fetchrow = AsyncMock(return_value={"id": 2})
+    mock_connection.prepared["SELECT 2;"] = statement
+
+    assert await mock_database.fetchrow("SELECT 2;", 7) == {"id": 2}
+    assert await mock_database.fetchrow("SELECT 1;", 7) == {"id": 1}
+
+    statement.fetchrow.assert_awaited_once_with(7)
+    mock_connection.fetchrow.assert_awaited_once_with("SELECT 1;", 7)
+    assert mock_database.pool.release.await_count == 2
+    assert mock_database.pool_stats.acquires == 2
+
+@pytest.mark.asyncio
+async def test_acquire_timeout_is_counted(mock_database, mock_connection):
+    mock_database.pool.acquire.side_effect = asyncio.TimeoutError
+
+    with pytest.raises(asyncio.TimeoutError):
+        await mock_database.fetch("SELECT 1;")
+
+    assert mock_database.pool_stats.acquire_timeouts == 1
+    mock_database.pool.release.assert_not_awaited()
+
+def test_pool_status(mock_database, mock_connection):
+    mock_database.pool_stats.record_acquire(0.002)
+    mock_database.pool_stats.record_acquire(0.004)
+    mock_database.pool.get_size.return_value = 8
+    mock_database.pool.get_idle_size.return_value = 3
+    mock_database.pool.get_min_size.return_value = 2
+    mock_database.pool.get_max_size.return_value = 10
+
+    status = mock_database.pool_status()
+
+    assert status["in_use"] == 5
+    assert status["acquires"] == 2
+    assert status["acquire_wait_avg_ms"] == pytest.approx(3.0)
+    assert status["acquire_wait_max_ms"] == pytest.approx(4.0)
+
+def test_hot_queries_match_write_mode(mock_database):
+    assert any("INSERT INTO user_audit" in query for query in mock_database.hot_queries())
+    mock_database.audit_writer = MagicMock()
+    assert not any("INSERT INTO user_audit" in query for query in mock_database.hot_queries())
+
+@pytest.mark.asyncio
+async def test_queries_are_labelled_and_slow_ones_logged(mock_database, mock_connection, monkeypatch, caplog):
+    monkeypatch.setattr("app.core.config.settings.SLOW_QUERY_THRESHOLD_MS", 0)
+    before = DB_QUERY_DURATION.values.get(("get_users",), {"count": 0})["count"]
+
+    await mock_database.get_users()
+
+    assert DB_QUERY_DURATION.values[("get_users",)]["count"] == before + 1
+    assert "Slow query get_users" in caplog.text
+
+@pytest.fixture
+def replica_connection(mock_database, mock_connection):
+    connection = MagicMock(prepared={})
+    connection.fetchrow = AsyncMock(return_value={"id": 1, "source": "replica"})
+    mock_database.replicas = ReplicaSet(["postgresql://replica"], 30)
+    replica = mock_database.replicas.replicas[0]
+    replica.pool = MagicMock()
+    replica.pool.acquire = AsyncMock(return_value=connection)
+    replica.pool.release = AsyncMock()
+    return connection
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_and_writes_to_primary(mock_database, mock_connection, replica_connection):
+    await mock_database.get_user_audit_restore_version(1, 2)
+    replica_connection.fetchrow.assert_awaited_once()
+    mock_connection.fetchrow.assert_not_awaited()
+
+    await mock_database.update_user(1, "Name", "name@example.com")
+    mock_connection.fetchrow.assert_awaited_once()
+    assert mock_database.pool_status()["replicas"][0]["acquires"] == 1
+
+@pytest.mark.asyncio
+async def test_read_from_primary_override(mock_database, mock_connection, replica_connection):
+    with read_from_primary():
+        await mock_database.get_user_audit_restore_version(1, 2)
+
+    mock_connection.fetchrow.assert_awaited_once()
+    replica_connection.fetchrow.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_session_reads_primary_after_its_write(mock_database, mock_connection, replica_connection):
+    session = ReadSession()
+    token = current_session.set(session)
+    try:
+        await mock_database.update_user(1, "Name", "name@example.com")
+        await mock_database.get_user_audit_restore_version(1, 2)
+    finally:
+        current_session.reset(token)
+
+    assert session.pinned
+    assert mock_connection.fetchrow.await_count == 2
+    replica_connection.fetchrow.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_broken_replica_is_ejected(mock_database, mock_connection, replica_connection):
+    replica = mock_database.replicas.replicas[0]
+    replica.pool.acquire.side_effect = ConnectionRefusedError
+
+    assert await mock_database.get_user_audit_restore_version(1, 2) == {"id": 1}
+
+    assert mock_database.replicas.status()[0]["healthy"] is False
+    replica.pool.acquire.side_effect = None
+    await mock_database.get_user_audit_restore_version(1, 2)
+    replica_connection.fetchrow.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_each_pool_admits_its_own_callers(mock_database, mock_connection, replica_connection):
+    replica = mock_database.replicas.replicas[0]
+    mock_database.admission.limit = mock_database.admission.queue_size = 0
+
+    await mock_database.get_user_audit_restore_version(1, 2)
+    assert replica.admission.stats()["admitted"] == 1
+    # The primary pool is full, so a write is shed however idle the replica is.
+    with pytest.raises(Overloaded):
+        await mock_database.update_user(1, "Name", "name@example.com")
+
+    mock_database.admission.limit = 1
+    replica.pool.acquire.side_effect = ConnectionRefusedError
+    await mock_database.get_user_audit_restore_version(1, 2)
+    assert (replica.admission.stats()["active"], mock_database.admission.stats()["admitted"]) == (0, 1)
+    assert mock_database.pool_status()["admission"]["admitted"] == 3
+
+@pytest.mark.asyncio
+async def test_concurrent_get_user_misses_share_a_query(cached_database):
+    async def fetchrow(query, *args):
+        await asyncio.sleep(0.01)
+        return {"id": 1, "name": "Test User", "email": "test@example.com"}
+
+    cached_database.fetchrow = AsyncMock(side_effect=fetchrow)
+
+    users = await asyncio.gather(*(cached_database.get_user(1) for _ in range(3)))
+
+    assert [user["id"] for user in users] == [1, 1, 1]
+    cached_database.fetchrow.assert_awaited_once()
+    assert cached_database.flights.stats()["saved"] == 2
+
+@pytest.mark.asyncio
+async def test_get_user_is_not_coalesced_for_primary_readers(mock_database):
+    async def fetchrow(query, *args):
+        await asyncio.sleep(0.01)
+        return {"id": 1, "source": "primary" if mock_database.reads_primary() else "replica"}
+
+    mock_database.fetchrow = AsyncMock(side_effect=fetchrow)
+
+    async def pinned_read():
+        with read_from_primary():
+            return await mock_database.get_user(1)
+
+    replica_read = asyncio.ensure_future(mock_database.get_user(1))
+    await asyncio.sleep(0)
+    assert (await pinned_read())["source"] == "primary"
+    assert (await replica_read)["source"] == "replica"
+    assert mock_database.fetchrow.await_count == 2
+
+@pytest.mark.asyncio
+async def test_writes_forget_running_get_user_queries(mock_database):
+    mock_database.fetchrow = AsyncMock(return_value={"id": 1, "name": "Test User", "email": "test@example.com"})
+    release = asyncio.Event()
+
+    async def load_user(user_id):
+        await release.wait()
+
+    stale = mock_database.flights.flights[("get_user", 1)] = asyncio.ensure_future(load_user(1))
+    mock_database.invalidate_user(1)
+
+    assert (await mock_database.get_user(1))["name"] == "Test User"
+    release.set()
+    await stale
+
+@pytest.mark.asyncio
+async def test_audit_reads_are_coalesced_except_for_primary_readers(mock_database):
+    async def fetch(query, *args):
+        await asyncio.sleep(0.01)
+        return [{"id": 1}]
+
+    mock_database.fetch = AsyncMock(side_effect=fetch)
+
+    await asyncio.gather(*(mock_database.get_audit_logs(user_id=1, limit=10) for _ in range(3)))
+    assert mock_database.fetch.await_count == 1
+
+    with read_from_primary():
+        await asyncio.gather(*(mock_database.get_audit_logs(user_id=1, limit=10) for _ in range(2)))
+    assert mock_database.fetch.await_count == 3
+
+@pytest.mark.asyncio
+async def test_get_user_history_scans_versions_of_one_user(mock_database):
+    mock_database.fetch = AsyncMock(return_value=[])
+
+    await mock_database.get_user_history(7, limit=11)
+    await mock_database.get_user_history(7, before=5, limit=11)
+
+    first, second = mock_database.fetch.await_args_list
+    assert "WHERE user_id = $1 AND version < $2" in first.args[0]
+    assert first.args[1:] == (7, 2**31 - 1, 11)
+    assert second.args[1:] == (7, 5, 11)
+
+def batch_row(user_id, status, version=None):
+    return {
+        "id": user_id, "status": status, "name": "Name", "email": "name@example.com", "deleted": False,
+        "version": version, "updated_at": None, "changed_at": datetime(2024, 1, 1),
+    }
+
+@pytest.mark.asyncio
+async def test_update_users_in_one_statement(cached_database):
+    cached_database.fetch = AsyncMock(return_value=[batch_row(1, "updated", 2), batch_row(2, "not_found")])
+    cached_database.cache.put(1, {"id": 1}, cached_database.cache.generation)
+
+    rows = await cached_database.update_users([(1, "Name", "name@example.com"), (2, "Other", "other@example.com")])
+
+    assert [row["status"] for row in rows] == ["updated", "not_found"]
+    query, *args = cached_database.fetch.await_args.args
+    assert "FROM unnest($1::int[], $2::text[], $3::text[]) WITH ORDINALITY" in query
+    assert "ORDER BY id\n        FOR UPDATE" in query
+    assert "JOIN locked l ON l.id = p.id" in query
+    assert "SELECT id, 'UPDATE', name, email, deleted, version FROM changed" in query
+    assert args == [[1, 2], ["Name", "Other"], ["name@example.com", "other@example.com"]]
+    assert cached_database.cache.stats()["size"] == 0
+    assert await cached_database.update_users([]) == []
+
+@pytest.mark.asyncio
+async def test_update_users_reruns_after_a_unique_violation(mock_database):
+    mock_database.fetch = AsyncMock(side_effect=[asyncpg.UniqueViolationError("users_email_key"), [batch_row(1, "conflict")]])
+
+    rows = await mock_database.update_users([(1, "Name", "taken@example.com")])
+
+    assert [row["status"] for row in rows] == ["conflict"]
+    assert mock_database.fetch.await_count == 2
+
+@pytest.mark.asyncio
+async def test_delete_users_batched_audit(mock_database):
+    mock_database.audit_writer = MagicMock(submit=AsyncMock())
+    mock_database.fetch = AsyncMock(return_value=[batch_row(1, "deleted", 3), batch_row(2, "not_found")])
+
+    await mock_database.delete_users([1, 2])
+
+    query, *args = mock_database.fetch.await_args.args
+    assert "SET email = 'deleted_' || u.id" in query
+    assert "FROM locked l" in query
+    assert "INSERT INTO user_audit" not in query
+    assert args == [[1, 2]]
+    mock_database.audit_writer.submit.assert_awaited_once_with(
+        (1, "DELETE", "Name", "name@example.com", False, 3, datetime(2024, 1, 1))
+    )
+
+def test_audit_feed_catches_up_on_missing_ids(mock_database):
+    mock_database.cursor = MagicMock()
+
+    mock_database.audit_after(812, [805, 810])
+
+    query, *args = mock_database.cursor.call_args.args
+    assert "WHERE id > $1 OR id = ANY($2::int[])" in query
+    assert args == [812, [805, 810]]
+    assert mock_database.cursor.call_args.kwargs == {"read_only": False}
+    assert str(mock_database.feed.position(812, [805, 810])) == "812~805~810"
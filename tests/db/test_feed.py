@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+from datetime import datetime
+
+from app.db.feed import AuditFeed, FeedPosition, parse_feed_token, parse_notification
+from app.db.memory import MemoryDatabase
+
+
+def entry(entry_id):
+    return {"id": entry_id, "user_id": 1, "operation": "UPDATE"}
+
+async def take(events, count):
+    return [await anext(events) for _ in range(count)]
+
+def test_parse_feed_token():
+    assert parse_feed_token("812", 1) == [(812, [])]
+    assert parse_feed_token("812~805~810.404", 2) == [(812, [805, 810]), (404, [])]
+    for token, parts in (("abc", 1), ("1.2", 1), ("-1", 1), ("", 1), ("5~5", 1), ("5~-1", 1)):
+        with pytest.raises(ValueError):
+            parse_feed_token(token, parts)
+
+def test_parse_notification():
+    payload = '{"id": 3, "user_id": 1, "timestamp": "2024-01-01T12:00:00.5"}'
+
+    assert parse_notification(payload)["timestamp"] == datetime(2024, 1, 1, 12, 0, 0, 500000)
+
+@pytest.mark.asyncio
+async def test_fans_out_live_rows():
+    feed = AuditFeed(buffer_size=10, history_size=10)
+    first, second = feed.follow(None, None), feed.follow(None, None)
+    pending = [asyncio.ensure_future(anext(events)) for events in (first, second)]
+    await asyncio.sleep(0)
+
+    feed.publish(entry(1))
+
+    assert [await task for task in pending] == [("1", entry(1))] * 2
+    assert feed.stats() == {"subscribers": 2, "published": 1, "disconnected": 0}
+    await first.aclose()
+    await second.aclose()
+    assert feed.stats()["subscribers"] == 0
+
+def test_position_tracks_ids_skipped_within_the_lookback():
+    position = FeedPosition(lookback=4, step=2)
+    for audit_id in (3, 9, 5):
+        position.advance(audit_id)
+
+    assert str(position) == "9~7"
+    assert position.lacks(7) and position.lacks(11) and not position.lacks(5) and not position.lacks(1)
+    position.advance(13)
+    assert str(position) == "13~11"
+    assert str(FeedPosition(13, [3, 11], lookback=4)) == "13~11"
+
+@pytest.mark.asyncio
+async def test_tokens_keep_ids_that_commit_late():
+    feed = AuditFeed(buffer_size=10, history_size=10, lookback=10)
+    events = feed.follow(None, None)
+    pending = asyncio.ensure_future(take(events, 4))
+    await asyncio.sleep(0)
+
+    for entry_id in (1, 3, 2, 4):
+        feed.publish(entry(entry_id))
+
+    assert [token for token, _ in await pending] == ["1", "3~2", "3", "4"]
+    await events.aclose()
+
+@pytest.mark.asyncio
+async def test_resumes_from_recent_rows_in_commit_order():
+    feed = AuditFeed(buffer_size=10, history_size=10, lookback=10)
+    # Rows from before the first one may have been missed, up to the lookback.
+    for entry_id in (1, 13, 12, 14):
+        feed.publish(entry(entry_id))
+    assert feed.replay(feed.position(10)) is None
+
+    events = feed.follow(feed.position(13, [12]), catch_up=None)
+
+    assert [(token, row["id"]) for token, row in await take(events, 2)] == [("13", 12), ("14", 14)]
+    await events.aclose()
+
+@pytest.mark.asyncio
+async def test_catches_up_late_rows_once_evicted():
+    feed = AuditFeed(buffer_size=10, history_size=2, lookback=10)
+    table = [entry(entry_id) for entry_id in (1, 2, 3, 4, 5)]
+    # 2 commits after 3, 4 and 5; the client last saw 3.
+    for entry_id in (1, 3, 4, 5, 2):
+        feed.publish(entry(entry_id))
+    assert feed.replay(feed.position(3, [2])) is None
+
+    async def catch_up(after, missing):
+        assert (after, missing) == (3, [2])
+        for row in table:
+            if row["id"] > after or row["id"] in missing:
+                yield row
+
+    events = feed.follow(feed.position(3, [2]), catch_up)
+
+    assert [token for token, _ in await take(events, 3)] == ["3", "4", "5"]
+    await events.aclose()
+
+@pytest.mark.asyncio
+async def test_catches_up_from_table_then_skips_rows_already_returned():
+    feed = AuditFeed(buffer_size=10, history_size=10)
+
+    async def catch_up(after, missing):
+        assert (after, missing) == (5, [])
+        yield entry(6)
+        # Committed while the catch-up runs: queued live as well.
+        feed.publish(entry(7))
+        yield entry(7)
+
+    events = feed.follow(feed.position(5), catch_up)
+    assert [token for token, _ in await take(events, 2)] == ["6", "7"]
+
+    feed.publish(entry(8))
+    assert await anext(events) == ("8", entry(8))
+    await events.aclose()
+
+@pytest.mark.asyncio
+async def test_disconnects_slow_subscribers():
+    feed = AuditFeed(buffer_size=2, history_size=10)
+    slow = feed.follow(None, None)
+    first = asyncio.ensure_future(anext(slow))
+    await asyncio.sleep(0)
+    for entry_id in range(1, 5):
+        feed.publish(entry(entry_id))
+
+    assert (await first)[0] == "1"
+    assert [token async for token, _ in slow] == ["2"]
+    assert feed.stats() == {"subscribers": 0, "published": 4, "disconnected": 1}
+
+@pytest.mark.asyncio
+async def test_reset_ends_every_subscription():
+    feed = AuditFeed(buffer_size=10, history_size=10)
+    feed.publish(entry(1))
+    events = feed.follow(None, None)
+    pending = asyncio.ensure_future(anext(events))
+    await asyncio.sleep(0)
+
+    feed.reset()
+
+    with pytest.raises(StopAsyncIteration):
+        await pending
+    assert feed.replay(feed.position(1)) is None
+
+@pytest.mark.asyncio
+async def test_memory_database_feed_resumes_from_its_log():
+    database = MemoryDatabase()
+    database.feed = AuditFeed(buffer_size=10, history_size=1)
+    user = await database.create_user("Name", "user@example.com")
+    await database.update_user(user["id"], "Renamed", "user@example.com")
+    await database.delete_user(user["id"])
+
+    events = database.audit_feed("1")
+
+    assert [(token, row["operation"]) for token, row in await take(events, 2)] == [("2", "UPDATE"), ("3", "DELETE")]
+    await database.create_user("Other", "other@example.com")
+    assert (await anext(events))[1]["name"] == "Other"
+    await events.aclose()
+
+def test_memory_database_rejects_bad_tokens():
+    with pytest.raises(ValueError):
+        MemoryDatabase().audit_feed("1.2")
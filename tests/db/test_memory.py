@@ -0,0 +1,193 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+
+from app.db.memory import MemoryDatabase
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2024, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float = 1):
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def memory_database(clock):
+    return MemoryDatabase(clock=clock)
+
+async def collect(rows):
+    return [row async for row in rows]
+
+@pytest.mark.asyncio
+async def test_create_and_get_user(memory_database):
+    user = await memory_database.create_user("Test User", "test@example.com")
+
+    assert user == {"id": 1, "name": "Test User", "email": "test@example.com", "updated_at": user["updated_at"]}
+    fetched = await memory_database.get_user(1)
+    assert fetched["email"] == "test@example.com"
+    assert set(fetched) == {"id", "name", "email", "created_at", "updated_at"}
+    assert await memory_database.get_user(2) is None
+
+@pytest.mark.asyncio
+async def test_email_is_unique(memory_database):
+    await memory_database.create_user("First", "taken@example.com")
+    second = await memory_database.create_user("Second", "second@example.com")
+
+    with pytest.raises(ValueError):
+        await memory_database.create_user("Again", "taken@example.com")
+    with pytest.raises(ValueError):
+        await memory_database.update_user(second["id"], "Second", "taken@example.com")
+    assert (await memory_database.get_user(second["id"]))["email"] == "second@example.com"
+
+@pytest.mark.asyncio
+async def test_update_and_delete_record_versions(memory_database):
+    await memory_database.create_user("Name", "old@example.com")
+    await memory_database.update_user(1, "New Name", "new@example.com")
+    deleted = await memory_database.delete_user(1)
+
+    assert deleted == {"id": 1, "name": "New Name", "email": "deleted_1", "deleted": True}
+    assert await memory_database.get_user(1) is None
+    assert await memory_database.update_user(1, "Ignored", "ignored@example.com") is None
+    # The old email is free again once the user moved off it.
+    await memory_database.create_user("Reuse", "old@example.com")
+
+    version = await memory_database.get_user_audit_restore_version(1, 2)
+    assert (version["operation"], version["email"], version["version"]) == ("UPDATE", "new@example.com", 2)
+    assert await memory_database.get_user_audit_restore_version(1, 4) is None
+
+@pytest.mark.asyncio
+async def test_get_users_pages_by_id_and_skips_deleted(memory_database):
+    for number in range(5):
+        await memory_database.create_user(f"User {number}", f"user{number}@example.com")
+    await memory_database.delete_user(2)
+
+    page = await memory_database.get_users(after=0, limit=2)
+    assert [user["id"] for user in page] == [1, 3]
+    page = await memory_database.get_users(after=3, limit=10)
+    assert [user["id"] for user in page] == [4, 5]
+    assert [user["id"] for user in await collect(memory_database.iter_users(after=1))] == [3, 4, 5]
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_filters_and_cursor(memory_database, clock):
+    await memory_database.create_user("A", "a@example.com")
+    clock.advance()
+    await memory_database.create_user("B", "b@example.com")
+    clock.advance()
+    await memory_database.update_user(1, "A2", "a@example.com")
+
+    logs = await memory_database.get_audit_logs(limit=2)
+    assert [entry["id"] for entry in logs] == [3, 2]
+    logs = await memory_database.get_audit_logs(before=(logs[-1]["timestamp"], logs[-1]["id"]))
+    assert [entry["id"] for entry in logs] == [1]
+
+    assert [entry["id"] for entry in await memory_database.get_audit_logs(user_id=1)] == [3, 1]
+    assert [entry["id"] for entry in await memory_database.get_audit_logs(operation="CREATE")] == [2, 1]
+    logs = await memory_database.get_audit_logs(since=datetime(2024, 1, 1, 0, 0, 1), until=datetime(2024, 1, 1, 0, 0, 2))
+    assert [entry["id"] for entry in logs] == [2]
+
+@pytest.mark.asyncio
+async def test_copy_audit_logs_writes_csv(memory_database):
+    await memory_database.create_user("A", "a@example.com")
+
+    chunks = await collect(memory_database.copy_audit_logs())
+
+    lines = b"".join(chunks).decode().splitlines()
+    assert lines[0] == "id,user_id,operation,name,email,deleted,timestamp,version"
+    assert lines[1] == "1,1,CREATE,A,a@example.com,f,2024-01-01 00:00:00,1"
+
+@pytest.mark.asyncio
+async def test_as_of_lookup(memory_database, clock):
+    await memory_database.create_user("Original", "a@example.com")
+    clock.advance(10)
+    await memory_database.update_user(1, "Changed", "a@example.com")
+
+    entry = await memory_database.get_user_audit_as_of(1, datetime(2024, 1, 1, 0, 0, 5))
+    assert entry["name"] == "Original"
+    assert await memory_database.get_user_audit_as_of(1, datetime(2023, 1, 1)) is None
+    assert await memory_database.get_user_ids_changed_since(datetime(2024, 1, 1, 0, 0, 5)) == [1]
+
+@pytest.mark.asyncio
+async def test_import_users_reports_duplicates(memory_database):
+    await memory_database.create_user("Existing", "taken@example.com")
+
+    results = await memory_database.import_users([
+        (2, "New", "new@example.com"),
+        (3, "Repeat", "new@example.com"),
+        (4, "Taken", "taken@example.com"),
+    ])
+
+    assert results == [
+        {"line": 2, "email": "new@example.com", "id": 2},
+        {"line": 3, "email": "new@example.com", "id": None},
+        {"line": 4, "email": "taken@example.com", "id": None},
+    ]
+
+@pytest.mark.asyncio
+async def test_restore_users_as_of_swaps_emails(memory_database, clock):
+    await memory_database.create_user("A", "a@example.com")
+    await memory_database.create_user("B", "b@example.com")
+    await memory_database.create_user("C", "c@example.com")
+    as_of = clock.now
+    clock.advance()
+    await memory_database.update_user(1, "A", "tmp@example.com")
+    await memory_database.update_user(2, "B", "a@example.com")
+    await memory_database.update_user(1, "A", "b@example.com")
+
+    restored = await memory_database.restore_users_as_of([1, 2, 3], as_of)
+
+    assert restored == [1, 2]
+    assert (await memory_database.get_user(1))["email"] == "a@example.com"
+    assert (await memory_database.get_user(2))["email"] == "b@example.com"
+    assert (await memory_database.get_audit_logs(limit=1))[0]["operation"] == "RESTORE"
+
+@pytest.mark.asyncio
+async def test_restore_users_as_of_is_all_or_nothing(memory_database, clock):
+    await memory_database.create_user("A", "a@example.com")
+    await memory_database.create_user("B", "b@example.com")
+    as_of = clock.now
+    clock.advance()
+    await memory_database.update_user(1, "A", "moved@example.com")
+    await memory_database.update_user(2, "B2", "b@example.com")
+    await memory_database.create_user("Squatter", "a@example.com")
+
+    with pytest.raises(ValueError):
+        await memory_database.restore_users_as_of([1, 2], as_of)
+    assert (await memory_database.get_user(2))["name"] == "B2"
+
+@pytest.mark.asyncio
+async def test_json_pages(memory_database, clock):
+    for number in range(3):
+        await memory_database.create_user(f"User {number}", f"user{number}@example.com")
+        clock.advance()
+
+    users = json.loads(await memory_database.get_users_json(after=0, limit=2))
+    assert [user["id"] for user in users["users"]] == [1, 2]
+    assert users["next_cursor"] == 2
+    assert users["users"][0]["created_at"] == "2024-01-01T00:00:00"
+
+    logs = json.loads(await memory_database.get_audit_logs_json(limit=2))
+    assert [entry["id"] for entry in logs["audit_logs"]] == [3, 2]
+    assert logs["next_cursor"] == "2024-01-01T00:00:01,2"
+
+@pytest.mark.asyncio
+async def test_conditional_writes_and_changed_at(memory_database, clock):
+    assert await memory_database.get_users_changed_at() == (None, None)
+    user = await memory_database.create_user("Name", "user@example.com")
+    clock.advance(3)
+
+    assert await memory_database.get_users_changed_at() == (user["updated_at"], 3.0)
+    assert await memory_database.update_user(1, "Stale", "user@example.com", if_match=[datetime(2000, 1, 1)]) is None
+    updated = await memory_database.update_user(1, "New", "user@example.com", if_match=[user["updated_at"]])
+    assert updated["updated_at"] == clock.now
+    assert await memory_database.delete_user(1, if_match=[user["updated_at"]]) is None
+    assert (await memory_database.delete_user(1, if_match=[updated["updated_at"]]))["deleted"] is True
+    assert (await memory_database.get_users_changed_at())[0] == clock.now
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.db.migrate import Migration, load_migrations, migrate, split_statements
+
+
+@pytest.fixture
+def mock_connection():
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+    connection.fetch = AsyncMock(return_value=[{"version": 1}])
+    return connection
+
+def test_load_migrations_in_version_order():
+    migrations = load_migrations()
+
+    assert [migration.version for migration in migrations] == sorted(m.version for m in migrations)
+    assert migrations[0] == Migration(1, "create_tables", migrations[0].sql, True)
+    assert not migrations[1].transactional
+
+def test_load_migrations_rejects_duplicate_versions(tmp_path):
+    (tmp_path / "0001_a.sql").write_text("SELECT 1;")
+    (tmp_path / "0001_b.sql").write_text("SELECT 2;")
+
+    with pytest.raises(ValueError):
+        load_migrations(tmp_path)
+
+def test_split_statements_skips_comments():
+    sql = "-- migrate:no-transaction\n-- comment\nDROP INDEX a;\nCREATE INDEX a ON t (c);\n"
+
+    assert split_statements(sql) == ["DROP INDEX a", "CREATE INDEX a ON t (c)"]
+
+@pytest.mark.asyncio
+async def test_migrate_applies_only_pending(mock_connection):
+    migrations = [
+        Migration(1, "create_tables", "CREATE TABLE t (c INT);", True),
+        Migration(2, "index", "-- migrate:no-transaction\nDROP INDEX i;\nCREATE INDEX CONCURRENTLY i ON t (c);", False),
+    ]
+
+    applied = await migrate(mock_connection, migrations)
+
+    assert applied == [migrations[1]]
+    statements = [call.args[0] for call in mock_connection.execute.await_args_list]
+    assert "CREATE TABLE t (c INT);" not in statements
+    assert "DROP INDEX i" in statements
+    assert "CREATE INDEX CONCURRENTLY i ON t (c)" in statements
+    mock_connection.transaction.assert_not_called()
+    assert mock_connection.execute.await_args_list[-2].args[1:] == (2, "index")
+    assert statements[-1] == "SELECT pg_advisory_unlock($1);"
+
+@pytest.mark.asyncio
+async def test_migrate_wraps_transactional_migrations(mock_connection):
+    mock_connection.fetch.return_value = []
+    migrations = [Migration(1, "create_tables", "CREATE TABLE t (c INT);", True)]
+
+    await migrate(mock_connection, migrations)
+
+    mock_connection.transaction.assert_called_once()
+    assert mock_connection.execute.await_args_list[2].args == ("CREATE TABLE t (c INT);",)
@@ -0,0 +1,117 @@
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+from app.db.archive import AuditArchive
+from app.db.partitions import CREATE_PARTITIONS, LIST_PARTITIONS, AuditMaintenance
+
+
+ROWS = [
+    {"id": entry_id, "user_id": 1, "operation": "UPDATE", "name": "Name", "email": "user@example.com",
+     "deleted": False, "timestamp": datetime(2024, 1, entry_id), "version": entry_id}
+    for entry_id in range(1, 6)
+]
+
+async def rows(*args, **kwargs):
+    for row in ROWS:
+        yield row
+
+@pytest.fixture
+def connection():
+    connection = MagicMock()
+    connection.fetchval = AsyncMock(return_value=True)
+    connection.execute = AsyncMock()
+    connection.fetch = AsyncMock(return_value=[{"name": "user_audit_p202401", "attached": True}])
+    connection.cursor = MagicMock(side_effect=rows)
+    connection.transaction = MagicMock(return_value=AsyncMock())
+    return connection
+
+@pytest.fixture
+def database(connection):
+    database = MagicMock()
+
+    @asynccontextmanager
+    async def acquire():
+        yield connection
+
+    database.acquire = acquire
+    return database
+
+def maintenance(database, tmp_path, retention_months=3, shared=True):
+    archive = AuditArchive(tmp_path / "archive", refresh_interval=0)
+    return AuditMaintenance(database, archive, interval=60, months_ahead=2,
+                            retention_months=retention_months, group_size=2, shared=shared)
+
+@pytest.mark.asyncio
+async def test_archives_expired_partitions(database, connection, tmp_path):
+    job = maintenance(database, tmp_path)
+    archived_before_detach = []
+
+    async def execute(statement, *args):
+        if "DETACH" in statement:
+            archived_before_detach.append(job.archive.path_for("user_audit_p202401").exists())
+
+    connection.execute.side_effect = execute
+
+    assert await job.run_once() == ["user_audit_p202401"]
+
+    statements = [call.args[0] for call in connection.execute.await_args_list]
+    assert statements[0] == CREATE_PARTITIONS
+    assert connection.execute.await_args_list[0].args[1] == 2
+    assert connection.fetch.await_args.args == (LIST_PARTITIONS, 3)
+    assert "ALTER TABLE user_audit DETACH PARTITION user_audit_p202401;" in statements
+    assert statements.index("DROP TABLE user_audit_p202401;") > statements.index(
+        "ALTER TABLE user_audit DETACH PARTITION user_audit_p202401;"
+    )
+    assert "pg_advisory_unlock" in statements[-1]
+    assert archived_before_detach == [True]
+    assert list(job.archive.scan()) == ROWS[::-1]
+    job.archive.close()
+
+@pytest.mark.asyncio
+async def test_resumes_detached_partitions(database, connection, tmp_path):
+    connection.fetch.return_value = [{"name": "user_audit_p202401", "attached": False}]
+    job = maintenance(database, tmp_path)
+
+    await job.run_once()
+
+    statements = [call.args[0] for call in connection.execute.await_args_list]
+    assert not any("DETACH" in statement for statement in statements)
+    assert "DROP TABLE user_audit_p202401;" in statements
+    job.archive.close()
+
+@pytest.mark.asyncio
+async def test_without_retention_only_creates_partitions(database, connection, tmp_path):
+    job = maintenance(database, tmp_path, retention_months=0)
+
+    assert await job.run_once() == []
+
+    connection.fetch.assert_not_awaited()
+    assert not job.archive.directory.exists()
+
+@pytest.mark.asyncio
+async def test_keeps_partitions_without_a_shared_archive(database, connection, tmp_path):
+    job = maintenance(database, tmp_path, shared=False)
+
+    assert await job.run_once() == []
+
+    connection.fetch.assert_not_awaited()
+    statements = [call.args[0] for call in connection.execute.await_args_list]
+    assert not any("DROP" in statement for statement in statements)
+    assert statements[0] == CREATE_PARTITIONS
+
+@pytest.mark.asyncio
+async def test_skips_when_another_replica_holds_the_lock(database, connection, tmp_path):
+    connection.fetchval.return_value = False
+    job = maintenance(database, tmp_path)
+
+    assert await job.run_once() == []
+    connection.execute.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_rejects_unexpected_table_names(connection, tmp_path):
+    job = maintenance(MagicMock(), tmp_path)
+
+    with pytest.raises(ValueError):
+        await job.archive_partition(connection, "users; DROP TABLE users", attached=True)
@@ -0,0 +1,43 @@
+from unittest.mock import MagicMock
+
+from app.db.replicas import ReplicaSet
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def replica_set(count: int, clock=None):
+    replicas = ReplicaSet([f"postgresql://replica{number}" for number in range(count)], 30, clock or FakeClock())
+    for replica in replicas.replicas:
+        replica.pool = MagicMock()
+    return replicas
+
+
+def test_choose_round_robin():
+    replicas = replica_set(3)
+    assert [replicas.choose().name for _ in range(4)] == ["replica0", "replica1", "replica2", "replica0"]
+
+def test_ejected_replica_is_skipped_until_it_expires():
+    clock = FakeClock()
+    replicas = replica_set(2, clock)
+    first = replicas.replicas[0]
+
+    replicas.eject(first, OSError("connection refused"))
+
+    assert [replicas.choose().name for _ in range(3)] == ["replica1"] * 3
+    assert replicas.status()[0]["healthy"] is False
+    assert replicas.status()[0]["ejections"] == 1
+    clock.now += 31
+    assert {replicas.choose().name for _ in range(2)} == {"replica0", "replica1"}
+
+def test_choose_without_healthy_replicas():
+    replicas = replica_set(1)
+    replicas.eject(replicas.replicas[0], OSError())
+    assert replicas.choose() is None
+    assert not ReplicaSet([], 30)
+    assert ReplicaSet(["postgresql://down"], 30).choose() is None
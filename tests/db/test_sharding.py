@@ -0,0 +1,181 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+
+from app.db.backend import EmailTaken
+from app.db.memory import MemoryDatabase
+from app.db.sharding import ShardedDatabase, first_shard_id, interleave, merge_sorted, next_shard_id
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2024, 1, 1)
+
+    def __call__(self):
+        self.now += timedelta(seconds=1)
+        return self.now
+
+
+@pytest.fixture
+def sharded_database():
+    clock, count = FakeClock(), 3
+    return ShardedDatabase([
+        MemoryDatabase(clock, id_start=first_shard_id(index, count), id_step=count) for index in range(count)
+    ])
+
+async def collect(rows):
+    return [row async for row in rows]
+
+async def create_users(database, count):
+    return [await database.create_user(f"User {number}", f"user{number}@example.com") for number in range(count)]
+
+
+def test_shard_ids():
+    assert [first_shard_id(index, 3) for index in range(3)] == [3, 1, 2]
+    assert next_shard_id(10, 0, 3) == 12
+    assert next_shard_id(10, 2, 3) == 11
+    assert next_shard_id(0, 1, 4) == 1
+
+def test_sharded_backend_needs_shards():
+    with pytest.raises(ValueError):
+        ShardedDatabase([])
+
+@pytest.mark.asyncio
+async def test_merge_sorted():
+    async def rows(*values):
+        for value in values:
+            yield {"id": value}
+
+    merged = await collect(merge_sorted([rows(1, 4), rows(), rows(2, 3, 5)], key=lambda row: row["id"]))
+    assert [row["id"] for row in merged] == [1, 2, 3, 4, 5]
+    merged = await collect(merge_sorted([rows(4, 1), rows(5, 3, 2)], key=lambda row: row["id"], reverse=True))
+    assert [row["id"] for row in merged] == [5, 4, 3, 2, 1]
+
+@pytest.mark.asyncio
+async def test_user_lives_on_the_shard_its_id_names(sharded_database):
+    users = await create_users(sharded_database, 12)
+
+    for user in users:
+        shard = sharded_database.shard_for(user["id"])
+        assert shard is sharded_database.shard_for_email(user["email"])
+        assert user["id"] in shard.users
+        assert [entry["user_id"] for entry in shard.history[user["id"]]] == [user["id"]]
+    assert len({user["id"] for user in users}) == 12
+    assert (await sharded_database.get_user(users[5]["id"]))["email"] == "user5@example.com"
+
+@pytest.mark.asyncio
+async def test_email_unique_across_shards(sharded_database):
+    users = await create_users(sharded_database, 6)
+    other = next(user for user in users if sharded_database.shard_for(user["id"]) is not sharded_database.shard_for(users[0]["id"]))
+
+    with pytest.raises(EmailTaken):
+        await sharded_database.create_user("Again", users[0]["email"])
+    with pytest.raises(EmailTaken):
+        await sharded_database.update_user(other["id"], "Other", users[0]["email"])
+
+@pytest.mark.asyncio
+async def test_get_users_merges_shard_pages(sharded_database):
+    users = await create_users(sharded_database, 10)
+    ids = sorted(user["id"] for user in users)
+
+    page = await sharded_database.get_users(after=ids[2], limit=4)
+    assert [user["id"] for user in page] == ids[3:7]
+    assert [user["id"] for user in await collect(sharded_database.iter_users())] == ids
+
+@pytest.mark.asyncio
+async def test_get_audit_logs_merges_newest_first(sharded_database):
+    users = await create_users(sharded_database, 5)
+    await sharded_database.update_user(users[1]["id"], "Renamed", users[1]["email"])
+
+    logs = await sharded_database.get_audit_logs(limit=3)
+    assert [(entry["operation"], entry["user_id"]) for entry in logs][0] == ("UPDATE", users[1]["id"])
+    timestamps = [entry["timestamp"] for entry in logs]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+    cursor = (logs[-1]["timestamp"], logs[-1]["id"])
+    rest = await sharded_database.get_audit_logs(before=cursor, limit=10)
+    assert len(logs) + len(rest) == 6
+    exported = await collect(sharded_database.iter_audit_logs())
+    assert [entry["id"] for entry in exported] == [entry["id"] for entry in logs + rest]
+
+    csv = b"".join(await collect(sharded_database.copy_audit_logs())).decode().splitlines()
+    assert len(csv) == 7
+
+    own = await sharded_database.get_audit_logs(user_id=users[1]["id"])
+    assert [entry["operation"] for entry in own] == ["UPDATE", "CREATE"]
+
+@pytest.mark.asyncio
+async def test_import_and_bulk_restore_span_shards(sharded_database):
+    await sharded_database.create_user("Existing", "taken@example.com")
+    results = await sharded_database.import_users(
+        [(line, f"New {line}", f"new{line}@example.com") for line in range(2, 8)] + [(8, "Taken", "taken@example.com")]
+    )
+    assert [result["line"] for result in results] == list(range(2, 9))
+    assert results[-1]["id"] is None
+    created = [result["id"] for result in results[:-1]]
+
+    as_of = sharded_database.shards[0].clock.now
+    for user_id in created:
+        await sharded_database.update_user(user_id, "Changed", (await sharded_database.get_user(user_id))["email"])
+
+    assert await sharded_database.get_user_ids_changed_since(as_of) == sorted(created)
+    assert await sharded_database.restore_users_as_of(created, as_of) == sorted(created)
+    assert (await sharded_database.get_user(created[0]))["name"] == "New 2"
+
+@pytest.mark.asyncio
+async def test_interleave_yields_items_as_they_arrive():
+    async def numbers(*values):
+        for value in values:
+            yield value
+
+    assert await collect(interleave([numbers(1, 2), numbers(10)])) == [(0, 1), (1, 10), (0, 2)]
+
+@pytest.mark.asyncio
+async def test_sharded_feed_tokens_track_every_shard(sharded_database):
+    users = await create_users(sharded_database, 3)
+    events = sharded_database.audit_feed()
+    first = asyncio.ensure_future(anext(events))
+    await asyncio.sleep(0)
+
+    await sharded_database.update_user(users[0]["id"], "Renamed", "user0@example.com")
+    token, entry = await first
+    await events.aclose()
+
+    assert entry["operation"] == "UPDATE"
+    positions = [int(position) for position in token.split(".")]
+    assert len(positions) == 3
+    assert positions[entry["id"] % 3] == entry["id"]
+
+    resumed = sharded_database.audit_feed(token)
+    await sharded_database.delete_user(users[1]["id"])
+    _, entry = await anext(resumed)
+    await resumed.aclose()
+    assert (entry["user_id"], entry["operation"]) == (users[1]["id"], "DELETE")
+
+def test_sharded_feed_rejects_tokens_for_other_shard_counts(sharded_database):
+    with pytest.raises(ValueError):
+        sharded_database.audit_feed("5")
+
+@pytest.mark.asyncio
+async def test_ping_reports_the_slowest_shard(sharded_database):
+    async def slow_ping():
+        return 0.2
+
+    sharded_database.shards[1].ping = slow_ping
+
+    assert await sharded_database.ping() == 0.2
+
+@pytest.mark.asyncio
+async def test_batch_writes_span_shards_in_request_order(sharded_database):
+    users = await create_users(sharded_database, 3)
+    ids = [user["id"] for user in users]
+
+    results = await sharded_database.update_users([
+        (ids[2], "Renamed", "renamed@example.com"),
+        (ids[0], "Thief", "user1@example.com"),
+        (ids[1], "Late", "renamed@example.com"),
+    ])
+
+    assert [(row["id"], row["status"]) for row in results] == [(ids[2], "updated"), (ids[0], "conflict"), (ids[1], "conflict")]
+    deleted = await sharded_database.delete_users([ids[1], ids[0]])
+    assert [(row["id"], row["status"]) for row in deleted] == [(ids[1], "deleted"), (ids[0], "deleted")]